@@ -0,0 +1,28 @@
+-- ========================================
+-- LOOK UP AN AUTH USER BY EMAIL
+-- ========================================
+-- Used by the email proxy (backend.py) during OTP verify instead of listing
+-- /auth/v1/admin/users. Auth stores emails lower-cased, so comparing against
+-- lower(email_input) keeps the lookup on the existing auth.users email index.
+
+DROP FUNCTION IF EXISTS get_auth_user_by_email;
+
+CREATE OR REPLACE FUNCTION get_auth_user_by_email(email_input TEXT)
+RETURNS TABLE (
+  id UUID,
+  email TEXT,
+  user_metadata JSONB
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT u.id, u.email::TEXT, u.raw_user_meta_data
+  FROM auth.users u
+  WHERE u.email = lower(email_input)
+  LIMIT 1;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public, auth;
+
+-- Service role only: never expose auth.users to clients
+REVOKE ALL ON FUNCTION get_auth_user_by_email(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_auth_user_by_email(TEXT) TO service_role;
+
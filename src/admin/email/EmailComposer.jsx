@@ -88,7 +88,16 @@ export default function EmailComposer({ preSelectedUsers = [], onClearSelection
         setIsSending(true)
 
         // Determine Mode: Bulk selection or Single Manual
-        const recipients = preSelectedUsers.length > 0 ? preSelectedUsers : [{ email: config.recipientEmail, full_name: config.memberName }]
+        const selected = preSelectedUsers.length > 0 ? preSelectedUsers : [{ email: config.recipientEmail, full_name: config.memberName }]
+        // One email per address, even if the same address was selected twice (case-insensitive)
+        const seen = new Set()
+        const recipients = selected.filter(user => {
+            const key = (user.email || user.recipientEmail || '').trim().toLowerCase()
+            if (!key) return true
+            if (seen.has(key)) return false
+            seen.add(key)
+            return true
+        })
 
         setSendingProgress({ current: 0, total: recipients.length, recipient: '' })
 
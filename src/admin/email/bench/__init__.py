@@ -0,0 +1,3 @@
+"""
+Benchmarks for the Python email proxy, run against local stand-in servers.
+"""
@@ -0,0 +1,92 @@
+"""
+Bulk SMTP delivery: one pooled send per message vs the BulkSender engine.
+
+    python bench/bulk_smtp.py [--messages 2000] [--sessions 4] [--latency 0.005] [--fail-rate 0.02]
+
+Runs against the local SMTP sink, whose latency is charged once per client
+round trip. "per_message" is what BATCH_ENGINE=per_message does (a thread
+per session, one SMTPPool.sendmail() each); "bulk" is BulkSender on a sink
+without PIPELINING (one sendmail() per message, grouped by domain);
+"bulk+pipelining" is the same engine with the sink advertising PIPELINING,
+so each message costs one round trip instead of four. A share of RCPTs is
+deferred (451, retried) and a few addresses are refused (550, not retried).
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeSMTPServer  # noqa: E402
+from mail_proxy.bulk_smtp import BulkSender, Delivery, is_permanent  # noqa: E402
+from mail_proxy.smtp_pool import SMTPPool  # noqa: E402
+from mail_proxy.templates import MessageTemplate  # noqa: E402
+
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "example.org", "truvgo.me"]
+
+
+def deliveries(count, template):
+    for i in range(count):
+        recipient = f"user{i}@{DOMAINS[i % len(DOMAINS)]}"
+        _, message = template.build(recipient, {'name': f"User {i}"})
+        yield Delivery(recipient, template.envelope_from, message)
+
+
+def per_message(pool, items, sessions, max_attempts=3):
+    def send(delivery):
+        for attempt in range(1, max_attempts + 1):
+            try:
+                pool.sendmail(delivery.sender, [delivery.recipient], delivery.data)
+                return None
+            except smtplib.SMTPException as e:
+                if is_permanent(e) or attempt == max_attempts:
+                    return e
+                time.sleep(0.01)
+
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        return list(executor.map(send, items))
+
+
+def bulk(pool, items, sessions):
+    # Short backoff so the retries of deferred recipients do not dominate the timing
+    sender = BulkSender(pool, sessions=sessions, chunk_size=50, backoff=lambda attempt: 0.01)
+    try:
+        return [error for _, error in sender.deliver(items)]
+    finally:
+        sender.close()
+
+
+def run(label, engine, args, pipelining):
+    template = MessageTemplate("Hello {{name}}", "<p>Hi {{name}}</p>")
+    with FakeSMTPServer(latency=args.latency, pipelining=pipelining, fail_rate=args.fail_rate) as smtp:
+        smtp.refuse.update(f"user{i}@{DOMAINS[i % len(DOMAINS)]}" for i in range(0, args.messages, 100))
+        pool = SMTPPool("127.0.0.1", smtp.port, "emailapikey", "secret", size=args.sessions, starttls=False)
+        items = list(deliveries(args.messages, template))
+        started = time.perf_counter()
+        errors = engine(pool, items, args.sessions)
+        elapsed = time.perf_counter() - started
+        pool.close()
+        failed = sum(1 for e in errors if e is not None)
+        print(f"{label:<16} sent={len(errors) - failed:<6} failed={failed:<4} elapsed={elapsed:6.2f}s "
+              f"rate={len(errors) / elapsed:7.1f} msg/s connections={smtp.counters['connections']:<3} "
+              f"refused={smtp.counters['refused']:<4} deferred={smtp.counters['deferred']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds per SMTP round trip")
+    parser.add_argument('--fail-rate', type=float, default=0.02, help="share of RCPTs deferred with 451")
+    args = parser.parse_args()
+
+    run("per_message", per_message, args, pipelining=False)
+    run("bulk", bulk, args, pipelining=False)
+    run("bulk+pipelining", bulk, args, pipelining=True)
+
+
+if __name__ == '__main__':
+    main()
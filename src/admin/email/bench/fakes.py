@@ -0,0 +1,420 @@
+"""
+Local stand-ins for the services the email proxy talks to.
+Used by the scripts in this folder; nothing here leaves localhost.
+"""
+import datetime
+import http.server
+import json
+import os
+import random
+import re
+import socket
+import socketserver
+import ssl
+import subprocess
+import threading
+import time
+import urllib.parse
+import uuid
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+class ThreadingHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def self_signed_certificate(directory, host="127.0.0.1"):
+    """
+    Writes a throwaway certificate for `host` (via the openssl CLI) and
+    returns (server_context, cert_path); clients trust it with
+    context.load_verify_locations(cert_path).
+    """
+    cert = os.path.join(directory, "fake-cert.pem")
+    key = os.path.join(directory, "fake-key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", f"/CN={host}", "-addext", f"subjectAltName=IP:{host},DNS:localhost",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context, cert
+
+
+# --- SMTP SINK ---
+class FakeSMTPHandler(socketserver.BaseRequestHandler):
+    """
+    Minimal ESMTP dialogue: EHLO/HELO, STARTTLS (when the sink has a TLS
+    context), AUTH, MAIL, RCPT, DATA, NOOP, RSET, QUIT, and PIPELINING when
+    the sink offers it. Every message is accepted and thrown away, except that
+    RCPT to an address in the sink's `refuse` set gets a permanent 550 and a
+    `fail_rate` share of RCPTs get a temporary 451. With `drop_after` set to
+    n, the n-th message from then on is read but the connection is closed
+    before its reply, as if the session died mid-pipeline (once).
+
+    Replies are held back until the client has sent everything it is going
+    to send before waiting, and the sink's `latency` is paid once per such
+    turn: one network round trip, however many pipelined commands it carried.
+    """
+
+    def setup(self):
+        self.connection = self.request
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._in = b""
+        self._pos = 0
+        self._out = []
+        self.rcpt_ok = False
+
+    def reply(self, line):
+        self._out.append((line + "\r\n").encode('ascii'))
+
+    def flush(self):
+        if self._out:
+            if self.server.sink.latency:
+                time.sleep(self.server.sink.latency)
+            self.connection.sendall(b"".join(self._out))
+            self._out = []
+
+    def readline(self):
+        while True:
+            end = self._in.find(b"\n", self._pos)
+            if end >= 0:
+                break
+            # Nothing more buffered: the client is waiting on our replies
+            self.flush()
+            data = self.connection.recv(65536)
+            if not data:
+                return b""
+            self._in = self._in[self._pos:] + data
+            self._pos = 0
+        line = self._in[self._pos:end + 1]
+        self._pos = end + 1
+        return line
+
+    def handle(self):
+        sink = self.server.sink
+        sink.count('connections')
+        self.reply("220 fake.smtp ESMTP ready")
+        try:
+            self.dialogue(sink)
+        finally:
+            self.flush()
+
+    def dialogue(self, sink):
+        while True:
+            raw = self.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', 'replace').rstrip("\r\n")
+            verb = line.split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                sink.count('ehlo')
+                offer_tls = sink.tls_context and not isinstance(self.connection, ssl.SSLSocket)
+                self.reply("250-fake.smtp")
+                if offer_tls:
+                    self.reply("250-STARTTLS")
+                if sink.pipelining:
+                    self.reply("250-PIPELINING")
+                self.reply("250-AUTH LOGIN PLAIN")
+                self.reply("250 8BITMIME")
+            elif verb == 'STARTTLS' and sink.tls_context:
+                self.reply("220 Ready to start TLS")
+                self.flush()
+                self.connection = sink.tls_context.wrap_socket(self.connection, server_side=True)
+                self._in, self._pos = b"", 0
+                sink.count('tls')
+            elif verb == 'AUTH':
+                sink.count('logins')
+                parts = line.split(' ')
+                if parts[1].upper() == 'LOGIN' and len(parts) == 2:
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.readline()
+                elif parts[1].upper() == 'LOGIN':
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == 'RCPT':
+                self.rcpt_ok = False
+                if sink.refuses(line):
+                    sink.count('refused')
+                    self.reply("550 5.1.1 User unknown")
+                elif sink.fail_rate and random.random() < sink.fail_rate:
+                    sink.count('deferred')
+                    self.reply("451 4.3.0 Try again later")
+                else:
+                    self.rcpt_ok = True
+                    self.reply("250 OK")
+            elif verb in ('MAIL', 'RSET', 'NOOP'):
+                if verb == 'NOOP':
+                    sink.count('noops')
+                self.rcpt_ok = False
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                if not self.rcpt_ok:
+                    self.reply("554 5.5.1 No valid recipients")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while True:
+                    chunk = self.readline()
+                    if not chunk or chunk == b".\r\n":
+                        break
+                if sink.drops_now():
+                    self._out = []
+                    return
+                sink.count('messages')
+                self.rcpt_ok = False
+                self.reply("250 OK queued")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer:
+    """SMTP sink on 127.0.0.1 that counts connections, logins, messages and refused/deferred recipients."""
+
+    def __init__(self, latency=0.0, tls_context=None, pipelining=False, fail_rate=0.0):
+        self.latency = latency
+        self.tls_context = tls_context
+        self.pipelining = pipelining
+        self.fail_rate = fail_rate
+        self.counters = {'connections': 0, 'ehlo': 0, 'tls': 0, 'logins': 0, 'noops': 0, 'messages': 0,
+                         'refused': 0, 'deferred': 0}
+        self.refuse = set()
+        self.drop_after = None
+        self._lock = threading.Lock()
+        self._server = ThreadingTCPServer(("127.0.0.1", 0), FakeSMTPHandler)
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def drops_now(self):
+        with self._lock:
+            if self.drop_after is None:
+                return False
+            self.drop_after -= 1
+            if self.drop_after > 0:
+                return False
+            self.drop_after = None
+            return True
+
+    def refuses(self, rcpt_line):
+        address = rcpt_line.partition(':')[2].strip().strip('<>').split('>')[0].lower()
+        return address in self.refuse
+
+    def reset(self):
+        with self._lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- SUPABASE (POSTGREST + AUTH ADMIN) STUB ---
+def _in_list(value):
+    """The values of a PostgREST in.(...) filter; double-quoted ones may hold commas and \\-escapes."""
+    return [re.sub(r'\\(.)', r'\1', v[1:-1]) if v.startswith('"') else v
+            for v in re.findall(r'"(?:[^"\\]|\\.)*"|[^,]+', value[1:-1])]
+
+
+def _matches(row, filters):
+    for column, expr in filters.items():
+        op, _, value = expr.partition('.')
+        current = row.get(column)
+        if op == 'eq' and str(current) != value:
+            return False
+        if op == 'in' and str(current) not in _in_list(value):
+            return False
+        if op in ('gt', 'lt') and (current is None or (str(current) > value) != (op == 'gt')):
+            return False
+        if op in ('gte', 'lte') and (current is None or (str(current) < value if op == 'gte' else str(current) > value)):
+            return False
+    return True
+
+
+class FakeSupabaseHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real thing
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def setup(self):
+        if self.server.stub.tls_context:
+            self.request = self.server.stub.tls_context.wrap_socket(self.request, server_side=True)
+        super().setup()
+        self.server.stub.count('connections')
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def route(self, method):
+        stub = self.server.stub
+        stub.count('requests')
+        if stub.latency:
+            time.sleep(stub.latency)
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        body = self.read_json() if method in ('POST', 'PUT', 'PATCH') else None
+        parts = url.path.strip('/').split('/')
+
+        if parts[:2] == ['rest', 'v1'] and len(parts) == 4 and parts[2] == 'rpc':
+            return self.rpc(stub, parts[3], body or {})
+        if parts[:2] == ['rest', 'v1'] and len(parts) == 3:
+            return self.rest(stub, method, parts[2], query, body)
+        if parts[:3] == ['auth', 'v1', 'admin']:
+            return self.auth(stub, method, parts[3:], query, body)
+        self.reply(404, {'message': 'not found'})
+
+    def rest(self, stub, method, table, query, body):
+        query.pop('select', None)
+        order = query.pop('order', None)
+        limit = query.pop('limit', None)
+        offset = int(query.pop('offset', 0))
+        with stub.lock:
+            rows = stub.tables.setdefault(table, [])
+            if method == 'GET':
+                found = [r for r in rows if _matches(r, query)]
+                # "a.asc,b.desc": stable sorts from the last column to the first
+                for term in reversed(order.split(',') if order else []):
+                    column, _, direction = term.partition('.')
+                    found.sort(key=lambda r: str(r.get(column)), reverse=direction == 'desc')
+                end = offset + int(limit) if limit else None
+                return self.reply(200, found[offset:end])
+            if method == 'POST':
+                new_rows = body if isinstance(body, list) else [body]
+                # Column defaults, as in setup_logs.sql
+                now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+                new_rows = [{'id': str(uuid.uuid4()), 'created_at': now, **r} for r in new_rows]
+                rows.extend(new_rows)
+                if 'return=minimal' in (self.headers.get('Prefer') or ''):
+                    return self.reply(201)
+                return self.reply(201, new_rows)
+            if method == 'PATCH':
+                for r in rows:
+                    if _matches(r, query):
+                        r.update(body)
+                return self.reply(204)
+            if method == 'DELETE':
+                stub.tables[table] = [r for r in rows if not _matches(r, query)]
+                return self.reply(204)
+        self.reply(405, {'message': 'method not allowed'})
+
+    def rpc(self, stub, function_name, body):
+        if function_name == 'get_auth_user_by_email':
+            email = body.get('email_input', '').lower()
+            with stub.lock:
+                return self.reply(200, [
+                    {'id': u['id'], 'email': u['email'], 'user_metadata': u['user_metadata']}
+                    for u in stub.users if u['email'].lower() == email
+                ])
+        self.reply(200, None)
+
+    def auth(self, stub, method, parts, query, body):
+        with stub.lock:
+            if parts == ['users'] and method == 'GET':
+                page = int(query.get('page', 1))
+                per_page = int(query.get('per_page', 50))
+                start = (page - 1) * per_page
+                return self.reply(200, {'users': stub.users[start:start + per_page]})
+            if len(parts) == 2 and parts[0] == 'users':
+                user = next((u for u in stub.users if u['id'] == parts[1]), None)
+                if user is None:
+                    return self.reply(404, {'msg': 'User not found'})
+                if method == 'GET':
+                    return self.reply(200, user)
+                if method == 'PUT':
+                    user.update(body or {})
+                    return self.reply(200, user)
+                if method == 'DELETE':
+                    stub.users.remove(user)
+                    return self.reply(200, {})
+            if parts == ['generate_link'] and method == 'POST':
+                user = stub.add_user(body['email'], body.get('data') or {})
+                link = f"http://localhost/verify?token={user['id']}"
+                return self.reply(200, {**user, 'action_link': link, 'properties': {'action_link': link}})
+        self.reply(404, {'msg': 'not found'})
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_PUT(self):
+        self.route('PUT')
+
+    def do_PATCH(self):
+        self.route('PATCH')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+
+class FakeSupabase:
+    """
+    In-memory PostgREST/Auth admin stub on 127.0.0.1. Supports eq./in./gt./lt./gte./lte. filters, order/limit/offset,
+    inserts (single row or JSON array), deletes, RPC calls and paged admin users.
+    With a tls_context it serves https.
+    """
+
+    def __init__(self, latency=0.0, tls_context=None):
+        self.latency = latency
+        self.tls_context = tls_context
+        self.lock = threading.Lock()
+        self.tables = {}
+        self.users = []
+        self.counters = {'connections': 0, 'requests': 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSupabaseHandler)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self.url = f"{'https' if tls_context else 'http'}://127.0.0.1:{self.port}"
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def reset(self):
+        with self.lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def add_user(self, email, metadata=None):
+        """Creates an auth user record (no profile row)."""
+        user = {'id': str(uuid.uuid4()), 'email': email, 'user_metadata': metadata or {}}
+        self.users.append(user)
+        return user
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
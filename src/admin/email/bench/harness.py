@@ -0,0 +1,117 @@
+"""
+Shared plumbing for the scripts that run backend.py as a subprocess: finding
+a port, waiting for it, firing raw HTTP POSTs, sampling the server's threads
+and memory from /proc and summarising latencies.
+"""
+import asyncio
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend.py')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+# --- CLIENT ---
+async def one_request(port, path, body, timeout=None):
+    """
+    POSTs `body` (a JSON-serialisable value) on a fresh connection and reads
+    the whole response. Returns (status, seconds); status is 0 when the
+    connection failed or `timeout` ran out.
+    """
+    payload = json.dumps(body).encode('utf-8')
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        status = int(response.split(b" ", 2)[1]) if response else 0
+    except (OSError, asyncio.TimeoutError):
+        status = 0
+    return status, time.perf_counter() - started
+
+
+# --- SERVER SIDE ---
+def tree_usage(pid):
+    """(threads, VmRSS in kB) summed over `pid` and its children (pre-fork workers), from /proc."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [pid, *map(int, f.read().split())]
+    except OSError:
+        pids = [pid]
+    threads = rss_kb = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith('Threads:'):
+                        threads += int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return threads, rss_kb
+
+
+class ProcSampler(threading.Thread):
+    """Peak tree_usage() of a process, sampled until stopped."""
+
+    def __init__(self, pid, interval=0.02):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss_kb = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            threads, rss_kb = tree_usage(self.pid)
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss_kb = max(self.peak_rss_kb, rss_kb)
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+# --- REPORTING ---
+def percentiles(timings, *points):
+    """
+    {point: milliseconds} for each percentile in `points` of `timings`
+    (seconds). The inclusive method stays within the samples, so p99 of a
+    short run is never above its max; with fewer than two samples every
+    value is None.
+    """
+    if len(timings) < 2:
+        return {point: None for point in points}
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {point: cuts[point - 1] * 1000 for point in points}
+
+
+def ms(value, width=7, digits=1):
+    """A percentiles() value padded for a report line, with its unit; n/a when there was too little data."""
+    return f"{'n/a':>{width + 2}}" if value is None else f"{value:{width}.{digits}f}ms"
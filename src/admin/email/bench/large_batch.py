@@ -0,0 +1,94 @@
+"""
+Server memory for ever larger /send-email/batch requests, streamed in and out.
+
+    python bench/large_batch.py [--sizes 10000,100000,300000]
+
+Starts backend.py with DISABLE_EMAIL_SENDING=true (nothing reaches SMTP), then
+for each size uploads one chunked batch of that many recipients and reads the
+NDJSON progress stream. Reports body size, time, and the server's peak RSS
+sampled from /proc: with the streaming body layer the peak stays roughly flat
+as the batch grows, apart from the duplicate check's fingerprint set (under
+100 bytes per recipient).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from bench.fakes import FakeSupabase  # noqa: E402
+from bench.harness import BACKEND, ProcSampler, free_port, wait_for_port  # noqa: E402
+
+
+def batch_chunks(size):
+    """The request body in ~64 KB pieces, generated on the fly so the client stays small too."""
+    yield b'{"subject": "Hello {{name}}", "htmlContent": "<p>Hi {{name}}</p>", "stream": true, "recipients": ['
+    for start in range(0, size, 1000):
+        piece = ",".join(json.dumps({'recipientEmail': f"user{i}@example.com", 'variables': {'name': f"User {i}"}})
+                         for i in range(start, min(start + 1000, size)))
+        yield (("," if start else "") + piece).encode()
+    yield b']}'
+
+
+def send_batch(port, size):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(b"POST /send-email/batch HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 b"Transfer-Encoding: chunked\r\nAccept: application/x-ndjson\r\n\r\n")
+    uploaded = 0
+    for chunk in batch_chunks(size):
+        uploaded += len(chunk)
+        sock.sendall(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+    sock.sendall(b"0\r\n\r\n")
+
+    # Keep only the last line: the client should not be what runs out of memory
+    reader = sock.makefile('rb')
+    last = b''
+    for line in reader:
+        if line.strip():
+            last = line
+    sock.close()
+    return uploaded, json.loads(last)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--sizes', default="10000,100000,300000")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    with tempfile.TemporaryDirectory() as workdir, FakeSupabase() as stub:
+        port = free_port()
+        env = dict(os.environ,
+                   PORT=str(port), DISABLE_EMAIL_SENDING="true", LOG_LEVEL="WARNING",
+                   VITE_SUPABASE_URL=stub.url, SUPABASE_SERVICE_ROLE_KEY="bench",
+                   BATCH_MAX_ITEMS=str(max(sizes)), MAX_BULK_BODY_BYTES=str(1024 ** 3),
+                   JOB_QUEUE_PATH=os.path.join(workdir, "jobs.sqlite3"),
+                   LOG_SPILL_PATH=os.path.join(workdir, "spill.jsonl"),
+                   RATE_LIMIT_IP_PER_MIN="0", RATE_LIMIT_ROUTE_PER_MIN="0", RATE_LIMIT_ROUTES="",
+                   RATE_LIMIT_RECIPIENT_PER_HOUR="0", SMTP_RATE_PER_SEC="0")
+        proc = subprocess.Popen([sys.executable, BACKEND], env=env, cwd=workdir,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            for size in sizes:
+                sampler = ProcSampler(proc.pid)
+                sampler.start()
+                started = time.perf_counter()
+                uploaded, summary = send_batch(port, size)
+                elapsed = time.perf_counter() - started
+                sampler.stop()
+                print(f"recipients={size:<7} body={uploaded / 1024 ** 2:6.1f}MB sent={summary.get('sent'):<7} "
+                      f"time={elapsed:6.1f}s peak_rss={sampler.peak_rss_kb / 1024:6.1f}MB")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Load-test suite: every proxy route at set concurrency levels, results saved as JSON.
+
+    python bench/load.py [--routes send-email,otp-verify,...] [--concurrency 1,16,64] [--requests 400]
+                         [--smtp-latency 0.01] [--smtp-fail-rate 0.02] [--supabase-latency 0.005]
+                         [--workers 1] [--mode threaded] [--output FILE] [--baseline FILE]
+
+Starts the SMTP sink (latency per round trip, a share of RCPTs deferred with
+451) and the PostgREST/Auth stub (verification_codes, profiles, email_logs,
+/auth/v1/admin/users), runs backend.py against them, and for each route and
+concurrency level fires --requests requests with that many in flight. Before
+each run the stub is seeded with what the route needs (users, codes,
+profiles) so every request takes its success path.
+
+Each result records throughput, p50/p95/p99 latency, status counts, peak
+threads and RSS of the server (summed over all processes with --workers > 1)
+and the SMTP and Supabase connections and requests it made, counting the
+background sends a route queued: a run ends once the job queue is empty.
+Admission rate limits and the SMTP pace are off, since all load comes from
+one address. Results go to --output (default bench/results/load-<UTC time>.json);
+--baseline prints the change against an earlier file.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from bench.fakes import FakeSMTPServer, FakeSupabase  # noqa: E402
+from bench.harness import BACKEND, ProcSampler, free_port, ms, one_request, percentiles, wait_for_port  # noqa: E402
+
+DOMAINS = ["gmail.com", "outlook.com", "yahoo.com", "example.org"]
+CODE = "123456"
+FAR_FUTURE = "2099-01-01T00:00:00Z"
+
+
+# --- ROUTES ---
+def seed_users(stub, prefix, first, count, codes=False):
+    """Auth users with profiles (and, for verify, a live code) for indexes first..first+count-1."""
+    expires_at = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)).isoformat()
+    users = []
+    with stub.lock:
+        for i in range(first, first + count):
+            email = f"{prefix}{i}@example.com"
+            user = stub.add_user(email, {'username': f"{prefix}{i}"})
+            stub.tables.setdefault('profiles', []).append({'id': user['id'], 'email': email, 'username': f"{prefix}{i}"})
+            if codes:
+                stub.tables.setdefault('verification_codes', []).append(
+                    {'email': email, 'code': CODE, 'expires_at': expires_at})
+            users.append(user)
+    return users
+
+
+class Route:
+    """One scenario: `body(i)` is the JSON for request i; `seed(stub, first, count)` prepares the stub."""
+
+    def __init__(self, path, body, seed=None):
+        self.path = path
+        self.body = body
+        self.seed = seed
+
+
+def batch_route(size):
+    def body(i):
+        return {'subject': "Hello {{name}}", 'htmlContent': "<p>Hi {{name}}</p>",
+                'recipients': [{'recipientEmail': f"batch{i}-{n}@{DOMAINS[n % len(DOMAINS)]}",
+                                'variables': {'name': f"User {n}"}} for n in range(size)]}
+    return Route('/send-email/batch', body)
+
+
+def delete_route(per_request):
+    users = {}
+
+    def seed(stub, first, count):
+        seeded = seed_users(stub, "delete", first * per_request, count * per_request)
+        for n, user in enumerate(seeded):
+            users.setdefault(first + n // per_request, []).append(user['id'])
+
+    return Route('/delete-users', lambda i: {'userIds': users.pop(i)}, seed)
+
+
+def routes(batch_size):
+    return {
+        'send-email': Route('/send-email', lambda i: {
+            'recipientEmail': f"load{i}@{DOMAINS[i % len(DOMAINS)]}", 'subject': "Load test",
+            'htmlContent': "<p>Hello</p>"}),
+        'send-email-batch': batch_route(batch_size),
+        'generate-link': Route('/generate-link', lambda i: {'email': f"link{i}@example.com"}),
+        'otp-send': Route('/otp', lambda i: {'action': 'send', 'email': f"otp{i}@example.com"}),
+        'otp-verify': Route('/otp', lambda i: {'action': 'verify', 'email': f"verify{i}@example.com", 'code': CODE},
+                            lambda stub, first, count: seed_users(stub, "verify", first, count, codes=True)),
+        'delete-users': delete_route(5),
+        'campaigns': Route('/campaigns', lambda i: {
+            'name': f"load {i}", 'audience': {'emails': [f"camp{i}@example.com"]}, 'subject': "Hi",
+            'htmlContent': "<p>Hi</p>", 'sendAt': FAR_FUTURE}),
+    }
+
+
+# --- CLIENT ---
+async def drive(port, route, first, count, concurrency, timeout):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(i):
+        async with semaphore:
+            return await one_request(port, route.path, route.body(i), timeout)
+
+    return await asyncio.gather(*(bounded(i) for i in range(first, first + count)))
+
+
+# --- SERVER SIDE ---
+def metric(port, name):
+    """Current value of an unlabelled gauge from /metrics, or None."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            for line in response.read().decode().splitlines():
+                if line.startswith(name + " "):
+                    return float(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def drain(port, timeout):
+    """Waits for queued background sends to finish; returns the seconds waited."""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if not metric(port, 'email_proxy_job_queue_depth'):
+            break
+        time.sleep(0.05)
+    time.sleep(0.2)  # last email_logs flush
+    return time.perf_counter() - started
+
+
+def start_backend(args, smtp, stub, workdir):
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port), SERVER_MODE=args.mode, WORKERS=str(args.workers), LOG_LEVEL="WARNING",
+               SMTP_SERVER="127.0.0.1", SMTP_PORT=str(smtp.port), SMTP_STARTTLS="false", SMTP_PASSWORD="bench",
+               VITE_SUPABASE_URL=stub.url, SUPABASE_SERVICE_ROLE_KEY="bench",
+               JOB_QUEUE_PATH=os.path.join(workdir, "jobs.sqlite3"),
+               CAMPAIGN_DB_PATH=os.path.join(workdir, "campaigns.sqlite3"),
+               STATE_DB_PATH=os.path.join(workdir, "state.sqlite3"),
+               LOG_SPILL_PATH=os.path.join(workdir, "spill.jsonl"), LOG_FLUSH_MS="100",
+               RATE_LIMIT_IP_PER_MIN="0", RATE_LIMIT_ROUTE_PER_MIN="0", RATE_LIMIT_ROUTES="",
+               RATE_LIMIT_RECIPIENT_PER_HOUR="0", SMTP_RATE_PER_SEC="0")
+    proc = subprocess.Popen([sys.executable, BACKEND], env=env, cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    time.sleep(0.5)  # every pre-fork worker up
+    return proc, port
+
+
+def run_one(name, route, concurrency, first, args, proc, port, smtp, stub):
+    if route.seed:
+        route.seed(stub, first, args.requests)
+    before = dict(smtp.counters), dict(stub.counters)
+    sampler = ProcSampler(proc.pid)
+    sampler.start()
+    started = time.perf_counter()
+    results = asyncio.run(drive(port, route, first, args.requests, concurrency, args.timeout))
+    elapsed = time.perf_counter() - started
+    drained = drain(port, args.timeout)
+    sampler.stop()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    timings = sorted(t for _, t in results)
+    q = {f"p{point}": None if value is None else round(value, 2)
+         for point, value in percentiles(timings, 50, 95, 99).items()}
+    return {
+        'route': name,
+        'path': route.path,
+        'concurrency': concurrency,
+        'requests': len(results),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'latency_ms': dict(q, max=round(timings[-1] * 1000, 2) if timings else None),
+        'statuses': statuses,
+        'drain_s': round(drained, 3),
+        'peak_threads': sampler.peak_threads,
+        'peak_rss_mb': round(sampler.peak_rss_kb / 1024, 1),
+        'outbound': {
+            'smtp_connections': smtp.counters['connections'] - before[0]['connections'],
+            'smtp_messages': smtp.counters['messages'] - before[0]['messages'],
+            'supabase_connections': stub.counters['connections'] - before[1]['connections'],
+            'supabase_requests': stub.counters['requests'] - before[1]['requests'],
+        },
+    }
+
+
+# --- REPORTING ---
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_result(r):
+    lat, out = r['latency_ms'], r['outbound']
+    print(f"{r['route']:<17} c={r['concurrency']:<4} {r['throughput_rps']:8.1f} req/s "
+          f"p50={ms(lat['p50'])} p95={ms(lat['p95'])} p99={ms(lat['p99'])} "
+          f"threads={r['peak_threads']:<4} rss={r['peak_rss_mb']:6.1f}MB "
+          f"smtp_conns={out['smtp_connections']:<4} supabase_conns={out['supabase_connections']:<4} "
+          f"statuses={r['statuses']}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r['route'], r['concurrency']): r for r in baseline['results']}
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    for r in results:
+        b = old.get((r['route'], r['concurrency']))
+        if b is None:
+            continue
+        change = (r['throughput_rps'] / b['throughput_rps'] - 1) * 100 if b['throughput_rps'] else 0.0
+        print(f"{r['route']:<17} c={r['concurrency']:<4} throughput {change:+6.1f}%  "
+              f"p99 {ms(b['latency_ms']['p99'])} -> {ms(r['latency_ms']['p99'])}  "
+              f"supabase_conns {b['outbound']['supabase_connections']} -> {r['outbound']['supabase_connections']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--routes', default="all", help="comma-separated route names, or all")
+    parser.add_argument('--concurrency', default="1,16,64", help="comma-separated requests in flight")
+    parser.add_argument('--requests', type=int, default=400, help="requests per route and concurrency level")
+    parser.add_argument('--batch-size', type=int, default=20, help="recipients per /send-email/batch request")
+    parser.add_argument('--smtp-latency', type=float, default=0.01, help="seconds per SMTP round trip")
+    parser.add_argument('--smtp-fail-rate', type=float, default=0.02, help="share of RCPTs deferred with 451")
+    parser.add_argument('--smtp-pipelining', action='store_true', help="sink advertises PIPELINING")
+    parser.add_argument('--supabase-latency', type=float, default=0.005, help="seconds per stub request")
+    parser.add_argument('--workers', type=int, default=1, help="WORKERS (pre-fork processes)")
+    parser.add_argument('--mode', default="threaded", choices=("threaded", "asyncio"))
+    parser.add_argument('--timeout', type=float, default=60.0, help="per request, and for the queue to drain")
+    parser.add_argument('--output', help="results file (default bench/results/load-<UTC time>.json)")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    available = routes(args.batch_size)
+    names = list(available) if args.routes == "all" else args.routes.split(',')
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        parser.error(f"unknown route(s) {', '.join(unknown)}; choose from {', '.join(available)}")
+    levels = [int(c) for c in args.concurrency.split(',')]
+    started_at = datetime.datetime.now(datetime.timezone.utc)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, \
+            FakeSMTPServer(latency=args.smtp_latency, pipelining=args.smtp_pipelining,
+                           fail_rate=args.smtp_fail_rate) as smtp, \
+            FakeSupabase(latency=args.supabase_latency) as stub:
+        proc, port = start_backend(args, smtp, stub, workdir)
+        try:
+            first = 0
+            for name in names:
+                for concurrency in levels:
+                    result = run_one(name, available[name], concurrency, first, args, proc, port, smtp, stub)
+                    first += args.requests
+                    print_result(result)
+                    results.append(result)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    output = args.output or os.path.join(HERE, 'results', f"load-{started_at:%Y%m%dT%H%M%SZ}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {
+        'started_at': started_at.isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cores': len(os.sched_getaffinity(0)),
+        'settings': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"\nWrote {len(results)} result(s) to {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Replays the Supabase calls of one /otp verify against a local PostgREST/Auth
+stub: urllib.request per call (old), the pooled SupabaseClient, and the pooled
+client with the indexed get_auth_user_by_email lookup (current handler).
+
+    python bench/otp_verify_flow.py [--flows 500] [--concurrency 8] [--latency 0.002]
+
+Reports connections opened and p50/p99 latency per verify flow.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeSupabase  # noqa: E402
+from bench.harness import ms, percentiles  # noqa: E402
+from mail_proxy.supabase_client import SupabaseClient  # noqa: E402
+
+KEY = "bench-service-role-key"
+
+
+def seed(stub, flows):
+    stub.tables.clear()
+    stub.users.clear()
+    codes = stub.tables.setdefault('verification_codes', [])
+    profiles = stub.tables.setdefault('profiles', [])
+    for i in range(flows):
+        email = f"user{i}@example.com"
+        user = stub.add_user(email)
+        codes.append({'email': email, 'code': '123456'})
+        profiles.append({'id': user['id'], 'email': email})
+
+
+def urllib_call(base_url, method, path, body=None, params=None):
+    # The pre-pool pattern: a fresh connection per call
+    url = base_url + path
+    if params:
+        url += "?" + urllib.parse.urlencode(params)
+    req = urllib.request.Request(url, data=json.dumps(body).encode('utf-8') if body else None, headers={
+        "apikey": KEY, "Authorization": f"Bearer {KEY}", "Content-Type": "application/json",
+    }, method=method)
+    with urllib.request.urlopen(req) as response:
+        data = response.read()
+        return json.loads(data) if data else None
+
+
+def list_lookup(call, email):
+    # Old handler: first page of the admin users list, then a linear scan
+    users = call('GET', '/auth/v1/admin/users')['users']
+    return next(u for u in users if u['email'] == email)
+
+
+def rpc_lookup(call, email):
+    return call('POST', '/rest/v1/rpc/get_auth_user_by_email', body={'email_input': email})[0]
+
+
+def verify_flow(call, email, lookup=list_lookup):
+    """Same request sequence as handle_otp(action='verify') for an existing profile."""
+    codes = call('GET', '/rest/v1/verification_codes', params={'email': f'eq.{email}', 'code': 'eq.123456', 'select': '*'})
+    assert codes, email
+    user = lookup(call, email)
+    call('GET', '/rest/v1/profiles', params={'id': f"eq.{user['id']}"})
+    call('PUT', f"/auth/v1/admin/users/{user['id']}", body={'email_confirm': True})
+    call('DELETE', '/rest/v1/verification_codes', params={'email': f'eq.{email}'})
+
+
+# The verify flow only reads the first page of /auth/v1/admin/users, so runs
+# are split into rounds that each fit on one page.
+ROUND = 50
+
+
+def run(label, stub, flows, concurrency, call, lookup=list_lookup):
+    stub.reset()
+    timings = []
+
+    def one(i):
+        started = time.perf_counter()
+        verify_flow(call, f"user{i}@example.com", lookup)
+        timings.append(time.perf_counter() - started)
+
+    elapsed = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for done in range(0, flows, ROUND):
+            size = min(ROUND, flows - done)
+            seed(stub, size)
+            started = time.perf_counter()
+            list(executor.map(one, range(size)))
+            elapsed += time.perf_counter() - started
+    q = percentiles(timings, 50, 99)
+    print(f"{label:<10} flows={flows:<5} requests={stub.counters['requests']:<6} "
+          f"connections={stub.counters['connections']:<6} p50={ms(q[50], 6, 2)} "
+          f"p99={ms(q[99], 6, 2)} throughput={flows / elapsed:7.1f} flows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--flows', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.002, help="seconds per stub request")
+    args = parser.parse_args()
+
+    with FakeSupabase(latency=args.latency) as stub:
+        run("urllib", stub, args.flows, args.concurrency,
+            lambda m, p, body=None, params=None: urllib_call(stub.url, m, p, body, params))
+
+        client = SupabaseClient(stub.url, KEY, max_connections=args.concurrency)
+        pooled = lambda m, p, body=None, params=None: client.request(m, p, body, params)  # noqa: E731
+        run("pooled", stub, args.flows, args.concurrency, pooled)
+        run("indexed", stub, args.flows, args.concurrency, pooled, lookup=rpc_lookup)
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
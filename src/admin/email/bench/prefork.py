@@ -0,0 +1,100 @@
+"""
+Pre-fork scaling: throughput of POST /send-email at WORKERS=1, 2, 4, ...
+
+    python bench/prefork.py [--workers 1,2,4] [--requests 4000] [--concurrency 64] [--clients 4]
+
+Runs backend.py once per worker count against the local stand-ins, with
+sending disabled so each request is the proxy's own work: HTTP parsing,
+admission limits, suppression and recipient checks, and the job queue insert.
+Rate limits are on but set too high to trigger, so with several workers every
+request also pays for the shared limiters (three SQLite transactions). Load comes
+from `--clients` processes so the client is not the bottleneck. Throughput
+only scales with workers up to the number of free cores (reported below).
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from bench.fakes import FakeSMTPServer, FakeSupabase  # noqa: E402
+from bench.harness import BACKEND, free_port, ms, one_request, percentiles, tree_usage, wait_for_port  # noqa: E402
+
+
+async def drive(port, first, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index):
+        async with semaphore:
+            body = {'recipientEmail': f"user{index}@example.com", 'subject': "Hi", 'htmlContent': "<p>Hello</p>"}
+            return await one_request(port, '/send-email', body)
+
+    return await asyncio.gather(*(bounded(i) for i in range(first, first + count)))
+
+
+def client(port, first, count, concurrency):
+    """One load-generating process."""
+    return asyncio.run(drive(port, first, count, concurrency))
+
+
+def run(workers, args, smtp, stub, pool):
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port), WORKERS=str(workers), SERVER_MODE=args.mode, DISABLE_EMAIL_SENDING="true",
+               SMTP_SERVER="127.0.0.1", SMTP_PORT=str(smtp.port), SMTP_STARTTLS="false",
+               VITE_SUPABASE_URL=stub.url, SUPABASE_SERVICE_ROLE_KEY="bench", LOG_LEVEL="WARNING",
+               JOB_QUEUE_PATH=os.path.join(args.workdir, f"jobs-{workers}.sqlite3"),
+               CAMPAIGN_DB_PATH=os.path.join(args.workdir, f"campaigns-{workers}.sqlite3"),
+               STATE_DB_PATH=os.path.join(args.workdir, f"state-{workers}.sqlite3"),
+               LOG_SPILL_PATH=os.path.join(args.workdir, f"spill-{workers}.jsonl"),
+               RATE_LIMIT_IP_PER_MIN="100000000", RATE_LIMIT_ROUTE_PER_MIN="100000000", RATE_LIMIT_ROUTES="",
+               RATE_LIMIT_RECIPIENT_PER_HOUR="100000000")
+    proc = subprocess.Popen([sys.executable, BACKEND], env=env, cwd=args.workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        time.sleep(0.5)  # let every worker come up
+        share = args.requests // args.clients
+        started = time.perf_counter()
+        futures = [pool.submit(client, port, i * share, share, max(1, args.concurrency // args.clients))
+                   for i in range(args.clients)]
+        results = [r for f in futures for r in f.result()]
+        elapsed = time.perf_counter() - started
+        _, rss_kb = tree_usage(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    q = percentiles([t for _, t in results], 50, 99)
+    print(f"workers={workers:<3} statuses={statuses} p50={ms(q[50])} p99={ms(q[99])} "
+          f"throughput={len(results) / elapsed:7.1f} req/s rss_total={rss_kb / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--workers', default="1,2,4", help="comma-separated WORKERS values")
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--concurrency', type=int, default=64, help="requests in flight, across all clients")
+    parser.add_argument('--clients', type=int, default=4, help="load-generating processes")
+    parser.add_argument('--mode', default="threaded", choices=("threaded", "asyncio"))
+    args = parser.parse_args()
+
+    print(f"cores available: {len(os.sched_getaffinity(0))}")
+    with tempfile.TemporaryDirectory() as workdir, FakeSMTPServer() as smtp, FakeSupabase() as stub, \
+            ProcessPoolExecutor(max_workers=args.clients) as pool:
+        args.workdir = workdir
+        for workers in (int(w) for w in args.workers.split(',')):
+            run(workers, args, smtp, stub, pool)
+
+
+if __name__ == '__main__':
+    main()
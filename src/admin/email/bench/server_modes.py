@@ -0,0 +1,86 @@
+"""
+Load test: threaded vs asyncio server mode at N concurrent requests.
+
+    python bench/server_modes.py [--requests 1000] [--supabase-latency 0.05]
+
+Starts the local SMTP/Supabase stand-ins, then runs backend.py once per mode
+and fires every request at the same time at /generate-link (one Supabase
+call each). Reports status counts, p50/p99 latency, and the server's peak
+thread count and RSS sampled from /proc.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from bench.fakes import FakeSMTPServer, FakeSupabase  # noqa: E402
+from bench.harness import BACKEND, ProcSampler, free_port, ms, one_request, percentiles, wait_for_port  # noqa: E402
+
+
+async def timed(port, index, timings, statuses):
+    body = {'email': f"load{index}-{time.monotonic_ns()}@example.com"}
+    status, seconds = await one_request(port, '/generate-link', body)
+    timings.append(seconds)
+    statuses[status] = statuses.get(status, 0) + 1
+
+
+async def burst(port, requests):
+    timings, statuses = [], {}
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(port, i, timings, statuses) for i in range(requests)))
+    return time.perf_counter() - started, timings, statuses
+
+
+def run_mode(mode, args, smtp, stub):
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port), SERVER_MODE=mode,
+               SMTP_SERVER="127.0.0.1", SMTP_PORT=str(smtp.port), SMTP_STARTTLS="false",
+               VITE_SUPABASE_URL=stub.url, SUPABASE_SERVICE_ROLE_KEY="bench",
+               SUPABASE_MAX_CONNECTIONS=str(args.workers), AIO_CONCURRENCY=str(args.workers),
+               JOB_QUEUE_PATH=os.path.join(args.workdir, f"jobs-{mode}.sqlite3"),
+               LOG_SPILL_PATH=os.path.join(args.workdir, f"spill-{mode}.jsonl"),
+               # Every request comes from 127.0.0.1: measure the servers, not the admission limits
+               RATE_LIMIT_IP_PER_MIN="0", RATE_LIMIT_ROUTE_PER_MIN="0", RATE_LIMIT_ROUTES="")
+    proc = subprocess.Popen([sys.executable, BACKEND], env=env, cwd=args.workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        sampler = ProcSampler(proc.pid)
+        sampler.start()
+        elapsed, timings, statuses = asyncio.run(burst(port, args.requests))
+        sampler.stop()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    q = percentiles(timings, 50, 99)
+    print(f"{mode:<9} requests={args.requests:<5} statuses={statuses} "
+          f"p50={ms(q[50])} p99={ms(q[99])} "
+          f"throughput={args.requests / elapsed:7.1f} req/s "
+          f"peak_threads={sampler.peak_threads:<5} peak_rss={sampler.peak_rss_kb / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=64,
+                        help="AIO_CONCURRENCY and SUPABASE_MAX_CONNECTIONS for both modes")
+    parser.add_argument('--supabase-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir, FakeSMTPServer() as smtp, \
+            FakeSupabase(latency=args.supabase_latency) as stub:
+        args.workdir = workdir
+        for mode in ('threaded', 'asyncio'):
+            run_mode(mode, args, smtp, stub)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Counts SMTP handshakes per 1,000 sends: one-connection-per-email vs SMTPPool.
+
+    python bench/smtp_handshakes.py [--sends 1000] [--threads 16] [--latency 0.001]
+
+Runs against a local fake SMTP server, so the numbers only show connection
+behaviour, not real relay latency.
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeSMTPServer  # noqa: E402
+from mail_proxy.smtp_pool import SMTPPool  # noqa: E402
+
+
+def build_message(i):
+    msg = EmailMessage()
+    msg['Subject'] = f"Bench {i}"
+    msg['From'] = "Bench <bench@localhost>"
+    msg['To'] = f"user{i}@example.com"
+    msg.set_content("Please enable HTML to view this email.")
+    msg.add_alternative("<p>Hello</p>", subtype='html')
+    return msg
+
+
+def send_unpooled(port, msg):
+    # Mirrors the old send_smtp_email: connect, login, send, quit
+    with smtplib.SMTP("127.0.0.1", port) as server:
+        server.login("emailapikey", "secret")
+        server.send_message(msg)
+
+
+def run(label, sink, sends, threads, send):
+    sink.reset()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(send, (build_message(i) for i in range(sends))))
+    elapsed = time.perf_counter() - started
+    c = sink.counters
+    per_k = 1000.0 / sends
+    print(f"{label:<10} sent={c['messages']:<6} connections={c['connections']:<6} "
+          f"logins={c['logins']:<6} noops={c['noops']:<5} "
+          f"handshakes/1k={c['connections'] * per_k:<8.1f} elapsed={elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--sends', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.001, help="seconds per SMTP command")
+    args = parser.parse_args()
+
+    with FakeSMTPServer(latency=args.latency) as sink:
+        run("unpooled", sink, args.sends, args.threads, lambda msg: send_unpooled(sink.port, msg))
+
+        pool = SMTPPool("127.0.0.1", sink.port, "emailapikey", "secret",
+                        size=args.pool_size, starttls=False)
+        run("pooled", sink, args.sends, args.threads, pool.send_message)
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
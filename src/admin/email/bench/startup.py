@@ -0,0 +1,102 @@
+"""
+Cold start: how long a fresh backend.py takes to become useful.
+
+    python bench/startup.py [--runs 10] [--budget-ms 1500]
+
+For each run this starts a new interpreter and measures
+  import    - `import mail_proxy.app` alone
+  ready     - spawn until the port accepts connections
+  first     - latency of the first POST /generate-link (builds the lazy Supabase client)
+and reports median / max. Exits 1 if median spawn-to-first-response exceeds
+--budget-ms, so it can gate container image changes in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from bench.fakes import FakeSMTPServer, FakeSupabase  # noqa: E402
+from bench.harness import BACKEND, free_port, wait_for_port  # noqa: E402
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import mail_proxy.app; print(time.perf_counter() - t)"
+
+
+def time_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=os.path.dirname(HERE),
+                         capture_output=True, text=True, check=True).stdout
+    return float(out)
+
+
+def time_boot(args, smtp, stub, run):
+    port = free_port()
+    env = dict(os.environ,
+               PORT=str(port), SERVER_MODE=args.mode, LOG_LEVEL="WARNING",
+               SMTP_SERVER="127.0.0.1", SMTP_PORT=str(smtp.port), SMTP_STARTTLS="false",
+               VITE_SUPABASE_URL=stub.url, SUPABASE_SERVICE_ROLE_KEY="bench",
+               JOB_QUEUE_PATH=os.path.join(args.workdir, f"jobs-{run}.sqlite3"),
+               LOG_SPILL_PATH=os.path.join(args.workdir, f"spill-{run}.jsonl"))
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, BACKEND], env=env, cwd=args.workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, timeout=30.0)
+        ready = time.perf_counter() - started
+
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}/generate-link",
+            data=json.dumps({'email': f"startup{run}@example.com"}).encode(),
+            headers={'Content-Type': 'application/json'})
+        sent = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+        done = time.perf_counter()
+        return ready, done - sent, done - started
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def report(name, samples):
+    print(f"{name:<7} median={statistics.median(samples) * 1000:7.1f}ms max={max(samples) * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--mode', choices=('threaded', 'asyncio'), default='threaded')
+    parser.add_argument('--budget-ms', type=float, default=1500,
+                        help="fail if median spawn-to-first-response is slower than this")
+    args = parser.parse_args()
+
+    imports, readies, firsts, totals = [], [], [], []
+    with tempfile.TemporaryDirectory() as workdir, FakeSMTPServer() as smtp, FakeSupabase() as stub:
+        args.workdir = workdir
+        for run in range(args.runs):
+            imports.append(time_import())
+            ready, first, total = time_boot(args, smtp, stub, run)
+            readies.append(ready)
+            firsts.append(first)
+            totals.append(total)
+
+    report("import", imports)
+    report("ready", readies)
+    report("first", firsts)
+    report("total", totals)
+
+    median_ms = statistics.median(totals) * 1000
+    if median_ms > args.budget_ms:
+        print(f"FAIL: median cold start {median_ms:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+        sys.exit(1)
+    print(f"OK: median cold start {median_ms:.1f}ms (budget {args.budget_ms:.0f}ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Memory and lookup cost of the suppression index, against a plain set of addresses.
+
+    python bench/suppression_index.py [--addresses 1000000] [--lookups 200000]
+
+Fills a SuppressionIndex with N synthetic addresses (adds + compact, as the
+refresher does) and reports its size, the size of a Python set holding the
+same addresses, and the per-lookup time for suppressed addresses (Bloom
+maybe + binary search) and for clean ones (usually answered by the Bloom
+filter alone). Then times one incremental refresh through SuppressionList
+against the local PostgREST fake: only rows newer than the watermark are read.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeSupabase  # noqa: E402
+from mail_proxy.supabase_client import SupabaseClient  # noqa: E402
+from mail_proxy.suppression import SuppressionIndex, SuppressionList  # noqa: E402
+
+
+def address(i):
+    return f"user{i}@example.com"
+
+
+def per_lookup_us(index, emails):
+    started = time.perf_counter()
+    for email in emails:
+        email in index  # noqa: B015
+    return (time.perf_counter() - started) / len(emails) * 1e6
+
+
+def bench_index(count, lookups):
+    started = time.perf_counter()
+    index = SuppressionIndex(capacity=count)
+    for i in range(count):
+        index.add(address(i))
+        if index.pending() > max(10000, len(index) // 4):
+            index.compact()
+    index.compact()
+    built = time.perf_counter() - started
+
+    tracemalloc.start()
+    plain = {address(i) for i in range(count)}
+    plain_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del plain
+
+    step = max(1, count // lookups)
+    hits = [address(i) for i in range(0, count, step)][:lookups]
+    misses = [f"someone{i}@example.org" for i in range(lookups)]
+    print(f"addresses={count} build={built:5.1f}s index={index.memory_bytes() / 1024 ** 2:6.1f}MB "
+          f"set_of_str={plain_bytes / 1024 ** 2:6.1f}MB")
+    assert all(email in index for email in hits) and not any(email in index for email in misses)
+    print(f"lookup suppressed={per_lookup_us(index, hits):5.2f}us clean={per_lookup_us(index, misses):5.2f}us")
+
+
+def bench_refresh(rows):
+    with FakeSupabase() as stub:
+        stub.tables['email_logs'] = [
+            {'id': f"{i:08d}", 'created_at': f"2026-01-01T00:00:{i // 1000:02d}", 'recipient_email': address(i),
+             'status': 'failed', 'error_message': "{'x': (550, b'5.1.1 User unknown')}"}
+            for i in range(rows)
+        ]
+        client = SupabaseClient(stub.url, "bench")
+        suppression = SuppressionList(client)
+        for label in ("initial", "incremental"):
+            before = stub.counters['requests']
+            started = time.perf_counter()
+            suppression.refresh()
+            print(f"refresh/{label:<12} time={(time.perf_counter() - started) * 1000:7.1f}ms "
+                  f"requests={stub.counters['requests'] - before:<3} addresses={len(suppression.index)}")
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--addresses', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--refresh-rows', type=int, default=20000)
+    args = parser.parse_args()
+    bench_index(args.addresses, args.lookups)
+    bench_refresh(args.refresh_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Per-message cost of rendering a template and building the MIME bytes:
+regex render + EmailMessage per send vs a precompiled MessageTemplate.
+
+    python bench/template_render.py [--messages 2000]
+
+Measures CPU only (no SMTP); "shared" is one HTML body for every recipient
+(the frontend's bulk send), "personalised" substitutes a name per recipient.
+"""
+import argparse
+import html
+import io
+import os
+import re
+import sys
+import time
+from email.generator import BytesGenerator
+from email.message import EmailMessage
+from email.policy import SMTP
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mail_proxy.templates import WELCOME_HTML, MessageTemplate  # noqa: E402
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+SUBJECT = "Welcome to the Future of Coding, {{member_name}}! 🚀"
+
+
+def legacy_render(text, variables):
+    # What batch.render did: one regex pass over the whole template per recipient
+    return PLACEHOLDER.sub(
+        lambda m: html.escape(str(variables[m.group(1)])) if m.group(1) in variables else m.group(0),
+        text,
+    )
+
+
+def legacy_build(recipient, subject, html_content):
+    # What send_smtp_email did, plus the flattening smtplib.send_message performs
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = "Truvgo Communities <varshith@truvgo.me>"
+    msg['To'] = recipient
+    msg.set_content("Please enable HTML to view this email.")
+    msg.add_alternative(html_content, subtype='html')
+    out = io.BytesIO()
+    BytesGenerator(out, policy=SMTP).flatten(msg, linesep='\r\n')
+    return out.getvalue()
+
+
+def measure(label, messages, build):
+    started = time.perf_counter()
+    size = 0
+    for i in range(messages):
+        size += len(build(i))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / messages * 1e6:>8.1f} us/msg  {size // messages:>6} bytes/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+    n = args.messages
+
+    shared_html = legacy_render(WELCOME_HTML, {'member_name': "there"})
+    shared = MessageTemplate("Welcome to Truvgo!", shared_html)
+    personal = MessageTemplate(SUBJECT, WELCOME_HTML)
+
+    print(f"template: {len(WELCOME_HTML)} bytes, {n} messages")
+    measure("shared / EmailMessage", n,
+            lambda i: legacy_build(f"user{i}@example.com", "Welcome to Truvgo!", shared_html))
+    measure("shared / compiled", n,
+            lambda i: shared.build(f"user{i}@example.com")[1])
+
+    def legacy_personal(i):
+        variables = {'member_name': f"Member {i}"}
+        return legacy_build(f"user{i}@example.com", legacy_render(SUBJECT, variables),
+                            legacy_render(WELCOME_HTML, variables))
+
+    measure("personalised / EmailMessage", n, legacy_personal)
+    measure("personalised / compiled", n,
+            lambda i: personal.build(f"user{i}@example.com", {'member_name': f"Member {i}"})[1])
+
+
+if __name__ == '__main__':
+    main()
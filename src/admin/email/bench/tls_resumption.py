@@ -0,0 +1,83 @@
+"""
+Reconnect cost with and without TLS session resumption, for SMTP (STARTTLS) and Supabase (https).
+
+    python bench/tls_resumption.py [--reconnects 50]
+
+Runs against local fakes with a throwaway certificate. Every round sends one
+message / one REST call and then closes the pool, so each round pays a new
+TCP connect + TLS handshake. "default" is a plain ssl.create_default_context();
+"resuming" is mail_proxy.tls.create_context(). The handshake counts come from
+the same email_proxy_tls_handshakes_total counter that /metrics exposes
+(only the resuming context reports to it). Over loopback the time saved is
+small; against a remote relay each resumed handshake also skips the
+certificate chain transfer and verification.
+"""
+import argparse
+import os
+import ssl
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fakes import FakeSMTPServer, FakeSupabase, self_signed_certificate  # noqa: E402
+from bench.harness import ms, percentiles  # noqa: E402
+from mail_proxy.smtp_pool import SMTPPool  # noqa: E402
+from mail_proxy.supabase_client import SupabaseClient  # noqa: E402
+from mail_proxy.tls import HANDSHAKES, create_context  # noqa: E402
+
+MESSAGE = b"Subject: bench\r\n\r\nHello\r\n"
+
+
+def handshakes():
+    return {kind: sum(v for (_, k), v in HANDSHAKES._values.items() if k == kind) for kind in ('full', 'resumed')}
+
+
+def smtp_round(smtp, context):
+    pool = SMTPPool("127.0.0.1", smtp.port, "emailapikey", "secret", size=1, starttls=True, context=context)
+    pool.sendmail("bench@localhost", ["user@example.com"], MESSAGE)
+    pool.close()
+
+
+def supabase_round(stub, context):
+    client = SupabaseClient(stub.url, "bench", max_connections=1, context=context)
+    client.rest('GET', 'email_logs')
+    client.close()
+
+
+def run(label, reconnects, one_round, server, context):
+    before = handshakes()
+    timings = []
+    for _ in range(reconnects):
+        started = time.perf_counter()
+        one_round(server, context)
+        timings.append(time.perf_counter() - started)
+    after = handshakes()
+    counts = {kind: after[kind] - before[kind] for kind in after}
+    q = percentiles(timings, 50, 95)
+    print(f"{label:<20} median={ms(q[50], 6, 2)} "
+          f"p95={ms(q[95], 6, 2)} "
+          f"full={counts['full']:<4} resumed={counts['resumed']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--reconnects', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server_context, cert = self_signed_certificate(workdir)
+        default = ssl.create_default_context()
+        resuming = create_context()
+        for context in (default, resuming):
+            context.load_verify_locations(cert)
+
+        with FakeSMTPServer(tls_context=server_context) as smtp, FakeSupabase(tls_context=server_context) as stub:
+            for name, context in (("default", default), ("resuming", resuming)):
+                run(f"smtp/{name}", args.reconnects, smtp_round, smtp, context)
+                run(f"supabase/{name}", args.reconnects, supabase_round, stub, context)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+"""
+Support modules for the Python email proxy (backend.py).
+"""
@@ -0,0 +1,223 @@
+import asyncio
+import http.client
+import io
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+MAX_HEADER_BYTES = 64 * 1024
+READ_TIMEOUT = 30.0
+# How long a handler waits on a client that has stopped reading before the write fails
+WRITE_TIMEOUT = 30.0
+
+log = logging.getLogger(__name__)
+
+
+class AsyncRequestWriter:
+    """
+    File-like `wfile` that hands writes from a worker thread to the event loop.
+    Each write waits on the connection's StreamWriter.drain(), so once the
+    transport buffer passes its high-water mark (a client reading slowly) the
+    handler thread blocks, as on a socket, instead of piling the rest of a
+    streamed response up in memory.
+    """
+
+    def __init__(self, loop, writer):
+        self._loop = loop
+        self._writer = writer
+
+    async def _send(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def write(self, data):
+        asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(self._send(bytes(data)), WRITE_TIMEOUT), self._loop).result()
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class AsyncRequestReader:
+    """
+    File-like `rfile` for a worker thread: each read is run on the event loop
+    against the connection's StreamReader, so the body arrives as the handler
+    consumes it instead of being buffered up front.
+    """
+
+    def __init__(self, loop, reader):
+        self._loop = loop
+        self._reader = reader
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(asyncio.wait_for(coro, READ_TIMEOUT), self._loop).result()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._call(self._reader.read())
+        # Match BufferedReader: short only at EOF
+        try:
+            return self._call(self._reader.readexactly(size))
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    def readline(self, limit=-1):
+        line = self._call(self._reader.readline())
+        return line if limit is None or limit < 0 else line[:limit]
+
+
+class AsyncRequest:
+    """
+    The slice of BaseHTTPRequestHandler the proxy routes use (headers, rfile,
+    wfile, send_response/send_header/end_headers/send_error), backed by an
+    already-parsed request. Lets the same route class run under asyncio.
+    Responses are HTTP/1.0 with the connection closed afterwards, like the
+    threaded server.
+    """
+
+    def __init__(self, loop, writer, command, path, headers, reader, client_address):
+        self.command = command
+        self.path = path
+        self.headers = headers
+        self.rfile = AsyncRequestReader(loop, reader)
+        self.wfile = AsyncRequestWriter(loop, writer)
+        self.client_address = client_address
+        self.request_version = 'HTTP/1.0'
+        self._header_lines = []
+
+    def log_message(self, format, *args):
+        log.info("%s - " + format, self.client_address[0], *args)
+
+    def log_request(self, code='-'):
+        self.log_message('"%s %s" %s -', self.command, self.path, code)
+
+    def send_response(self, code, message=None):
+        self.log_request(code)
+        if message is None:
+            message = HTTPStatus(code).phrase if code in HTTPStatus._value2member_map_ else ''
+        self._header_lines.append(f"HTTP/1.0 {code} {message}\r\n")
+        self.send_header('Connection', 'close')
+
+    def send_header(self, keyword, value):
+        self._header_lines.append(f"{keyword}: {value}\r\n")
+
+    def end_headers(self):
+        self._header_lines.append("\r\n")
+        self.wfile.write("".join(self._header_lines).encode('latin-1', 'strict'))
+        self._header_lines = []
+
+    def send_error(self, code, message=None):
+        body = f"{code} {message or HTTPStatus(code).phrase}".encode('utf-8')
+        self.send_response(code, message)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def write_simple(writer, status, body, extra_headers=()):
+    phrase = HTTPStatus(status).phrase
+    lines = [f"HTTP/1.0 {status} {phrase}", "Content-Type: application/json",
+             f"Content-Length: {len(body)}", "Connection: close", *extra_headers]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+
+
+class AsyncServer:
+    """
+    asyncio front end for the proxy routes. Connections are cheap coroutines;
+    at most `concurrency` requests run their (blocking) handler at once on a
+    fixed thread pool, and once `max_pending` more are waiting, new requests
+    get 503 + Retry-After instead of queuing without bound.
+    """
+
+    def __init__(self, routes_cls, concurrency=64, max_pending=1024):
+        self.handler_cls = type('AsyncEmailHandler', (routes_cls, AsyncRequest), {})
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="aio-worker")
+        self._semaphore = None
+        self._waiting = 0
+        self._connections = set()
+
+    async def _read_request(self, reader):
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), READ_TIMEOUT)
+        request_line, _, header_block = head.partition(b"\r\n")
+        command, path, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+        return command, path, headers
+
+    def _run(self, request):
+        method = getattr(request, f"do_{request.command}", None)
+        if method is None:
+            request.send_error(501, "Unsupported method")
+        else:
+            method()
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            try:
+                command, path, headers = await self._read_request(reader)
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+                write_simple(writer, 400, b'{"status": "error", "message": "Bad request"}')
+                return
+
+            if self._waiting >= self.max_pending:
+                write_simple(writer, 503, b'{"status": "error", "message": "Server busy"}', ("Retry-After: 1",))
+                return
+
+            request = self.handler_cls(loop, writer, command, path, headers, reader,
+                                       writer.get_extra_info('peername') or ('-', 0))
+            self._waiting += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+            try:
+                await loop.run_in_executor(self.executor, self._run, request)
+            finally:
+                self._semaphore.release()
+            await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        except Exception:
+            log.exception("Unhandled error serving %s", writer.get_extra_info('peername'))
+        finally:
+            writer.close()
+            self._connections.discard(task)
+
+    async def serve(self, host, port, sock=None):
+        """
+        Serves until cancelled. Given an already listening `sock` (a pre-fork
+        worker), serves that instead, and on SIGTERM stops accepting and
+        returns once the connections in progress are done.
+        """
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        if sock is None:
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES,
+                                                backlog=1024, reuse_address=True)
+            async with server:
+                await server.serve_forever()
+            return
+
+        server = await asyncio.start_server(self.handle_connection, sock=sock, limit=MAX_HEADER_BYTES)
+        stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+        await stopping.wait()
+        server.close()
+        if self._connections:
+            log.info("Draining %d connection(s)", len(self._connections))
+            await asyncio.wait(set(self._connections))
+
+
+def serve(routes_cls, host, port, concurrency=64, max_pending=1024, sock=None):
+    """Blocking entry point: runs the asyncio server until interrupted (or drained, see AsyncServer.serve)."""
+    server = AsyncServer(routes_cls, concurrency=concurrency, max_pending=max_pending)
+    try:
+        asyncio.run(server.serve(host, port, sock))
+    finally:
+        server.executor.shutdown(wait=False)
@@ -0,0 +1,498 @@
+import logging
+import signal
+import smtplib
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import batch_result, check_entry, number_entries, run_batch
+from .bulk_smtp import BulkSender, Delivery, is_permanent
+from .config import Config, load_env_file
+from .jobs import backoff_delay
+from .logconfig import configure_logging
+from .metrics import FAILURES, REGISTRY, RETRIES
+from .rate_limit import RateLimiter, SharedRateLimiter
+from .routes import POST_ROUTES, bind_routes
+from .suppression import SUPPRESSED, Suppressed
+
+log = logging.getLogger(__name__)
+
+# Rejections that retrying will not fix
+PERMANENT_SEND_ERRORS = (ValueError, smtplib.SMTPRecipientsRefused)
+
+
+class lazy:
+    """
+    Like functools.cached_property, but builds each value at most once even
+    when several handler threads ask for it at the same moment.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        with obj._init_lock:
+            # Once stored in the instance dict, this descriptor is no longer consulted
+            if self.name not in obj.__dict__:
+                obj.__dict__[self.name] = self.factory(obj)
+            return obj.__dict__[self.name]
+
+
+def route_limits(spec, default_per_min, limiter=RateLimiter):
+    limits = {route: default_per_min for route in POST_ROUTES}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        route, _, per_min = item.partition('=')
+        limits[route.strip()] = float(per_min)
+    return {route: limiter(per_min / 60.0, burst=max(1.0, per_min / 6), scope=f"route:{route}")
+            for route, per_min in limits.items()}
+
+
+def job_template(payload):
+    """send_email jobs carry either their own subject/htmlContent or just a server template type + variables."""
+    from .templates import resolve_template
+    template_type = payload.get('templateType', "CUSTOM")
+    return resolve_template(template_type, payload.get('subject'), payload.get('htmlContent')), template_type
+
+
+class EmailProxy:
+    """
+    The email proxy's shared state and delivery logic. Clients are created on
+    first use, so building an EmailProxy (in tests, benchmarks or a worker
+    process) opens no sockets, files or threads; start() launches the
+    background workers and stop() drains them.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._init_lock = threading.RLock()
+
+    # --- CLIENTS ---
+    @lazy
+    def ssl_context(self):
+        """One TLS context (CA bundle loaded once, sessions resumed) shared by SMTP and Supabase."""
+        from .tls import create_context
+        return create_context()
+
+    @lazy
+    def smtp_pool(self):
+        from .smtp_pool import SMTPPool
+        c = self.config
+        return SMTPPool(
+            c.smtp_server, c.smtp_port, c.username, c.password,
+            size=c.smtp_pool_size,
+            idle_timeout=c.smtp_pool_idle_timeout,
+            starttls=c.smtp_starttls if c.smtp_port != 465 else False,
+            context=self.ssl_context,
+        )
+
+    @lazy
+    def supabase(self):
+        from .supabase_client import SupabaseClient
+        c = self.config
+        return SupabaseClient(
+            c.supabase_url, c.supabase_service_role_key,
+            max_connections=c.supabase_max_connections,
+            timeout=c.supabase_timeout,
+            context=self.ssl_context if c.supabase_url.startswith('https') else None,
+        )
+
+    @lazy
+    def user_directory(self):
+        from .user_directory import UserDirectory
+        return UserDirectory(self.supabase, ttl=self.config.user_cache_ttl)
+
+    @lazy
+    def otp_store(self):
+        from .otp_store import MemoryOTPStore, SupabaseOTPStore
+        if self.config.otp_store == 'memory':
+            return MemoryOTPStore(ttl=self.config.otp_ttl, max_attempts=self.config.otp_max_attempts)
+        return SupabaseOTPStore(self.supabase, ttl=self.config.otp_ttl)
+
+    @lazy
+    def batch_executor(self):
+        return ThreadPoolExecutor(max_workers=self.config.batch_concurrency, thread_name_prefix="batch")
+
+    @lazy
+    def bulk_sender(self):
+        c = self.config
+        return BulkSender(self.smtp_pool, sessions=c.bulk_smtp_sessions, chunk_size=c.bulk_chunk_size,
+                          pace=lambda: self.smtp_rate.wait(max_wait=c.smtp_rate_max_wait))
+
+    @lazy
+    def log_writer(self):
+        from .log_writer import LogWriter
+        c = self.config
+        writer = LogWriter(
+            self.post_email_logs,
+            batch_size=c.log_batch_size,
+            flush_interval=c.log_flush_ms / 1000.0,
+            max_buffer=c.log_max_buffer,
+            spill_path=c.log_spill_path,
+        )
+        REGISTRY.gauge('email_proxy_log_buffer_rows', "email_logs rows waiting to be written", fn=writer.pending)
+        return writer
+
+    @lazy
+    def job_queue(self):
+        from .jobs import JobQueue
+        c = self.config
+        queue = JobQueue(c.job_queue_path, workers=c.job_workers, max_attempts=c.job_max_attempts,
+                         permanent_errors=PERMANENT_SEND_ERRORS)
+        queue.register('send_email', self.run_send_email_job, on_failure=self.fail_send_email_job)
+        queue.register('delete_users', self.run_delete_users_job)
+        REGISTRY.gauge('email_proxy_job_queue_depth', "Background jobs queued or running", fn=queue.depth)
+        return queue
+
+    @lazy
+    def campaigns(self):
+        from .campaigns import CampaignScheduler
+        c = self.config
+        scheduler = CampaignScheduler(c.campaign_db_path, self.fetch_campaign_page, self.send_campaign_email,
+                                      workers=c.campaign_workers, rate_per_sec=c.campaign_rate_per_sec,
+                                      page_size=c.campaign_page_size,
+                                      # Pre-fork workers take turns: one of them runs every campaign
+                                      leader_lock=c.campaign_db_path + ".lock" if c.workers > 1 else None)
+        REGISTRY.gauge('email_proxy_campaigns_active', "Campaigns scheduled or running", fn=scheduler.depth)
+        return scheduler
+
+    @lazy
+    def suppression(self):
+        from .suppression import SuppressionList
+        return SuppressionList(self.supabase, refresh_interval=self.config.suppression_refresh_seconds,
+                               rebuild_interval=self.config.suppression_rebuild_seconds)
+
+    @lazy
+    def shared_state(self):
+        """Rate limits and Idempotency-Keys shared by pre-fork workers (WORKERS > 1)."""
+        from .shared_state import SharedState
+        return SharedState(self.config.state_db_path)
+
+    @lazy
+    def idempotency(self):
+        from .idempotency import IdempotencyCache, SharedIdempotencyCache
+        c = self.config
+        if c.workers > 1:
+            cache = SharedIdempotencyCache(self.shared_state, ttl=c.idempotency_ttl, max_entries=c.idempotency_max_keys,
+                                           max_response_bytes=c.idempotency_max_response_bytes)
+        else:
+            cache = IdempotencyCache(ttl=c.idempotency_ttl, max_entries=c.idempotency_max_keys,
+                                     max_response_bytes=c.idempotency_max_response_bytes)
+        REGISTRY.gauge('email_proxy_idempotency_keys', "Idempotency-Key entries cached or in flight", fn=cache.__len__)
+        return cache
+
+    # --- RATE LIMITS ---
+    def rate_limiter(self, rate, burst, scope):
+        """Token buckets in this process, or in the shared state database when there are pre-fork workers."""
+        if self.config.workers > 1:
+            return SharedRateLimiter(self.shared_state, rate, burst=burst, scope=scope)
+        return RateLimiter(rate, burst=burst, max_keys=self.config.rate_limit_max_keys, scope=scope)
+
+    @lazy
+    def route_limiters(self):
+        return route_limits(self.config.rate_limit_routes, self.config.rate_limit_route_per_min,
+                            limiter=self.rate_limiter)
+
+    @lazy
+    def ip_limiter(self):
+        c = self.config
+        return self.rate_limiter(c.rate_limit_ip_per_min / 60.0, burst=max(1.0, c.rate_limit_ip_per_min / 6),
+                                 scope='ip')
+
+    @lazy
+    def recipient_limiter(self):
+        c = self.config
+        return self.rate_limiter(c.rate_limit_recipient_per_hour / 3600.0,
+                                 burst=max(1.0, c.rate_limit_recipient_per_hour / 4), scope='recipient')
+
+    @lazy
+    def smtp_rate(self):
+        # The provider's limit is per account, so pre-fork workers draw from one bucket
+        return self.rate_limiter(self.config.smtp_rate_per_sec, burst=self.config.smtp_rate_burst, scope='smtp')
+
+    def check_recipient(self, email):
+        """Raises RateLimited if this address has had too many emails recently."""
+        self.recipient_limiter.acquire(email.strip().lower())
+
+    def check_suppressed(self, email):
+        """Raises Suppressed if this address hard-bounced before or unsubscribed."""
+        if self.config.suppression_enabled and email in self.suppression:
+            SUPPRESSED.inc('suppressed')
+            raise Suppressed(f"{email} is on the suppression list (bounced or unsubscribed)")
+
+    def note_permanent_failure(self, email, error):
+        # A recipient refused with 5xx is suppressed right away, not at the next refresh
+        if (self.config.suppression_enabled and isinstance(error, smtplib.SMTPRecipientsRefused)
+                and is_permanent(error)):
+            self.suppression.add(email)
+
+    # --- EMAIL DELIVERY ---
+    def post_email_logs(self, rows):
+        """Bulk insert into email_logs: one PostgREST request with a JSON array body."""
+        self.supabase.rest('POST', 'email_logs', body=rows, prefer="return=minimal")
+        log.debug("📝 Logged %d email(s) to DB", len(rows))
+
+    def log_email(self, recipient_email, subject, status, error_message=None, template_type="CUSTOM"):
+        """Queues an email_logs row for the background writer. Never blocks or raises."""
+        # PostgREST bulk inserts need every row to carry the same keys
+        self.log_writer.write({
+            "recipient_email": recipient_email,
+            "subject": subject,
+            "status": status,
+            "template_type": template_type,
+            "triggered_by": "backend_proxy",
+            "error_message": error_message
+        })
+
+    def send_smtp_email(self, recipient_email, template, variables=None, template_type="CUSTOM"):
+        """
+        One delivery attempt over a pooled SMTP session. Raises on failure;
+        retrying is up to the caller (job workers or send_smtp_email_with_retry).
+        `template` is a compiled MessageTemplate; only `variables` are rendered per call.
+        """
+        if self.config.disable_email_sending:
+            log.info("📧 [MOCK] Sending email to %s", recipient_email)
+            return
+
+        subject, message = template.build(recipient_email, variables)
+        # Pace to the provider's limit; past smtp_rate_max_wait this raises and the caller retries later
+        self.smtp_rate.wait(max_wait=self.config.smtp_rate_max_wait)
+        self.smtp_pool.sendmail(template.envelope_from, [recipient_email], message)
+        log.info("✨ Email successfully sent to %s", recipient_email)
+        self.log_email(recipient_email, subject, "sent", template_type=template_type)
+
+    def send_smtp_email_with_retry(self, recipient_email, template, variables=None, template_type="CUSTOM",
+                                   max_attempts=3):
+        """Inline retry with exponential backoff, for callers that need the outcome right away."""
+        for attempt in range(1, max_attempts + 1):
+            try:
+                return self.send_smtp_email(recipient_email, template, variables, template_type)
+            except PERMANENT_SEND_ERRORS as e:
+                FAILURES.inc('smtp_send')
+                self.note_permanent_failure(recipient_email, e)
+                self.log_email(recipient_email, template.render_subject(variables), "failed", str(e), template_type)
+                raise
+            except Exception as e:
+                log.warning("❌ SMTP Error (Attempt %d/%d): %s", attempt, max_attempts, e)
+                if attempt == max_attempts:
+                    FAILURES.inc('smtp_send')
+                    self.log_email(recipient_email, template.render_subject(variables), "failed", str(e),
+                                   template_type)
+                    raise
+                RETRIES.inc('smtp_send')
+                time.sleep(backoff_delay(attempt))
+
+    def send_batch_item(self, recipient_email, template, variables=None, template_type="CUSTOM"):
+        self.check_suppressed(recipient_email)
+        self.check_recipient(recipient_email)
+        return self.send_smtp_email_with_retry(recipient_email, template, variables, template_type)
+
+    def send_batch(self, entries):
+        """Sends parsed batch entries, yielding one result dict per recipient as it completes."""
+        if self.config.batch_engine == 'pipelined' and not self.config.disable_email_sending:
+            return self.send_batch_pipelined(entries)
+        return run_batch(entries, self.send_batch_item, self.batch_executor,
+                         window=self.config.batch_concurrency * 2)
+
+    def send_batch_pipelined(self, entries):
+        """
+        Batch delivery through the bulk SMTP engine. Checks and rendering happen
+        here, as entries are read; every message actually attempted gets its
+        email_logs row, like a single send.
+        """
+        def deliveries():
+            for index, recipient, template, variables, template_type, duplicate in number_entries(entries):
+                try:
+                    check_entry(recipient, template, duplicate)
+                    self.check_suppressed(recipient)
+                    self.check_recipient(recipient)
+                    subject, message = template.build(recipient, variables)
+                except Exception as e:
+                    yield Delivery(recipient, meta=(index, None, template_type), error=e)
+                    continue
+                yield Delivery(recipient, template.envelope_from, message, meta=(index, subject, template_type))
+
+        for delivery, error in self.bulk_sender.deliver(deliveries()):
+            index, subject, template_type = delivery.meta
+            if subject is not None:
+                if error is None:
+                    log.info("✨ Email successfully sent to %s", delivery.recipient)
+                    self.log_email(delivery.recipient, subject, "sent", template_type=template_type)
+                else:
+                    FAILURES.inc('smtp_send')
+                    self.note_permanent_failure(delivery.recipient, error)
+                    self.log_email(delivery.recipient, subject, "failed", str(error), template_type)
+            yield batch_result(index, delivery.recipient, error)
+
+    # --- JOBS ---
+    def run_send_email_job(self, payload):
+        template, template_type = job_template(payload)
+        self.send_smtp_email(payload['recipientEmail'], template, payload.get('variables'), template_type)
+        return {'recipientEmail': payload['recipientEmail']}
+
+    def fail_send_email_job(self, payload, error):
+        template, template_type = job_template(payload)
+        self.note_permanent_failure(payload['recipientEmail'], error)
+        self.log_email(payload['recipientEmail'], template.render_subject(payload.get('variables')), "failed",
+                       str(error), template_type)
+
+    def iter_delete_users(self, user_ids):
+        """Deletes the ids, yielding one result dict per id as it completes."""
+        from .bulk_delete import delete_users
+        return delete_users(
+            self.supabase, user_ids,
+            concurrency=self.config.delete_concurrency,
+            on_deleted=lambda user_id: self.user_directory.invalidate(user_id=str(user_id))
+        )
+
+    def run_delete_users(self, user_ids):
+        results = list(self.iter_delete_users(user_ids))
+        deleted = sum(1 for r in results if r['status'] == 'deleted')
+        errors = [r['error'] for r in results if r['status'] == 'failed']
+        return {'deleted': deleted, 'errors': errors, 'results': results}
+
+    def run_delete_users_job(self, payload):
+        return self.run_delete_users(payload['userIds'])
+
+    # --- CAMPAIGNS ---
+    def fetch_campaign_page(self, audience, cursor, limit):
+        """
+        One page of a campaign audience: (recipients, next_cursor). Either an
+        explicit {"emails": [...]} list (cursor = offset) or profiles filtered
+        by {"role", "verified"}, walked by id (cursor = last id seen).
+        """
+        if 'emails' in audience:
+            start = cursor or 0
+            emails = audience['emails'][start:start + limit]
+            next_cursor = start + limit if start + limit < len(audience['emails']) else None
+            return [{'email': email} for email in emails], next_cursor
+
+        params = {'select': 'id,email,username,display_name,full_name', 'order': 'id.asc', 'limit': str(limit)}
+        if cursor:
+            params['id'] = f"gt.{cursor}"
+        if audience.get('role'):
+            params['role'] = f"eq.{audience['role']}"
+        if audience.get('verified') is not None:
+            params['is_verified'] = f"eq.{str(bool(audience['verified'])).lower()}"
+        rows = self.supabase.rest('GET', 'profiles', params=params)
+        recipients = [{'email': r['email'], 'name': r.get('display_name') or r.get('full_name') or r.get('username')}
+                      for r in rows if r.get('email')]
+        return recipients, (rows[-1]['id'] if len(rows) == limit else None)
+
+    def send_campaign_email(self, recipient, spec):
+        template, template_type = job_template(spec)
+        # Same personalisation as the composer's bulk send
+        variables = {'member_name': recipient.get('name') or 'Developer'}
+        self.check_suppressed(recipient['email'])
+        # The per-recipient cap holds across campaigns, batches and single sends alike
+        self.check_recipient(recipient['email'])
+        self.send_smtp_email_with_retry(recipient['email'], template, variables, template_type)
+
+    # --- LIFECYCLE ---
+    def start(self):
+        self.log_writer.start()
+        self.job_queue.start()
+        self.campaigns.start()
+        self.otp_store.start()
+        if self.config.suppression_enabled:
+            self.suppression.start()
+        if self.config.workers > 1:
+            self.shared_state.start(max_idempotency_keys=self.config.idempotency_max_keys)
+
+    def stop(self):
+        if 'suppression' in self.__dict__:
+            self.suppression.stop()
+        if 'campaigns' in self.__dict__:
+            self.campaigns.stop()
+        if 'job_queue' in self.__dict__:
+            self.job_queue.stop()
+        if 'bulk_sender' in self.__dict__:
+            self.bulk_sender.close()
+        if 'log_writer' in self.__dict__:
+            self.log_writer.stop()
+        if 'shared_state' in self.__dict__:
+            self.shared_state.stop()
+
+
+REGISTRY.gauge('email_proxy_threads', "Live Python threads", fn=threading.active_count)
+
+
+def create_app(environ=None, env_files=('.env', '.env.local')):
+    """
+    App factory. Loads the .env files into os.environ (unless an explicit
+    `environ` mapping is given) and returns an EmailProxy; nothing is
+    connected or started yet.
+    """
+    loaded = []
+    if environ is None:
+        loaded = [path for path in env_files if load_env_file(path)]
+    app = EmailProxy(Config(environ))
+    app.env_files = loaded
+    return app
+
+
+# --- CONCURRENCY ---
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024  # default of 5 drops connections under bursts
+
+
+class WorkerTCPServer(ThreadingTCPServer):
+    """ThreadingTCPServer for a pre-fork worker: server_close() waits for in-flight requests."""
+    daemon_threads = False
+    block_on_close = True
+
+
+def serve(app, sock=None):
+    """
+    Runs the HTTP server in the configured mode until interrupted. A pre-fork
+    worker passes the shared listening `sock` and, on SIGTERM, stops accepting
+    and lets in-flight requests finish.
+    """
+    c = app.config
+    routes = bind_routes(app)
+    if c.server_mode == 'asyncio':
+        from .aio_server import serve as serve_asyncio
+        log.info("Config: asyncio Server (x%d workers), Robust Env Loading, SMTP Pool x%d",
+                 c.aio_concurrency, c.smtp_pool_size)
+        serve_asyncio(routes, "", c.port, concurrency=c.aio_concurrency, max_pending=c.aio_max_pending, sock=sock)
+    else:
+        import http.server
+        log.info("Config: Threaded Server, Robust Env Loading, SMTP Pool x%d", c.smtp_pool_size)
+        handler = type('EmailHandler', (routes, http.server.BaseHTTPRequestHandler), {})
+        if sock is None:
+            # ThreadingTCPServer uses threads for each request
+            httpd = ThreadingTCPServer(("", c.port), handler)
+        else:
+            httpd = WorkerTCPServer(sock.getsockname(), handler, bind_and_activate=False)
+            httpd.socket.close()
+            httpd.socket = sock
+        with httpd:
+            httpd.serve_forever()
+
+
+def main():
+    app = create_app()
+    configure_logging(app.config.log_level, app.config.log_format)
+    for path in app.env_files:
+        log.info("Loaded env from %s", path)
+    log.info("🔥 Python Email Proxy Server Running on http://localhost:%d", app.config.port)
+    if app.config.workers > 1:
+        from .prefork import Supervisor
+        Supervisor(app).run()
+        return
+
+    # Container runtimes stop with SIGTERM: shut down the same way as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    app.start()
+    try:
+        serve(app)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.stop()
@@ -0,0 +1,135 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from .body import StreamedList
+from .suppression import SUPPRESSED, Suppressed, fingerprint
+from .templates import resolve_template
+
+
+def bounded_as_completed(executor, fn, args_iter, window):
+    """
+    Submits fn(*args) for each args tuple with at most `window` calls in flight,
+    pulling from `args_iter` only as calls finish. Yields (args, future) in
+    completion order, so huge or lazily parsed inputs never queue up in full.
+    """
+    args_iter = iter(args_iter)
+    pending = {}
+    while True:
+        for args in args_iter:
+            pending[executor.submit(fn, *args)] = args
+            if len(pending) >= window:
+                break
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
+def parse_batch(data, max_items):
+    """
+    Normalises a batch request into (total, entries), where entries lazily yields
+    (recipient, template, variables, template_type) and template is a compiled
+    MessageTemplate (or None for an item that cannot be sent). The item list may
+    be a StreamedList, in which case items are decoded as they are sent.
+
+    Accepted shapes:
+      {"items": [{"recipientEmail", "subject", "htmlContent"}, ...]}
+      {"subject", "htmlContent", "recipients": [{"recipientEmail", "variables": {...}}, ...]}
+    In the template form both subject and htmlContent may use {{variable}} placeholders;
+    htmlContent can be left out when templateType names a server template (WELCOME, OTP).
+    Items that share the same subject and HTML share one compiled template.
+    """
+    items = data.get('items')
+    recipients = data.get('recipients')
+
+    if items is not None:
+        if not isinstance(items, (list, StreamedList)):
+            raise ValueError("items must be a list")
+        source = items
+        default_type = data.get('templateType', "CUSTOM")
+
+        def entries():
+            for i in items:
+                if not isinstance(i, dict):
+                    yield None, None, None, default_type
+                    continue
+                template_type = i.get('templateType', default_type)
+                try:
+                    template = resolve_template(template_type, i.get('subject', "Notification"), i.get('htmlContent'))
+                except ValueError:
+                    template = None  # reported as a failed item, not a failed batch
+                yield i.get('recipientEmail'), template, None, template_type
+    elif recipients is not None:
+        if not isinstance(recipients, (list, StreamedList)):
+            raise ValueError("recipients must be a list")
+        source = recipients
+        template_type = data.get('templateType', "CUSTOM")
+        template = resolve_template(template_type, data.get('subject', "Notification"), data.get('htmlContent'))
+
+        def entries():
+            for r in recipients:
+                if isinstance(r, str):
+                    r = {'recipientEmail': r}
+                elif not isinstance(r, dict):
+                    r = {}
+                yield r.get('recipientEmail'), template, r.get('variables') or {}, template_type
+    else:
+        raise ValueError("Either items or recipients is required.")
+
+    if not source:
+        raise ValueError("Batch is empty.")
+    if len(source) > max_items:
+        raise ValueError(f"Batch too large: {len(source)} items (max {max_items}).")
+    return len(source), entries()
+
+
+def number_entries(entries):
+    """
+    Yields (index, recipient, template, variables, template_type, duplicate), where
+    duplicate marks an address (case-insensitive) already seen earlier in the batch.
+    """
+    # Fingerprints rather than the addresses themselves, to keep this small for large batches
+    seen = set()
+    for index, entry in enumerate(entries):
+        recipient = entry[0]
+        duplicate = False
+        if isinstance(recipient, str) and recipient:
+            fp = fingerprint(recipient)
+            duplicate = fp in seen
+            seen.add(fp)
+        yield index, *entry, duplicate
+
+
+def check_entry(recipient, template, duplicate):
+    """Raises for an entry that must not be sent: ValueError if incomplete, Suppressed if a duplicate."""
+    if not recipient or template is None:
+        raise ValueError("Recipient Email and HTML Content are required.")
+    if duplicate:
+        SUPPRESSED.inc('duplicate')
+        raise Suppressed(f"{recipient} appears earlier in this batch")
+
+
+def batch_result(index, recipient, error=None):
+    """Result dict for one batch entry: "sent", "skipped" (Suppressed) or "failed"."""
+    if error is None:
+        return {'index': index, 'recipientEmail': recipient, 'status': 'sent'}
+    status = 'skipped' if isinstance(error, Suppressed) else 'failed'
+    return {'index': index, 'recipientEmail': recipient, 'status': status, 'error': str(error)}
+
+
+def run_batch(entries, send, executor, window):
+    """
+    Sends every entry through `send(recipient, template, variables, template_type)` on `executor`,
+    with at most `window` sends queued or running. Yields one result dict per recipient, in completion order.
+    A repeated address (case-insensitive) and any recipient `send` rejects as Suppressed is "skipped".
+    """
+    def deliver(index, recipient, template, variables, template_type, duplicate):
+        check_entry(recipient, template, duplicate)
+        send(recipient, template, variables, template_type)
+
+    for (index, recipient, *_), future in bounded_as_completed(executor, deliver, number_entries(entries), window):
+        try:
+            future.result()
+            yield batch_result(index, recipient)
+        except Exception as e:
+            yield batch_result(index, recipient, e)
@@ -0,0 +1,253 @@
+import codecs
+import json
+import shutil
+import tempfile
+import types
+
+# Longest chunk-size / trailer line accepted in a chunked body
+MAX_CHUNK_LINE = 1024
+READ_SIZE = 64 * 1024
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class RequestBodyError(ValueError):
+    """The request body is missing, malformed or too large; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        self.status = status
+        super().__init__(message)
+
+
+# --- READING ---
+class BodyReader:
+    """
+    File-like view of a request body on `rfile`, framed by Content-Length or
+    Transfer-Encoding: chunked. Raises RequestBodyError(413) as soon as more
+    than `max_bytes` arrive, so an oversized body is never held in full.
+    With a hashlib `digest`, every byte read is also fed to it.
+    """
+
+    def __init__(self, rfile, headers, max_bytes, digest=None):
+        self.rfile = rfile
+        self.max_bytes = max_bytes
+        self.digest = digest
+        self.received = 0
+        self.chunked = 'chunked' in (headers.get('Transfer-Encoding') or '').lower()
+        self._chunk_left = 0
+        self._done = False
+        if self.chunked:
+            self._remaining = None
+        else:
+            try:
+                self._remaining = int(headers.get('Content-Length') or 0)
+            except ValueError:
+                raise RequestBodyError("Invalid Content-Length")
+            if self._remaining < 0:
+                raise RequestBodyError("Invalid Content-Length")
+            if self._remaining > max_bytes:
+                raise RequestBodyError(f"Request body too large (max {max_bytes} bytes)", 413)
+
+    def _count(self, data):
+        self.received += len(data)
+        if self.received > self.max_bytes:
+            raise RequestBodyError(f"Request body too large (max {self.max_bytes} bytes)", 413)
+        if self.digest is not None:
+            self.digest.update(data)
+        return data
+
+    def _read_exact(self, size):
+        parts = []
+        while size > 0:
+            data = self.rfile.read(size)
+            if not data:
+                raise RequestBodyError("Request body ended early")
+            parts.append(data)
+            size -= len(data)
+        return b''.join(parts)
+
+    def _next_chunk(self):
+        line = self.rfile.readline(MAX_CHUNK_LINE)
+        if not line.endswith(b"\n"):
+            raise RequestBodyError("Invalid chunked encoding")
+        try:
+            size = int(line.split(b';', 1)[0].strip(), 16)
+        except ValueError:
+            raise RequestBodyError("Invalid chunked encoding")
+        if size == 0:
+            # Skip any trailer fields up to the blank line
+            while self.rfile.readline(MAX_CHUNK_LINE) not in (b"\r\n", b"\n", b""):
+                pass
+            self._done = True
+        self._chunk_left = size
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(READ_SIZE), b''))
+        if self._done or size == 0:
+            return b''
+        if not self.chunked:
+            data = self._read_exact(min(size, self._remaining)) if self._remaining else b''
+            self._remaining -= len(data)
+            self._done = not self._remaining
+            return self._count(data)
+        if not self._chunk_left:
+            self._next_chunk()
+            if self._done:
+                return b''
+        data = self._read_exact(min(size, self._chunk_left))
+        self._chunk_left -= len(data)
+        if not self._chunk_left:
+            self._read_exact(2)  # CRLF after the chunk data
+        return self._count(data)
+
+
+def read_json(reader):
+    """Reads the whole (already size-capped) body and decodes it. An empty body is {}."""
+    raw = reader.read()
+    if not raw.strip():
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        raise RequestBodyError("Invalid JSON body")
+
+
+def spool(reader, in_memory):
+    """Copies the body into a temp file that stays in memory up to `in_memory` bytes."""
+    body = tempfile.SpooledTemporaryFile(max_size=in_memory)
+    shutil.copyfileobj(reader, body, READ_SIZE)
+    body.seek(0)
+    return body
+
+
+# --- INCREMENTAL PARSING ---
+class _JSONCursor:
+    """Walks a JSON document from a binary file, decoding one value at a time from a sliding buffer."""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, at_least=0):
+        # Growing reads keep one huge value (e.g. htmlContent) from being re-scanned once per 64 KB
+        data = self._file.read(max(READ_SIZE, at_least))
+        try:
+            self.buf = self.buf[self.pos:] + self._decoder.decode(data, final=not data)
+        except UnicodeDecodeError:
+            raise RequestBodyError("Request body is not valid UTF-8")
+        self.pos = 0
+        self.eof = not data
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def expect(self, allowed):
+        char = self.peek()
+        if not char or char not in allowed:
+            raise RequestBodyError("Invalid JSON body")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+                # A number that ends exactly at the buffer edge may continue in the next read
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise RequestBodyError("Invalid JSON body")
+            self._fill(len(self.buf) - self.pos)
+
+
+def _iter_array(cursor):
+    cursor.expect('[')
+    if cursor.peek() == ']':
+        cursor.pos += 1
+        return
+    while True:
+        yield cursor.value()
+        if cursor.expect(',]') == ']':
+            return
+
+
+def iter_members(fileobj, expand=()):
+    """
+    Yields (key, value) for each member of the top-level JSON object in
+    `fileobj`. For keys in `expand` whose value is an array, value is a
+    generator over its elements instead, parsed one at a time.
+    """
+    cursor = _JSONCursor(fileobj)
+    cursor.expect('{')
+    if cursor.peek() == '}':
+        cursor.pos += 1
+    else:
+        while True:
+            key = cursor.value()
+            if not isinstance(key, str):
+                raise RequestBodyError("Invalid JSON body")
+            cursor.expect(':')
+            if key in expand and cursor.peek() == '[':
+                elements = _iter_array(cursor)
+                yield key, elements
+                for _ in elements:  # whatever the caller did not consume
+                    pass
+            else:
+                yield key, cursor.value()
+            if cursor.expect(',}') == '}':
+                break
+    if cursor.peek():
+        raise RequestBodyError("Invalid JSON body")
+
+
+class StreamedList:
+    """
+    A large top-level array left in the spooled request body. len() is known
+    up front; each iteration re-reads the body and decodes one element at a
+    time, so memory does not grow with the number of elements.
+    """
+
+    def __init__(self, body, key, length):
+        self._body = body
+        self.key = key
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        self._body.seek(0)
+        for key, value in iter_members(self._body, (self.key,)):
+            if key == self.key:
+                yield from value
+                return
+
+
+def load_streamed(body, list_keys):
+    """
+    Like json.load for an object body, except that members named in
+    `list_keys` holding arrays become StreamedLists. The body is validated in
+    full here (one pass, element by element), so later iteration cannot fail
+    halfway through a batch.
+    """
+    data = {}
+    for key, value in iter_members(body, list_keys):
+        if isinstance(value, types.GeneratorType):
+            value = StreamedList(body, key, sum(1 for _ in value))
+        data[key] = value
+    return data
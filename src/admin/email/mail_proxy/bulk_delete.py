@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import bounded_as_completed
+from .jobs import backoff_delay
+from .metrics import FAILURES, RETRIES
+from .supabase_client import SupabaseError
+
+log = logging.getLogger(__name__)
+
+
+class RateLimitGate:
+    """
+    Shared pause for all deletion workers: when one of them is told 429,
+    nobody sends again until the Retry-After window has passed.
+    """
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        while True:
+            with self._lock:
+                remaining = self._resume_at - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+
+def delete_user(supabase, user_id, gate, max_attempts=5):
+    """
+    Deletes one auth user. Returns a result dict; never raises.
+    429 pauses every worker; 5xx and network errors are retried with backoff.
+    """
+    path = f"users/{urllib.parse.quote(str(user_id), safe='')}"
+    for attempt in range(1, max_attempts + 1):
+        gate.wait()
+        try:
+            supabase.auth_admin('DELETE', path)
+            return {'userId': user_id, 'status': 'deleted'}
+        except SupabaseError as e:
+            if e.status == 404:
+                return {'userId': user_id, 'status': 'not_found'}
+            if e.status == 429:
+                delay = e.retry_after or backoff_delay(attempt, base=1.0, cap=60.0)
+                RETRIES.inc('delete_user_rate_limited')
+                log.warning("⏳ Rate limited deleting users, pausing %.1fs", delay)
+                gate.pause(delay)
+                continue
+            if e.status < 500 or attempt == max_attempts:
+                return {'userId': user_id, 'status': 'failed', 'error': str(e)}
+        except Exception as e:
+            if attempt == max_attempts:
+                return {'userId': user_id, 'status': 'failed', 'error': str(e)}
+        RETRIES.inc('delete_user')
+        time.sleep(backoff_delay(attempt, base=0.5, cap=10.0))
+    return {'userId': user_id, 'status': 'failed', 'error': 'Rate limited: gave up after retries'}
+
+
+def delete_users(supabase, user_ids, concurrency=8, on_deleted=None):
+    """
+    Deletes `user_ids` (any sized iterable, read lazily) with at most
+    `concurrency` requests in flight. Yields one result per id as it completes.
+    """
+    gate = RateLimitGate()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(user_ids))),
+                            thread_name_prefix="delete-users") as executor:
+        calls = ((supabase, user_id, gate) for user_id in user_ids)
+        for _, future in bounded_as_completed(executor, delete_user, calls, window=concurrency * 2):
+            result = future.result()
+            if result['status'] == 'deleted':
+                log.info("✅ Deleted User %s from Auth", result['userId'])
+                if on_deleted:
+                    on_deleted(result['userId'])
+            elif result['status'] == 'failed':
+                FAILURES.inc('delete_user')
+                log.error("❌ Failed to delete %s: %s", result['userId'], result['error'])
+            yield result
@@ -0,0 +1,232 @@
+import re
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import bounded_as_completed
+from .jobs import backoff_delay
+from .metrics import REGISTRY, RETRIES, STAGE_SECONDS
+
+BULK_MESSAGES = REGISTRY.counter(
+    'email_proxy_bulk_messages_total', "Messages through the bulk SMTP engine, by outcome and mode",
+    ('status', 'mode'))
+
+_LEADING_DOT = re.compile(rb'^\.', re.MULTILINE)
+
+
+class Delivery:
+    """
+    One message for one recipient. `data` is the serialized message (CRLF
+    line endings); `meta` is whatever the caller needs back with the result.
+    A delivery created with `error` set is passed straight through unsent.
+    """
+
+    __slots__ = ('recipient', 'sender', 'data', 'meta', 'error', 'attempts')
+
+    def __init__(self, recipient, sender=None, data=None, meta=None, error=None):
+        self.recipient = recipient
+        self.sender = sender
+        self.data = data
+        self.meta = meta
+        self.error = error
+        self.attempts = 0
+
+    @property
+    def domain(self):
+        return self.recipient.rpartition('@')[2].strip().lower()
+
+
+def is_permanent(error):
+    """5xx replies will not change on retry; 4xx, dropped sessions and pacing timeouts might."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return isinstance(error, ValueError)
+
+
+def _payload(data):
+    # Dot-stuffing and the end-of-data line, as smtplib.SMTP.data() does
+    data = _LEADING_DOT.sub(b'..', data)
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+class BulkSender:
+    """
+    Delivers many messages over a few pooled SMTP sessions.
+
+    Incoming deliveries are grouped by recipient domain within a window of
+    `sessions * chunk_size` messages, and each session takes a chunk of up to
+    `chunk_size` messages for one domain. Where the server advertises
+    PIPELINING (RFC 2920) each message is a single round trip: the previous
+    message's body, then MAIL, RCPT and DATA for the next, go out in one write.
+    Otherwise a session falls back to one sendmail() per message.
+
+    A refused sender or recipient only fails that message. 4xx replies and
+    lost sessions are retried after `backoff(attempt)` seconds, up to `max_attempts`.
+    `pace()` is called before each message (e.g. the global SMTP rate).
+    """
+
+    def __init__(self, pool, sessions=4, chunk_size=50, max_attempts=3, pace=None, backoff=backoff_delay):
+        self.pool = pool
+        self.sessions = sessions
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.pace = pace
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="smtp-bulk")
+
+    # --- GROUPING ---
+    def _chunks(self, deliveries):
+        """Single-domain chunks, flushing the largest group whenever the window fills up."""
+        window = self.sessions * self.chunk_size
+        groups = {}
+        buffered = 0
+        for delivery in deliveries:
+            # Deliveries that already failed share one group and skip the session
+            key = None if delivery.error is not None else delivery.domain
+            group = groups.setdefault(key, [])
+            group.append(delivery)
+            buffered += 1
+            if len(group) >= self.chunk_size:
+                key_to_flush = key
+            elif buffered >= window:
+                key_to_flush = max(groups, key=lambda k: len(groups[k]))
+            else:
+                continue
+            chunk = groups.pop(key_to_flush)
+            buffered -= len(chunk)
+            yield (chunk,)
+        for chunk in groups.values():
+            yield (chunk,)
+
+    def deliver(self, deliveries):
+        """Sends every delivery (a lazy iterable is fine); yields (delivery, error or None) as chunks finish."""
+        for _, future in bounded_as_completed(self._executor, self._send_chunk, self._chunks(deliveries),
+                                              window=self.sessions * 2):
+            yield from future.result()
+
+    # --- SENDING ---
+    def _send_chunk(self, chunk):
+        if chunk[0].error is not None:
+            return [(d, d.error) for d in chunk]
+        results = []
+        pending = chunk
+        while pending:
+            outcomes = {}
+
+            def record(delivery, error):
+                outcomes[id(delivery)] = error
+
+            started = time.perf_counter()
+            mode = 'unknown'  # until the session's EHLO says whether it pipelines
+            try:
+                with self.pool.session() as server:
+                    server.ehlo_or_helo_if_needed()
+                    if server.has_extn('pipelining'):
+                        mode = 'pipelined'
+                        self._pipelined(server, pending, record)
+                    else:
+                        mode = 'sequential'
+                        self._one_by_one(server, pending, record)
+            except Exception as e:
+                # Lost session (or a failed EHLO/login): whatever had no reply yet counts as not sent
+                for delivery in pending:
+                    outcomes.setdefault(id(delivery), e)
+            STAGE_SECONDS.observe(time.perf_counter() - started, 'smtp_bulk_chunk', self.pool.host)
+
+            retry = []
+            for delivery in pending:
+                error = outcomes[id(delivery)]
+                delivery.attempts += 1
+                if error is not None and not is_permanent(error) and delivery.attempts < self.max_attempts:
+                    retry.append(delivery)
+                else:
+                    BULK_MESSAGES.inc('sent' if error is None else 'failed', mode)
+                    results.append((delivery, error))
+            if retry:
+                RETRIES.inc('smtp_bulk', amount=len(retry))
+                time.sleep(self.backoff(max(d.attempts for d in retry)))
+            pending = retry
+        return results
+
+    def _paced(self, delivery, record):
+        """Waits for pace(); a pacing timeout fails just this attempt."""
+        if not self.pace:
+            return True
+        try:
+            self.pace()
+            return True
+        except Exception as e:
+            record(delivery, e)
+            return False
+
+    def _one_by_one(self, server, deliveries, record):
+        for delivery in deliveries:
+            if not self._paced(delivery, record):
+                continue
+            try:
+                refused = server.sendmail(delivery.sender, [delivery.recipient], delivery.data)
+                record(delivery, smtplib.SMTPRecipientsRefused(refused) if refused else None)
+            except smtplib.SMTPException as e:
+                if isinstance(e, smtplib.SMTPServerDisconnected):
+                    raise
+                # smtplib has already RSET the transaction
+                record(delivery, e)
+
+    def _pipelined(self, server, deliveries, record):
+        size = server.has_extn('size')
+        in_data = None  # delivery whose DATA was accepted; its body goes out with the next group
+        needs_rset = False
+        for delivery in deliveries:
+            if not self._paced(delivery, record):
+                continue
+            group = [_payload(in_data.data)] if in_data else []
+            if needs_rset:
+                group.append(b"RSET\r\n")
+            mail_from = f"MAIL FROM:{smtplib.quoteaddr(delivery.sender)}"
+            if size:
+                mail_from += f" SIZE={len(delivery.data)}"
+            group.append(f"{mail_from}\r\nRCPT TO:{smtplib.quoteaddr(delivery.recipient)}\r\nDATA\r\n".encode('utf-8'))
+            server.send(b"".join(group))
+
+            if in_data:
+                self._finish(server, in_data, record)
+                in_data = None
+            if needs_rset:
+                server.getreply()
+                needs_rset = False
+            mail, rcpt, data = server.getreply(), server.getreply(), server.getreply()
+
+            if mail[0] != 250:
+                error = smtplib.SMTPSenderRefused(mail[0], mail[1], delivery.sender)
+            elif rcpt[0] not in (250, 251):
+                error = smtplib.SMTPRecipientsRefused({delivery.recipient: rcpt})
+            elif data[0] != 354:
+                error = smtplib.SMTPDataError(*data)
+            else:
+                in_data = delivery
+                continue
+            if data[0] == 354:
+                # Accepted DATA with no valid recipient: end the empty message, nothing is delivered
+                server.send(b".\r\n")
+                server.getreply()
+            elif mail[0] == 250:
+                needs_rset = True
+            record(delivery, error)
+
+        if in_data:
+            server.send(_payload(in_data.data))
+            self._finish(server, in_data, record)
+        if needs_rset:
+            server.rset()
+
+    @staticmethod
+    def _finish(server, delivery, record):
+        code, message = server.getreply()
+        record(delivery, None if code == 250 else smtplib.SMTPDataError(code, message))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,355 @@
+import datetime
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .batch import bounded_as_completed
+from .jobs import backoff_delay
+from .metrics import FAILURES, REGISTRY, RETRIES
+from .rate_limit import RateLimiter
+from .suppression import Suppressed
+
+log = logging.getLogger(__name__)
+
+CAMPAIGN_EMAILS = REGISTRY.counter(
+    'email_proxy_campaign_emails_total', "Campaign emails by outcome", ('status',))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    audience TEXT NOT NULL,         -- JSON: {"role", "verified"} filters on profiles, or {"emails": [...]}
+    template TEXT NOT NULL,         -- JSON: {"subject", "htmlContent", "templateType"}
+    status TEXT NOT NULL,           -- scheduled | running | completed | cancelled | failed
+    send_at REAL NOT NULL,
+    checkpoint TEXT,                -- JSON: {"page": cursor of the current page, "done": recipients finished in it}
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS campaigns_due ON campaigns (status, send_at);
+"""
+
+ACTIVE = ('scheduled', 'running')
+
+
+def parse_send_at(value):
+    """sendAt as epoch seconds or an ISO 8601 timestamp (naive means UTC); None means now."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid sendAt: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+class CampaignScheduler:
+    """
+    Durable scheduler for bulk campaigns, backed by SQLite like JobQueue.
+
+    Due campaigns come off an in-memory heap ordered by send time (rebuilt
+    from the table on start) and run one at a time. The audience is expanded
+    a page at a time with `fetch_page(audience, cursor, limit)`, which returns
+    (recipients, next_cursor) with next_cursor None on the last page, so even a
+    very large audience is never loaded at once. Each recipient goes through
+    `send(recipient, template)` on a fixed worker pool, paced by a token
+    bucket of `rate_per_sec`.
+
+    Progress is checkpointed as (page cursor, recipients finished in that
+    page) every `checkpoint_every` sends and at every page boundary. After a
+    restart a campaign picks up from its checkpoint; only sends that were in
+    flight at the time (at most 2 x workers) can go out twice.
+
+    When several processes share the table, pass `leader_lock` (a file path):
+    only the process holding its flock runs campaigns, re-reading the table
+    every `poll_interval` seconds to pick up those scheduled elsewhere, and
+    another takes over if it exits.
+    """
+
+    def __init__(self, path, fetch_page, send, workers=4, rate_per_sec=5.0, page_size=200, max_attempts=5,
+                 checkpoint_every=50, leader_lock=None, poll_interval=1.0):
+        self.path = path
+        self.fetch_page = fetch_page
+        self.send = send
+        self.workers = workers
+        self.page_size = page_size
+        self.max_attempts = max_attempts
+        self.checkpoint_every = checkpoint_every
+        self.throttle = RateLimiter(rate_per_sec, burst=max(1.0, rate_per_sec), scope='campaign')
+        self.leader_lock = leader_lock
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._heap = []  # (send_at, campaign id); stale entries are skipped when popped
+        self._active = None
+        self._cancelled = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+        self._lock_file = None
+        self._leading = False
+        self._reload_after = 0.0
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    # --- PRODUCER SIDE ---
+    def schedule(self, audience, template, send_at=None, name=None):
+        campaign_id = uuid.uuid4().hex
+        now = time.time()
+        send_at = now if send_at is None else send_at
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO campaigns (id, name, audience, template, status, send_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'scheduled', ?, ?, ?)",
+                (campaign_id, name, json.dumps(audience), json.dumps(template), send_at, now, now),
+            )
+        self._push(send_at, campaign_id)
+        return campaign_id
+
+    def cancel(self, campaign_id):
+        """Stops a scheduled or running campaign. Returns False if it was not active."""
+        with self._lock:
+            changed = self._db.execute(
+                "UPDATE campaigns SET status = 'cancelled', updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                (time.time(), campaign_id, *ACTIVE),
+            ).rowcount
+        if changed and self._active == campaign_id:
+            self._cancelled.set()
+        return bool(changed)
+
+    def get(self, campaign_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'status': row['status'],
+            'sendAt': row['send_at'],
+            'sent': row['sent'],
+            'failed': row['failed'],
+            'attempts': row['attempts'],
+            'error': row['error'],
+            'createdAt': row['created_at'],
+            'updatedAt': row['updated_at'],
+        }
+
+    def depth(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM campaigns WHERE status IN (?, ?)", ACTIVE).fetchone()[0]
+
+    # --- SCHEDULING ---
+    def _push(self, send_at, campaign_id):
+        # Only the leader dispatches; it finds campaigns scheduled by other processes when it reloads
+        if self.leader_lock and not self._leading:
+            return
+        with self._wakeup:
+            heapq.heappush(self._heap, (send_at, campaign_id))
+            self._wakeup.notify()
+
+    def _next_due(self):
+        """Pops the earliest due campaign. Returns (row, None) or (None, seconds until the next one)."""
+        while self._heap:
+            send_at, campaign_id = self._heap[0]
+            wait = send_at - time.time()
+            if wait > 0:
+                return None, wait
+            heapq.heappop(self._heap)
+            with self._lock:
+                row = self._db.execute("SELECT * FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+            # Cancelled, finished, or rescheduled since this entry was pushed
+            if row is not None and row['status'] in ACTIVE and row['send_at'] == send_at:
+                return row, None
+        return None, None
+
+    def _reload(self):
+        """Rebuilds the heap from every scheduled or running campaign in the table."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, send_at FROM campaigns WHERE status IN (?, ?)", ACTIVE).fetchall()
+        with self._wakeup:
+            self._heap = [(r['send_at'], r['id']) for r in rows]
+            heapq.heapify(self._heap)
+        self._reload_after = time.monotonic() + self.poll_interval
+        return len(rows)
+
+    def _lead(self):
+        """Waits until this process holds `leader_lock`. False if stopped first."""
+        import fcntl
+        self._lock_file = open(self.leader_lock, 'a')
+        while not self._stopping:
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._leading = True
+                return True
+            except BlockingIOError:
+                time.sleep(self.poll_interval)
+        return False
+
+    def _dispatcher(self):
+        if self.leader_lock:
+            if not self._lead():
+                return
+            log.info("📣 This process now runs scheduled campaigns (%d active)", self._reload())
+        while not self._stopping:
+            if self.leader_lock and time.monotonic() >= self._reload_after:
+                self._reload()
+            with self._wakeup:
+                row, wait = self._next_due()
+                if row is None:
+                    self._wakeup.wait(1.0 if wait is None else min(wait, 1.0))
+                    continue
+            try:
+                self._run(row)
+            except Exception:
+                log.exception("Campaign %s crashed", row['id'])
+
+    # --- RUNNING ---
+    def _save(self, campaign_id, checkpoint, sent, failed, status=None, error=None):
+        with self._lock:
+            # Progress is always recorded, but a cancelled campaign stays cancelled
+            self._db.execute(
+                "UPDATE campaigns SET checkpoint = ?, sent = ?, failed = ?, "
+                "status = CASE WHEN status = 'cancelled' THEN status ELSE COALESCE(?, status) END, "
+                "error = COALESCE(?, error), updated_at = ? WHERE id = ?",
+                (json.dumps(checkpoint), sent, failed, status, error, time.time(), campaign_id),
+            )
+            current = self._db.execute("SELECT status FROM campaigns WHERE id = ?", (campaign_id,)).fetchone()
+        # cancel() may have been called in another process
+        if current is not None and current['status'] == 'cancelled' and self._active == campaign_id:
+            self._cancelled.set()
+
+    def _interrupted(self):
+        return self._stopping or self._cancelled.is_set()
+
+    def _paced(self, recipients, start):
+        """Feeds the worker pool one recipient per throttle token, until stopped or cancelled."""
+        for index, recipient in enumerate(recipients[start:], start):
+            if self._interrupted():
+                return
+            self.throttle.wait(max_wait=float('inf'))
+            yield index, recipient
+
+    def _send_one(self, index, recipient, template):
+        self.send(recipient, template)
+
+    def _run(self, row):
+        campaign_id = row['id']
+        audience = json.loads(row['audience'])
+        template = json.loads(row['template'])
+        checkpoint = json.loads(row['checkpoint']) if row['checkpoint'] else {'page': None, 'done': 0}
+        sent, failed = row['sent'], row['failed']
+
+        self._active = campaign_id
+        self._cancelled.clear()
+        with self._lock:
+            started = self._db.execute(
+                "UPDATE campaigns SET status = 'running', updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                (time.time(), campaign_id, *ACTIVE)).rowcount
+        if not started:
+            self._active = None
+            return
+        log.info("📣 Campaign %s started (sent=%d so far)", campaign_id, sent)
+        try:
+            while True:
+                try:
+                    recipients, next_page = self.fetch_page(audience, checkpoint['page'], self.page_size)
+                except Exception as e:
+                    self._retry_later(row, checkpoint, sent, failed, e)
+                    return
+
+                # Results arrive out of order; only the unbroken run of finished ones is safe to checkpoint
+                finished = set()
+                since_save = 0
+                calls = ((i, r, template) for i, r in self._paced(recipients, checkpoint['done']))
+                for (index, _, _), future in bounded_as_completed(self._executor, self._send_one, calls,
+                                                                   window=self.workers * 2):
+                    try:
+                        future.result()
+                        sent += 1
+                        CAMPAIGN_EMAILS.inc('sent')
+                    except Suppressed as e:
+                        # Neither sent nor failed: the address bounced before or unsubscribed
+                        CAMPAIGN_EMAILS.inc('skipped')
+                        log.debug("Campaign %s: %s", campaign_id, e)
+                    except Exception as e:
+                        failed += 1
+                        CAMPAIGN_EMAILS.inc('failed')
+                        log.warning("Campaign %s: send to %s failed: %s", campaign_id, recipients[index].get('email'), e)
+                    finished.add(index)
+                    while checkpoint['done'] in finished:
+                        finished.discard(checkpoint['done'])
+                        checkpoint['done'] += 1
+                    since_save += 1
+                    if since_save >= self.checkpoint_every:
+                        self._save(campaign_id, checkpoint, sent, failed)
+                        since_save = 0
+
+                if self._interrupted():
+                    # Left 'running' (or 'cancelled'); a restart resumes from here
+                    self._save(campaign_id, checkpoint, sent, failed)
+                    return
+                if next_page is None:
+                    self._save(campaign_id, checkpoint, sent, failed, status='completed')
+                    log.info("✅ Campaign %s completed: %d sent, %d failed", campaign_id, sent, failed)
+                    return
+                checkpoint = {'page': next_page, 'done': 0}
+                self._save(campaign_id, checkpoint, sent, failed)
+        finally:
+            self._active = None
+
+    def _retry_later(self, row, checkpoint, sent, failed, error):
+        attempt = row['attempts'] + 1
+        if attempt >= self.max_attempts:
+            FAILURES.inc('campaign')
+            log.error("❌ Campaign %s failed after %d attempt(s): %s", row['id'], attempt, error)
+            self._save(row['id'], checkpoint, sent, failed, status='failed', error=str(error))
+            return
+        send_at = time.time() + backoff_delay(attempt)
+        RETRIES.inc('campaign')
+        log.warning("⚠️ Campaign %s: audience page failed (%s); retrying at checkpoint", row['id'], error)
+        with self._lock:
+            self._db.execute(
+                "UPDATE campaigns SET status = 'scheduled', send_at = ?, attempts = ?, checkpoint = ?, sent = ?, "
+                "failed = ?, error = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                (send_at, attempt, json.dumps(checkpoint), sent, failed, str(error), time.time(), row['id'], *ACTIVE),
+            )
+        self._push(send_at, row['id'])
+
+    # --- LIFECYCLE ---
+    def start(self):
+        if not self.leader_lock:
+            resumed = self._reload()
+            if resumed:
+                log.info("Resuming %d scheduled/running campaign(s)", resumed)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="campaign")
+        self._thread = threading.Thread(target=self._dispatcher, name="campaign-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if self._thread:
+            self._thread.join(timeout=30)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        if self._lock_file:
+            self._lock_file.close()
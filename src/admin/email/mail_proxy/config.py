@@ -0,0 +1,147 @@
+import os
+
+
+# --- ROBUST ENV LOADING ---
+def load_env_file(filepath):
+    """
+    Parses .env files robustly, handling quotes and comments.
+    Returns True if the file existed.
+    """
+    if not os.path.exists(filepath):
+        return False
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            if '=' in line:
+                key, value = line.split('=', 1)
+                key = key.strip()
+                value = value.strip()
+
+                # Remove surrounding quotes (single or double)
+                if (value.startswith('"') and value.endswith('"')) or \
+                   (value.startswith("'") and value.endswith("'")):
+                    value = value[1:-1]
+
+                os.environ[key] = value
+    return True
+
+
+class Config:
+    """Proxy settings, read once from the environment (after .env / .env.local are loaded)."""
+
+    def __init__(self, environ=None):
+        env = os.environ if environ is None else environ
+
+        self.port = int(env.get("PORT", 8000))
+        # DEBUG / INFO / WARNING / ERROR, or OFF to skip log formatting and I/O entirely; LOG_FORMAT=json for one object per line
+        self.log_level = env.get("LOG_LEVEL", "INFO")
+        self.log_format = env.get("LOG_FORMAT", "text")
+
+        # Request body caps: JSON bodies in general, and the bulk routes (/send-email/batch, /delete-users)
+        self.max_body_bytes = int(env.get("MAX_BODY_BYTES", 2 * 1024 * 1024))
+        self.max_bulk_body_bytes = int(env.get("MAX_BULK_BODY_BYTES", 64 * 1024 * 1024))
+        # Bulk bodies past this size are spooled to a temp file instead of memory
+        self.body_spool_bytes = int(env.get("BODY_SPOOL_BYTES", 1024 * 1024))
+
+        # "threaded" (one thread per connection) or "asyncio" (event loop + bounded worker pool)
+        self.server_mode = env.get("SERVER_MODE", "threaded")
+        self.aio_concurrency = int(env.get("AIO_CONCURRENCY", 64))
+        self.aio_max_pending = int(env.get("AIO_MAX_PENDING", 1024))
+        # Pre-fork: this many worker processes accept on one listening socket (1 = single process). Rate limits
+        # and Idempotency-Keys are then kept in STATE_DB_PATH so all workers share them
+        self.workers = int(env.get("WORKERS", 1))
+        self.state_db_path = env.get("STATE_DB_PATH", "email_proxy_state.sqlite3")
+        # On SIGHUP (reload) or SIGTERM, workers get this long to finish in-flight requests before being killed
+        self.graceful_timeout = float(env.get("GRACEFUL_TIMEOUT", 30))
+
+        # --- SMTP (SECURE) ---
+        self.smtp_server = env.get("SMTP_SERVER", "smtp.zeptomail.in")
+        self.smtp_port = int(env.get("SMTP_PORT", 587))
+        self.username = "emailapikey"
+        self.password = env.get("SMTP_PASSWORD")
+        # Allow disabling email sending (for debugging)
+        self.disable_email_sending = env.get("DISABLE_EMAIL_SENDING") == "true"
+
+        # Logged-in SMTP sessions shared by all handler threads (STARTTLS + LOGIN only on connect)
+        self.smtp_pool_size = int(env.get("SMTP_POOL_SIZE", 4))
+        self.smtp_pool_idle_timeout = float(env.get("SMTP_POOL_IDLE_TIMEOUT", 60))
+        # Set to "false" only for local relays/sinks that do not offer STARTTLS
+        self.smtp_starttls = env.get("SMTP_STARTTLS", "true") != "false"
+
+        # Bulk sends (/send-email/batch) share one bounded set of sender threads
+        self.batch_concurrency = int(env.get("BATCH_CONCURRENCY", self.smtp_pool_size))
+        self.batch_max_items = int(env.get("BATCH_MAX_ITEMS", 10000))
+        # "pipelined": batches go out grouped by domain, many messages per SMTP session (PIPELINING when offered);
+        # "per_message": one pooled send per recipient, like /send-email
+        self.batch_engine = env.get("BATCH_ENGINE", "pipelined")
+        self.bulk_smtp_sessions = int(env.get("BULK_SMTP_SESSIONS", self.smtp_pool_size))
+        self.bulk_chunk_size = int(env.get("BULK_CHUNK_SIZE", 50))
+
+        # Durable background send queue (survives restarts)
+        self.job_queue_path = env.get("JOB_QUEUE_PATH", "email_jobs.sqlite3")
+        self.job_workers = int(env.get("JOB_WORKERS", 4))
+        self.job_max_attempts = int(env.get("JOB_MAX_ATTEMPTS", 5))
+
+        # Scheduled campaigns (POST /campaigns): durable schedule with checkpoints, audience read in pages
+        self.campaign_db_path = env.get("CAMPAIGN_DB_PATH", "email_campaigns.sqlite3")
+        self.campaign_workers = int(env.get("CAMPAIGN_WORKERS", 4))
+        self.campaign_rate_per_sec = float(env.get("CAMPAIGN_RATE_PER_SEC", 5))
+        self.campaign_page_size = int(env.get("CAMPAIGN_PAGE_SIZE", 200))
+
+        # Addresses that hard-bounced (email_logs) or unsubscribed (email_unsubscribes) are skipped before SMTP
+        self.suppression_enabled = env.get("SUPPRESSION_ENABLED", "true") != "false"
+        self.suppression_refresh_seconds = float(env.get("SUPPRESSION_REFRESH_SECONDS", 60))
+        # Full reload, which is how deleted email_unsubscribes rows (resubscribes) leave the list
+        self.suppression_rebuild_seconds = float(env.get("SUPPRESSION_REBUILD_SECONDS", 21600))
+
+        # email_logs rows are buffered and inserted in bulk by a background writer
+        self.log_batch_size = int(env.get("LOG_BATCH_SIZE", 100))
+        self.log_flush_ms = int(env.get("LOG_FLUSH_MS", 500))
+        self.log_max_buffer = int(env.get("LOG_MAX_BUFFER", 10000))
+        self.log_spill_path = env.get("LOG_SPILL_PATH", "email_logs.spill.jsonl")
+
+        # --- SUPABASE ---
+        # Use Environment Variables or Defaults (Fail loudly if critical keys missing in Prod logic)
+        self.supabase_url = env.get("VITE_SUPABASE_URL", "https://your-project.supabase.co")
+        self.supabase_service_role_key = env.get("SUPABASE_SERVICE_ROLE_KEY")
+        # Keep-alive connections to SUPABASE_URL shared by every handler
+        self.supabase_max_connections = int(env.get("SUPABASE_MAX_CONNECTIONS", 10))
+        self.supabase_timeout = float(env.get("SUPABASE_TIMEOUT", 15))
+        # email -> auth user id cache used by OTP verify (0 disables; always off with WORKERS > 1)
+        self.user_cache_ttl = float(env.get("USER_CACHE_TTL", 300))
+        # Where OTP codes live: "supabase" (verification_codes, multi-node safe) or "memory" (single node, no DB calls)
+        self.otp_store = env.get("OTP_STORE", "supabase")
+        self.otp_ttl = float(env.get("OTP_TTL", 600))
+        self.otp_max_attempts = int(env.get("OTP_MAX_ATTEMPTS", 5))
+
+        # --- RATE LIMITS ---
+        # Admission control (token buckets; 0 disables a limit). Over the limit -> 429 + Retry-After
+        self.rate_limit_route_per_min = float(env.get("RATE_LIMIT_ROUTE_PER_MIN", 600))
+        # Per-route overrides, e.g. "/otp=60,/send-email/batch=10" (requests per minute)
+        self.rate_limit_routes = env.get("RATE_LIMIT_ROUTES", "/otp=120,/send-email/batch=30")
+        self.rate_limit_ip_per_min = float(env.get("RATE_LIMIT_IP_PER_MIN", 120))
+        # Outbound emails per recipient address (OTP, single and batch sends)
+        self.rate_limit_recipient_per_hour = float(env.get("RATE_LIMIT_RECIPIENT_PER_HOUR", 20))
+        self.rate_limit_max_keys = int(env.get("RATE_LIMIT_MAX_KEYS", 1000000))
+        # Only behind a trusted reverse proxy: take the client IP from X-Forwarded-For
+        self.rate_limit_trust_proxy = env.get("RATE_LIMIT_TRUST_PROXY", "false") == "true"
+        # Global outbound SMTP pace, set to the provider's sending limit
+        self.smtp_rate_per_sec = float(env.get("SMTP_RATE_PER_SEC", 10))
+        self.smtp_rate_burst = float(env.get("SMTP_RATE_BURST", 10))
+        # A send that would wait longer than this for the SMTP rate fails and is retried later
+        self.smtp_rate_max_wait = float(env.get("SMTP_RATE_MAX_WAIT", 30))
+
+        # POSTs with an Idempotency-Key: responses kept for replay this long; a duplicate of a request still
+        # running waits up to IDEMPOTENCY_WAIT_SECONDS for its response
+        self.idempotency_ttl = float(env.get("IDEMPOTENCY_TTL", 86400))
+        self.idempotency_max_keys = int(env.get("IDEMPOTENCY_MAX_KEYS", 10000))
+        self.idempotency_max_response_bytes = int(env.get("IDEMPOTENCY_MAX_RESPONSE_BYTES", 256 * 1024))
+        self.idempotency_wait_seconds = float(env.get("IDEMPOTENCY_WAIT_SECONDS", 30))
+
+        # /delete-users: parallel DELETEs per request; larger lists are handed to the job queue
+        self.delete_concurrency = int(env.get("DELETE_CONCURRENCY", 8))
+        self.delete_async_threshold = int(env.get("DELETE_ASYNC_THRESHOLD", 200))
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .metrics import REGISTRY
+from .shared_state import process_alive
+
+REPLAYS = REGISTRY.counter(
+    'email_proxy_idempotent_replays_total', "POSTs answered from the Idempotency-Key cache", ('route',))
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(ValueError):
+    """The Idempotency-Key cannot be honoured (bad key, reused with another body, still running); see `status`."""
+
+    def __init__(self, message, status=409):
+        self.status = status
+        super().__init__(message)
+
+
+def kept(status):
+    """Responses the client should be able to retry (5xx, 429) are not replayed."""
+    return status < 500 and status != 429
+
+
+class Entry:
+    """One (route, key): in flight until `done` is set, then the recorded response."""
+
+    __slots__ = ('done', 'fingerprint', 'status', 'response', 'expires')
+
+    def __init__(self, expires):
+        self.done = threading.Event()
+        self.fingerprint = None
+        self.status = None
+        self.response = None  # raw HTTP response bytes, or None when too large to keep
+        self.expires = expires
+
+
+class IdempotencyCache:
+    """
+    Responses to POSTs that carry an Idempotency-Key, in LRU order with a TTL.
+
+    The first request with a key claims it and runs; duplicates that arrive
+    meanwhile wait for it and get the same response, and later ones get it
+    from the cache until `ttl` runs out. Responses the client should be able
+    to retry (5xx, 429) are handed to the waiting duplicates but not kept.
+    Past `max_entries` the least recently used finished entries are dropped.
+    """
+
+    def __init__(self, ttl=86400.0, max_entries=10000, max_response_bytes=256 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_response_bytes = max_response_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, scope):
+        """Returns (entry, True) if the caller now owns `scope` and must finish() it, else (existing entry, False)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is not None and entry.expires > now:
+                self._entries.move_to_end(scope)
+                return entry, False
+            entry = self._entries[scope] = Entry(now + self.ttl)
+            self._entries.move_to_end(scope)
+            self._evict()
+            return entry, True
+
+    def _evict(self):
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        # In-flight entries stay: dropping one would let a duplicate run the request again
+        for scope in [s for s, e in self._entries.items() if e.done.is_set()][:excess]:
+            del self._entries[scope]
+
+    def finish(self, scope, entry, fingerprint, status, response):
+        entry.fingerprint = fingerprint
+        entry.status = status
+        entry.response = response if response is not None and len(response) <= self.max_response_bytes else None
+        if not kept(status):
+            with self._lock:
+                if self._entries.get(scope) is entry:
+                    del self._entries[scope]
+        entry.done.set()
+
+    def wait(self, entry, timeout):
+        """Waits for a claimed entry to be finished; False if it is still in flight after `timeout` seconds."""
+        return entry.done.wait(timeout)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedEntry:
+    """An idempotency row as read from SharedState; `token` identifies one claim of the key."""
+
+    __slots__ = ('key', 'token', 'owner', 'fingerprint', 'status', 'response')
+
+    def __init__(self, key, token, owner, fingerprint=None, status=None, response=None):
+        self.key = key
+        self.token = token
+        self.owner = owner
+        self.fingerprint = fingerprint
+        self.status = status
+        self.response = response
+
+
+class SharedIdempotencyCache:
+    """
+    IdempotencyCache for pre-fork workers, kept in a SharedState database so a
+    duplicate is recognised whichever worker it lands on. Waiting duplicates
+    poll the row. An in-flight claim whose worker has died can be taken over,
+    as can a retryable (5xx, 429) response; the row keeps that response for
+    duplicates that were already waiting on it, as IdempotencyCache does. The
+    state janitor drops expired keys and trims the table to `max_entries`.
+    """
+
+    def __init__(self, state, ttl=86400.0, max_entries=10000, max_response_bytes=256 * 1024, poll_interval=0.05):
+        self.state = state
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_response_bytes = max_response_bytes
+        self.poll_interval = poll_interval
+
+    @staticmethod
+    def _key(scope):
+        path, key = scope
+        return f"{path} {key}"
+
+    def claim(self, scope):
+        key = self._key(scope)
+        now = time.time()
+        with self.state.transaction() as db:
+            row = db.execute("SELECT * FROM idempotency WHERE scope = ?", (key,)).fetchone()
+            if row is not None and row['expires'] > now and (
+                    kept(row['status']) if row['status'] is not None else process_alive(row['owner'])):
+                db.execute("UPDATE idempotency SET used_at = ? WHERE scope = ?", (now, key))
+                return SharedEntry(key, row['token'], row['owner'], row['fingerprint'], row['status'],
+                                   row['response']), False
+            entry = SharedEntry(key, uuid.uuid4().hex, os.getpid())
+            # Duplicates polling a finished retryable response must still get it after the row is taken over
+            prev = (row['token'], row['fingerprint'], row['status'], row['response']) \
+                if row is not None and row['status'] is not None else (None, None, None, None)
+            db.execute("INSERT OR REPLACE INTO idempotency (scope, owner, token, expires, used_at, prev_token, "
+                       "prev_fingerprint, prev_status, prev_response) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, entry.owner, entry.token, now + self.ttl, now, *prev))
+            return entry, True
+
+    def finish(self, scope, entry, fingerprint, status, response):
+        if response is not None and len(response) > self.max_response_bytes:
+            response = None
+        with self.state.transaction() as db:
+            db.execute("UPDATE idempotency SET fingerprint = ?, status = ?, response = ? WHERE scope = ? AND token = ?",
+                       (fingerprint, status, response, entry.key, entry.token))
+
+    def wait(self, entry, timeout):
+        if entry.status is not None:
+            return True
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            rows = self.state.query("SELECT * FROM idempotency WHERE scope = ?", (entry.key,))
+            row = rows[0] if rows else None
+            if row is not None and row['prev_token'] == entry.token:
+                # Finished with a retryable status and already claimed again: hand out that response
+                entry.fingerprint, entry.status, entry.response = \
+                    row['prev_fingerprint'], row['prev_status'], row['prev_response']
+                return True
+            if row is None or row['token'] != entry.token:
+                return False  # expired, trimmed, or taken over from a dead worker
+            if row['status'] is not None:
+                entry.fingerprint, entry.status, entry.response = row['fingerprint'], row['status'], row['response']
+                return True
+            if not process_alive(entry.owner):
+                return False
+        return False
+
+    def __len__(self):
+        return self.state.query("SELECT COUNT(*) FROM idempotency")[0][0]
+
+
+class ResponseRecorder:
+    """`wfile` wrapper that passes writes through and keeps a copy of the first `limit` bytes."""
+
+    def __init__(self, wfile, limit):
+        self.wfile = wfile
+        self.limit = limit
+        self._parts = []
+        self._size = 0
+
+    def write(self, data):
+        self._size += len(data)
+        if self._size <= self.limit:
+            self._parts.append(bytes(data))
+        return self.wfile.write(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def recorded(self):
+        """The whole response, or None if it outgrew the limit."""
+        return b"".join(self._parts) if self._size <= self.limit else None
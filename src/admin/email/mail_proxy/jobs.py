@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from .metrics import FAILURES, RETRIES
+from .shared_state import process_alive
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,           -- queued | running | succeeded | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner INTEGER                   -- pid of the process running it
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at);
+"""
+
+
+def backoff_delay(attempt, base=2.0, cap=300.0):
+    """Exponential backoff with jitter: somewhere in [d/2, d] where d = base * 2^(attempt-1), capped."""
+    delay = min(cap, base * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class JobQueue:
+    """
+    Durable background job queue backed by SQLite.
+
+    Jobs are persisted before `enqueue` returns, so they survive a restart;
+    anything left `running` by a crash is picked up again on `start`. Several
+    processes may share one queue file: claims are atomic, and only jobs
+    whose process is gone are requeued.
+    A fixed pool of worker threads drains due jobs and retries failures with
+    exponential backoff until `max_attempts` is reached.
+    """
+
+    def __init__(self, path, workers=4, max_attempts=5, base_delay=2.0, max_delay=300.0,
+                 permanent_errors=(ValueError,), retention=86400.0):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.permanent_errors = permanent_errors
+        self.retention = retention
+
+        self._handlers = {}
+        self._on_failure = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._threads = []
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        # Queue files from before the owner column
+        if 'owner' not in {r['name'] for r in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+
+    def register(self, kind, fn, on_failure=None):
+        """
+        `fn(payload)` runs the job and returns a JSON-serialisable result.
+        `on_failure(payload, error)` runs once when the job is given up on.
+        """
+        self._handlers[kind] = fn
+        if on_failure:
+            self._on_failure[kind] = on_failure
+
+    # --- PRODUCER SIDE ---
+    def enqueue(self, kind, payload, delay=0.0):
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), now + delay, now, now),
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'createdAt': row['created_at'],
+            'updatedAt': row['updated_at'],
+        }
+
+    def depth(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    # --- WORKER SIDE ---
+    def _claim(self):
+        """Atomically moves the oldest due job to `running`. Returns the row or the next due time."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY run_at LIMIT 1"
+                ).fetchone()
+                if row is None or row['run_at'] > now:
+                    self._db.execute("COMMIT")
+                    return None, (row['run_at'] if row else None)
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (os.getpid(), now, row['id']),
+                )
+                self._db.execute("COMMIT")
+                return row, None
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _finish(self, job_id, status, result=None, error=None, run_at=None):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, run_at = COALESCE(?, run_at), updated_at = ? "
+                "WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, run_at, now, job_id),
+            )
+
+    def _run(self, row):
+        kind = row['kind']
+        payload = json.loads(row['payload'])
+        attempt = row['attempts'] + 1
+        try:
+            result = self._handlers[kind](payload)
+            self._finish(row['id'], 'succeeded', result=result)
+        except Exception as e:
+            permanent = isinstance(e, self.permanent_errors)
+            if permanent or attempt >= self.max_attempts:
+                FAILURES.inc(f"job:{kind}")
+                log.error("❌ Job %s (%s) failed after %d attempt(s): %s", row['id'], kind, attempt, e)
+                self._finish(row['id'], 'failed', error=str(e))
+                callback = self._on_failure.get(kind)
+                if callback:
+                    try:
+                        callback(payload, e)
+                    except Exception:
+                        log.exception("on_failure callback for job %s (%s) raised", row['id'], kind)
+            else:
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                RETRIES.inc(f"job:{kind}")
+                log.warning("⚠️ Job %s (%s) attempt %d failed: %s. Retrying in %.1fs", row['id'], kind, attempt, e, delay)
+                self._finish(row['id'], 'queued', error=str(e), run_at=time.time() + delay)
+
+    def _worker(self):
+        while not self._stopping:
+            try:
+                row, next_due = self._claim()
+            except Exception:
+                log.exception("Could not claim a job")
+                row, next_due = None, None
+            if row is not None:
+                self._run(row)
+                continue
+            timeout = 1.0 if next_due is None else max(0.0, min(1.0, next_due - time.time()))
+            with self._wakeup:
+                self._wakeup.wait(timeout)
+
+    def _janitor(self):
+        prune_after = 0.0
+        while not self._stopping:
+            try:
+                # Another process sharing the queue may have died mid-job
+                self._recover()
+            except Exception:
+                log.exception("Could not requeue interrupted jobs")
+            if time.monotonic() >= prune_after:
+                cutoff = time.time() - self.retention
+                try:
+                    with self._lock:
+                        self._db.execute(
+                            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?", (cutoff,)
+                        )
+                except Exception:
+                    log.exception("Could not prune finished jobs")
+                prune_after = time.monotonic() + min(self.retention, 3600)
+            time.sleep(60)
+
+    def _recover(self, starting=False):
+        """
+        Requeues jobs left 'running' by a process that no longer exists. On
+        `starting`, jobs under our own pid (a previous run, e.g. PID 1 in a
+        container) or claimed before owners were recorded count as well.
+        """
+        with self._lock:
+            owners = [r[0] for r in self._db.execute("SELECT DISTINCT owner FROM jobs WHERE status = 'running'")]
+            recovered = 0
+            for owner in owners:
+                orphaned = starting if owner is None or owner == os.getpid() else not process_alive(owner)
+                if orphaned:
+                    recovered += self._db.execute(
+                        "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND owner IS ?", (owner,)
+                    ).rowcount
+        if recovered:
+            log.info("Requeued %d job(s) interrupted by a restart", recovered)
+
+    def start(self):
+        self._recover(starting=True)
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        threading.Thread(target=self._janitor, name="job-janitor", daemon=True).start()
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for t in self._threads:
+            t.join(timeout=5)
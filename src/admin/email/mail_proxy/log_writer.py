@@ -0,0 +1,166 @@
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from .metrics import FAILURES, STAGE_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+class LogWriter:
+    """
+    Buffers email_logs rows and writes them in bulk from a background thread.
+
+    A flush happens every `batch_size` rows or every `flush_interval` seconds,
+    whichever comes first, as one PostgREST insert with a JSON array body.
+    At most `max_buffer` rows are held in memory; beyond that, and whenever a
+    flush fails, rows are appended to `spill_path` (JSON lines) and replayed
+    once Supabase accepts writes again.
+    """
+
+    def __init__(self, post_rows, batch_size=100, flush_interval=0.5, max_buffer=10000,
+                 spill_path="email_logs.spill.jsonl", replay_interval=30.0):
+        self.post_rows = post_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.spill_path = spill_path
+        self.replay_interval = replay_interval
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self._replay_after = 0.0
+        self.stats = {'written': 0, 'flushes': 0, 'spilled': 0, 'replayed': 0}
+
+    def write(self, row):
+        """Queues one row. Never blocks on the network and never raises."""
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer:
+                overflow = True
+            else:
+                overflow = False
+                self._buffer.append(row)
+                if len(self._buffer) >= self.batch_size:
+                    self._cond.notify()
+        if overflow:
+            self._spill([row])
+
+    # --- DISK SPILL ---
+    def _spill(self, rows, rest=()):
+        """Appends `rows`, then any already-encoded lines in `rest`, to the spill file."""
+        try:
+            with self._spill_lock:
+                with open(self.spill_path, 'a', encoding='utf-8') as f:
+                    for row in rows:
+                        f.write(json.dumps(row) + "\n")
+                    count = len(rows)
+                    for line in rest:
+                        f.write(line)
+                        count += 1
+                self.stats['spilled'] += count
+        except Exception:
+            log.exception("Could not spill %d email_logs rows to %s", len(rows), self.spill_path)
+
+    def _replay_spill(self):
+        """Pushes spilled rows back to Supabase in batches once it is reachable again."""
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            # A .replay file left by a crash mid-replay goes first; moving the spill file onto it would lose it
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        # Read a batch at a time: the file can hold hours of rows from an outage
+        with open(replay_path, 'r', encoding='utf-8') as f:
+            while True:
+                lines = list(itertools.islice(f, self.batch_size))
+                if not lines:
+                    break
+                chunk = [json.loads(line) for line in lines if line.strip()]
+                if not chunk:
+                    continue
+                try:
+                    self.post_rows(chunk)
+                    self.stats['replayed'] += len(chunk)
+                except Exception as e:
+                    log.warning("⚠️ email_logs replay failed, keeping the remaining rows on disk: %s", e)
+                    self._spill(chunk, rest=f)
+                    self._replay_after = time.monotonic() + self.replay_interval
+                    break
+        os.remove(replay_path)
+
+    def pending(self):
+        """Rows buffered in memory and not yet written."""
+        return len(self._buffer)
+
+    # --- FLUSHING ---
+    def _take(self):
+        with self._cond:
+            rows = []
+            while self._buffer and len(rows) < self.batch_size:
+                rows.append(self._buffer.popleft())
+            return rows
+
+    def flush(self):
+        """Writes everything currently buffered. Returns False if Supabase rejected a batch."""
+        ok = True
+        while True:
+            rows = self._take()
+            if not rows:
+                break
+            started = time.perf_counter()
+            try:
+                self.post_rows(rows)
+                STAGE_SECONDS.observe(time.perf_counter() - started, 'log_write', '')
+                self.stats['written'] += len(rows)
+                self.stats['flushes'] += 1
+            except Exception as e:
+                # Supabase is unreachable: park this batch and everything behind it on disk
+                with self._cond:
+                    rows.extend(self._buffer)
+                    self._buffer.clear()
+                FAILURES.inc('log_write')
+                log.warning("⚠️ Failed to write email_logs, spilling %d rows to disk: %s", len(rows), e)
+                self._spill(rows)
+                self._replay_after = time.monotonic() + self.replay_interval
+                ok = False
+                break
+        if ok and time.monotonic() >= self._replay_after and (
+                os.path.exists(self.spill_path) or os.path.exists(self.spill_path + ".replay")):
+            self._replay_spill()
+        return ok
+
+    def _run(self):
+        while not self._stopping:
+            deadline = time.monotonic() + self.flush_interval
+            with self._cond:
+                while not self._stopping and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self.flush()
+            except Exception:
+                log.exception("email_logs flush failed")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="email-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and makes one final flush."""
+        self._stopping = True
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
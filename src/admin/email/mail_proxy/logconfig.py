@@ -0,0 +1,49 @@
+import json
+import logging
+import sys
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via `extra=` become top-level keys."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level="INFO", fmt="text"):
+    """
+    Sets up logging for the proxy. `level` applies to the mail_proxy loggers
+    (every module logs under its __name__); other libraries only get through
+    at WARNING or above. level "OFF" disables logging entirely: calls return
+    before any message is formatted or written.
+    """
+    if str(level).upper() == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"))
+    level = logging.getLevelName(str(level).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {level}")
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(max(level, logging.WARNING))
+    logging.getLogger(__package__).setLevel(level)
@@ -0,0 +1,187 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; tuned for SMTP/HTTP round trips (1 ms .. 30 s)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label set. Label values are passed positionally: RETRIES.inc('smtp_send')."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self, extra=None):
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key, extra)} {_number(value)}"
+
+
+class Gauge:
+    """
+    Current value per label set, either set() directly or read from `fn` at
+    scrape time (fn returns a number, or a dict of label-value tuple -> number).
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def collect(self, extra=None):
+        if self.fn is not None:
+            try:
+                current = self.fn()
+            except Exception:
+                return
+            values = current.items() if isinstance(current, dict) else [((), current)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key, extra)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram per label set. observe() is one bisect and
+    one short lock, so it is cheap enough for every SMTP command and REST call.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def collect(self, extra=None):
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        prefix = f"{extra}," if extra else ""
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, prefix + le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key, extra)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key, extra)} {count}"
+
+
+class Registry:
+    """Named metrics, rendered in the Prometheus text exposition format by /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._extra = None  # constant labels added to every series
+
+    def label_all(self, **labels):
+        """
+        Adds `labels` to every series, e.g. worker=<pid> in a pre-fork worker:
+        each worker counts on its own, and /metrics is answered by whichever
+        one accepts the scrape.
+        """
+        self._extra = ",".join(f'{n}="{_escape(v)}"' for n, v in labels.items()) or None
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=(), fn=None):
+        metric = self._register(Gauge, name, help_text, labels, fn)
+        if fn is not None:
+            metric.fn = fn  # the latest source wins, e.g. a re-created app
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect(self._extra))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- SHARED PROXY METRICS ---
+STAGE_SECONDS = REGISTRY.histogram(
+    'email_proxy_stage_seconds', "Time spent in one stage of handling a request",
+    ('stage', 'endpoint'))
+RETRIES = REGISTRY.counter(
+    'email_proxy_retries_total', "Operations retried after a transient failure", ('operation',))
+FAILURES = REGISTRY.counter(
+    'email_proxy_failures_total', "Operations that failed for good", ('operation',))
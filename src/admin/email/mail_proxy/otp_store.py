@@ -0,0 +1,137 @@
+import abc
+import heapq
+import hmac
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class OTPStore(abc.ABC):
+    """
+    Where one-time codes live between /otp send and /otp verify.
+
+    issue(email, code)   replaces any previous code for the email
+    check(email, code)   True if the code is valid; raises ValueError once attempts run out
+    discard(email)       removes the code after a completed verify
+    """
+
+    def __init__(self, ttl=600.0):
+        self.ttl = ttl
+
+    @abc.abstractmethod
+    def issue(self, email, code):
+        pass
+
+    @abc.abstractmethod
+    def check(self, email, code):
+        pass
+
+    @abc.abstractmethod
+    def discard(self, email):
+        pass
+
+    def start(self):
+        pass
+
+
+class MemoryOTPStore(OTPStore):
+    """
+    Single-node store: no database round trips at all.
+
+    Codes are compared in constant time and each code allows `max_attempts`
+    wrong guesses. A min-heap keyed on expiry lets a background reaper drop
+    expired codes in O(log n) each, so memory stays bounded by live codes.
+    """
+
+    def __init__(self, ttl=600.0, max_attempts=5, max_entries=100000, reap_interval=5.0):
+        super().__init__(ttl)
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self.reap_interval = reap_interval
+        self._codes = {}  # email -> [code, expires_at, failed_attempts]
+        self._expiry = []  # heap of (expires_at, email)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(email):
+        return email.strip().lower()
+
+    def issue(self, email, code):
+        key = self._key(email)
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if key not in self._codes and len(self._codes) >= self.max_entries:
+                self._reap_locked(time.monotonic())
+                if len(self._codes) >= self.max_entries:
+                    raise ValueError("Too many pending verification codes, try again shortly")
+            self._codes[key] = [code, expires_at, 0]
+            heapq.heappush(self._expiry, (expires_at, key))
+
+    def check(self, email, code):
+        key = self._key(email)
+        with self._lock:
+            entry = self._codes.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                return False
+            if hmac.compare_digest(str(entry[0]).encode('utf-8'), str(code).encode('utf-8')):
+                return True
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:
+                del self._codes[key]
+                raise ValueError("Too many attempts, request a new code")
+            return False
+
+    def discard(self, email):
+        with self._lock:
+            self._codes.pop(self._key(email), None)
+
+    def _reap_locked(self, now):
+        # Heap entries can be stale (code re-issued or discarded); only drop codes whose expiry matches
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._codes.get(key)
+            if entry is not None and entry[1] == expires_at:
+                del self._codes[key]
+        # Re-issues leave old heap entries behind; rebuild if they dominate
+        if len(self._expiry) > 2 * len(self._codes) + 1024:
+            self._expiry = [(entry[1], key) for key, entry in self._codes.items()]
+            heapq.heapify(self._expiry)
+
+    def _reaper(self):
+        while True:
+            time.sleep(self.reap_interval)
+            with self._lock:
+                self._reap_locked(time.monotonic())
+
+    def start(self):
+        threading.Thread(target=self._reaper, name="otp-reaper", daemon=True).start()
+
+
+class SupabaseOTPStore(OTPStore):
+    """Codes in the verification_codes table (Database/setup_otp.sql); safe across several proxy nodes."""
+
+    def __init__(self, supabase, ttl=600.0):
+        super().__init__(ttl)
+        self.supabase = supabase
+
+    def issue(self, email, code):
+        expires_at = (datetime.now(timezone.utc) + timedelta(seconds=self.ttl)).isoformat()
+        self.supabase.rest('DELETE', 'verification_codes', params={'email': f'eq.{email}'})
+        self.supabase.rest('POST', 'verification_codes', body={
+            'email': email,
+            'code': code,
+            'expires_at': expires_at
+        }, prefer="return=minimal")
+
+    def check(self, email, code):
+        now = datetime.now(timezone.utc).isoformat()
+        codes = self.supabase.rest('GET', 'verification_codes', params={
+            'email': f'eq.{email}',
+            'code': f'eq.{code}',
+            'expires_at': f'gt.{now}',
+            'select': 'email'
+        })
+        return bool(codes)
+
+    def discard(self, email):
+        self.supabase.rest('DELETE', 'verification_codes', params={'email': f'eq.{email}'})
@@ -0,0 +1,212 @@
+import copy
+import logging
+import os
+import signal
+import socket
+import time
+
+from .app import EmailProxy, create_app, serve
+from .jobs import backoff_delay
+from .metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+# A worker that dies sooner than this after being forked counts towards crash-loop backoff
+MIN_UPTIME = 5.0
+
+
+def check_config(config):
+    """Raises ValueError for settings that only work in a single process."""
+    if config.otp_store == 'memory':
+        raise ValueError("OTP_STORE=memory keeps codes inside one process; use OTP_STORE=supabase with WORKERS > 1")
+
+
+def worker_config(config, slot):
+    """
+    `config` for worker `slot`: each worker spills undeliverable email_logs
+    rows to its own file, and keeps no email -> user id cache, since a user
+    deleted through one worker would stay cached in the others.
+    """
+    config = copy.copy(config)
+    root, ext = os.path.splitext(config.log_spill_path)
+    config.log_spill_path = f"{root}.{slot}{ext}"
+    config.user_cache_ttl = 0
+    return config
+
+
+class Supervisor:
+    """
+    Pre-fork server. Binds the listening socket once, then forks `workers`
+    processes that all accept on it, each with its own EmailProxy (SMTP and
+    Supabase pools, job and log threads). State the workers must agree on
+    lives in SQLite: the job and campaign tables, plus rate limits and
+    Idempotency-Keys in STATE_DB_PATH.
+
+    A worker that exits is forked again, with backoff if it keeps dying right
+    after start. SIGHUP re-reads the .env files, forks a fresh set of workers
+    with the new config and sends the old ones SIGTERM; SIGTERM or SIGINT
+    stops them all the same way. Either way workers finish their in-flight
+    requests and are killed only after `graceful_timeout`.
+    """
+
+    def __init__(self, app):
+        check_config(app.config)
+        self.config = app.config
+        self.sock = None
+        self.workers = {}   # pid -> slot
+        self.retiring = {}  # pid -> deadline (monotonic) for an old worker to exit
+        self._forked_at = {}
+        self._crashes = {}
+        self._restart_at = {}  # slot -> monotonic time it may be forked again
+        self._signals = []
+
+    # --- WORKERS ---
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._work(slot)
+            except BaseException:
+                log.exception("Worker %d crashed", slot)
+            finally:
+                os._exit(code)
+        self.workers[pid] = slot
+        self._forked_at[slot] = time.monotonic()
+        return pid
+
+    def _work(self, slot):
+        """Body of a worker process: serve on the inherited socket until SIGTERM, then drain."""
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        # Ctrl+C reaches the whole process group; the supervisor turns it into an orderly SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        # Metrics live in each worker; the label keeps their series apart on a scrape
+        REGISTRY.label_all(worker=os.getpid())
+        app = EmailProxy(worker_config(self.config, slot))
+        log.info("👷 Worker %d serving (pid %d)", slot, os.getpid())
+        try:
+            app.start()
+            serve(app, sock=self.sock)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            app.stop()
+        return 0
+
+    def _retire(self, pids):
+        deadline = time.monotonic() + self.config.graceful_timeout
+        for pid in pids:
+            self.workers.pop(pid, None)
+            self.retiring[pid] = deadline
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            if self.retiring.pop(pid, None) is not None:
+                log.debug("Old worker %d exited (%s)", pid, code)
+                continue
+            slot = self.workers.pop(pid, None)
+            if slot is None:
+                continue
+            now = time.monotonic()
+            quick = now - self._forked_at[slot] < MIN_UPTIME
+            self._crashes[slot] = self._crashes.get(slot, 0) + 1 if quick else 0
+            delay = backoff_delay(self._crashes[slot], base=1.0, cap=30.0) if quick else 0.0
+            log.warning("⚠️ Worker %d (pid %d) exited with %s; restarting in %.1fs", slot, pid, code, delay)
+            self._restart_at[slot] = now + delay
+
+    def _respawn(self):
+        now = time.monotonic()
+        for slot, at in list(self._restart_at.items()):
+            if at <= now:
+                del self._restart_at[slot]
+                self.spawn(slot)
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self.retiring.items()):
+            if deadline <= now:
+                log.warning("⚠️ Worker pid %d still busy after %.0fs; killing it", pid, self.config.graceful_timeout)
+                self.retiring[pid] = float('inf')
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    # --- CONTROL ---
+    def reload(self):
+        try:
+            config = create_app().config
+            check_config(config)
+        except Exception as e:
+            log.error("❌ Reload failed, keeping the running workers: %s", e)
+            return
+        if config.port != self.config.port:
+            log.warning("⚠️ PORT changed to %d; the listening socket is kept, restart to move it", config.port)
+            config.port = self.config.port
+        # Old and new workers overlap while the old ones drain, so both must use the same shared state
+        # and campaign lock; a single worker would keep its limits in memory and run campaigns unlocked
+        if config.workers < 2:
+            log.warning("⚠️ WORKERS changed to %d; keeping %d, restart to leave pre-fork mode",
+                        config.workers, self.config.workers)
+            config.workers = self.config.workers
+        for name in ('state_db_path', 'campaign_db_path'):
+            if getattr(config, name) != getattr(self.config, name):
+                log.warning("⚠️ %s changed; keeping %s until restart", name.upper(), getattr(self.config, name))
+                setattr(config, name, getattr(self.config, name))
+        log.info("🔄 Reloading: %d new worker(s), draining %d old", config.workers, len(self.workers))
+        self.config = config
+        old = list(self.workers)
+        self._restart_at.clear()
+        self._crashes.clear()
+        for slot in range(config.workers):
+            self.spawn(slot)
+        self._retire(old)
+
+    def shutdown(self):
+        log.info("Stopping %d worker(s)", len(self.workers))
+        self._restart_at.clear()
+        self._retire(list(self.workers))
+        while self.retiring:
+            self._reap()
+            self._kill_overdue()
+            time.sleep(0.1)
+
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+
+    def run(self):
+        c = self.config
+        self.sock = socket.create_server(("", c.port), backlog=1024)
+        # Every worker is woken for each connection but only one gets it; the rest must not block in accept()
+        self.sock.setblocking(False)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+        log.info("Pre-fork supervisor (pid %d): %d workers sharing port %d", os.getpid(), c.workers, c.port)
+        for slot in range(c.workers):
+            self.spawn(slot)
+        try:
+            while True:
+                while self._signals:
+                    if self._signals.pop(0) == signal.SIGHUP:
+                        self.reload()
+                    else:
+                        self.shutdown()
+                        return
+                self._reap()
+                self._respawn()
+                self._kill_overdue()
+                time.sleep(0.2)
+        finally:
+            self.sock.close()
@@ -0,0 +1,103 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import REGISTRY
+
+REJECTED = REGISTRY.counter('email_proxy_rate_limited_total', "Requests or sends refused by a rate limit", ('scope',))
+
+
+class RateLimited(Exception):
+    """A rate limit is exhausted; retry_after is the wait in seconds until it would admit the caller."""
+
+    def __init__(self, retry_after, scope):
+        self.retry_after = retry_after
+        self.scope = scope
+        super().__init__(f"Rate limit exceeded ({scope}), retry in {math.ceil(retry_after)}s")
+
+
+class RateLimiter:
+    """
+    Token bucket per key: `rate` tokens per second, at most `burst` saved up.
+
+    Implemented as GCRA, so each key costs one float (the time its bucket
+    will be full again). Keys live in LRU order across a few independently
+    locked shards and the least recently used are evicted past `max_keys`;
+    an evicted key just starts over with a full bucket. A rate of 0 disables
+    the limiter.
+    """
+
+    SHARDS = 16
+
+    def __init__(self, rate, burst=None, max_keys=1000000, scope='global'):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.scope = scope
+        self._interval = 1.0 / rate if rate else 0.0
+        self._tolerance = self._interval * self.burst
+        self._max_per_shard = max(1, max_keys // self.SHARDS)
+        self._shards = [(OrderedDict(), threading.Lock()) for _ in range(self.SHARDS)]
+
+    def acquire(self, key=None, cost=1, max_wait=0.0):
+        """
+        Takes `cost` tokens from `key`'s bucket and returns how long the caller
+        must wait before acting (0.0 when tokens were on hand). If that wait
+        would exceed `max_wait`, nothing is taken and RateLimited is raised.
+        """
+        if not self.rate:
+            return 0.0
+        tats, lock = self._shards[hash(key) % self.SHARDS]
+        now = time.monotonic()
+        with lock:
+            tat = max(tats.get(key, now), now) + self._interval * cost
+            wait = tat - now - self._tolerance
+            if wait > max_wait:
+                REJECTED.inc(self.scope)
+                raise RateLimited(wait, self.scope)
+            tats[key] = tat
+            tats.move_to_end(key)
+            if len(tats) > self._max_per_shard:
+                tats.popitem(last=False)
+        return max(0.0, wait)
+
+    def wait(self, key=None, cost=1, max_wait=30.0):
+        """Blocking form for pacing outbound work: sleeps until the tokens are due."""
+        delay = self.acquire(key, cost, max_wait)
+        if delay:
+            time.sleep(delay)
+
+    def __len__(self):
+        return sum(len(tats) for tats, _ in self._shards)
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter whose buckets live in a SharedState database, so every
+    pre-fork worker draws from the same tokens. Same GCRA, keyed on
+    (scope, key) with wall-clock time; there is no LRU cap, since a bucket
+    whose time has passed is full anyway and the state janitor deletes it.
+    """
+
+    def __init__(self, state, rate, burst=None, scope='global'):
+        super().__init__(rate, burst, max_keys=self.SHARDS, scope=scope)
+        self.state = state
+
+    def acquire(self, key=None, cost=1, max_wait=0.0):
+        if not self.rate:
+            return 0.0
+        key = '' if key is None else str(key)
+        now = time.time()
+        with self.state.transaction() as db:
+            row = db.execute("SELECT tat FROM rate_limits WHERE scope = ? AND key = ?", (self.scope, key)).fetchone()
+            tat = max(row[0] if row else now, now) + self._interval * cost
+            wait = tat - now - self._tolerance
+            if wait > max_wait:
+                REJECTED.inc(self.scope)
+                raise RateLimited(wait, self.scope)
+            db.execute("INSERT INTO rate_limits (scope, key, tat) VALUES (?, ?, ?) "
+                       "ON CONFLICT (scope, key) DO UPDATE SET tat = excluded.tat", (self.scope, key, tat))
+        return max(0.0, wait)
+
+    def __len__(self):
+        return self.state.query("SELECT COUNT(*) FROM rate_limits WHERE scope = ?", (self.scope,))[0][0]
@@ -0,0 +1,523 @@
+import hashlib
+import json
+import logging
+import math
+import secrets
+import time
+import urllib.parse
+
+from .batch import parse_batch
+from .body import READ_SIZE, BodyReader, RequestBodyError, StreamedList, load_streamed, read_json, spool
+from .campaigns import parse_send_at
+from .idempotency import MAX_KEY_LENGTH, REPLAYS, IdempotencyError, ResponseRecorder
+from .metrics import REGISTRY
+from .rate_limit import RateLimited
+from .supabase_client import SupabaseError
+from .suppression import Suppressed
+from .templates import resolve_template
+
+log = logging.getLogger(__name__)
+access_log = logging.getLogger(f"{__name__}.access")
+
+# Known POST routes: handler name, metric label and rate-limit bucket; anything else is "other"
+POST_ROUTES = {
+    '/send-email': 'handle_send_email',
+    '/send-email/batch': 'handle_send_email_batch',
+    '/generate-link': 'handle_generate_link',
+    '/otp': 'handle_otp',
+    '/delete-users': 'handle_delete_users',
+    '/campaigns': 'handle_campaigns',
+}
+# Routes whose bodies carry recipient or user id lists, read under MAX_BULK_BODY_BYTES
+BULK_ROUTES = {'/send-email/batch', '/delete-users'}
+
+REQUEST_SECONDS = REGISTRY.histogram('email_proxy_request_seconds', "Time to handle one HTTP request", ('route', 'method'))
+REQUESTS = REGISTRY.counter('email_proxy_requests_total', "HTTP requests by response status", ('route', 'method', 'status'))
+
+
+class ProxyRoutes:
+    """
+    Route handlers shared by both server modes. They only use the request
+    handler basics (headers, rfile, wfile, send_response/send_header/end_headers),
+    which BaseHTTPRequestHandler or mail_proxy.aio_server.AsyncRequest provide,
+    and reach clients and settings through `self.app` (an EmailProxy; see bind_routes).
+    """
+
+    app = None
+    spooled_body = None
+    body_digest = None
+    idempotent = None  # (scope, entry) while this request owns an Idempotency-Key
+    streaming = False  # the 200 and part of an NDJSON body are out; errors can only end the stream
+
+    def end_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Idempotency-Key')
+        super().end_headers()
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        access_log.info("%s - " + format, self.client_address[0], *args)
+
+    def observe(self, route, started):
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route, self.command)
+        REQUESTS.inc(route, self.command, str(getattr(self, 'status_code', 0)))
+
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        started = time.perf_counter()
+        # Only job/campaign status and metrics are readable; never fall through to static file serving
+        if self.path.startswith('/jobs/'):
+            route = '/jobs/:id'
+            job = self.app.job_queue.get(self.path[len('/jobs/'):])
+            if job is None:
+                self.send_json({'status': 'error', 'message': 'Job not found'}, status=404)
+            else:
+                self.send_json(job)
+        elif self.path.startswith('/campaigns/'):
+            route = '/campaigns/:id'
+            campaign = self.app.campaigns.get(self.path[len('/campaigns/'):])
+            if campaign is None:
+                self.send_json({'status': 'error', 'message': 'Campaign not found'}, status=404)
+            else:
+                self.send_json(campaign)
+        elif self.path == '/metrics':
+            route = '/metrics'
+            body = REGISTRY.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            route = 'other'
+            self.send_error(404)
+        self.observe(route, started)
+
+    def client_ip(self):
+        forwarded = self.headers.get('X-Forwarded-For') if self.app.config.rate_limit_trust_proxy else None
+        return forwarded.split(',')[0].strip() if forwarded else self.client_address[0]
+
+    def do_POST(self):
+        started = time.perf_counter()
+        handler = POST_ROUTES.get(self.path)
+        key = self.headers.get('Idempotency-Key') if handler else None
+        log.debug("POST: %s", self.path)
+        try:
+            if not handler:
+                self.send_error(404)
+            else:
+                # Cheap checks before the body is even read, so floods are turned away fast;
+                # duplicates count against the IP limit too, as they still hold a connection
+                self.app.ip_limiter.acquire(self.client_ip())
+                if key is None or not self.replayed(key):
+                    self.app.route_limiters[self.path].acquire()
+                    getattr(self, handler)()
+        except RateLimited as e:
+            self.send_rate_limited(e)
+        except (RequestBodyError, IdempotencyError) as e:
+            self.send_error_response(str(e), status=e.status)
+        except Exception as e:
+            log.exception("Unhandled error on POST %s", self.path)
+            self.send_error_response(f"Server Error: {str(e)}")
+        finally:
+            if self.idempotent is not None:
+                self.finish_idempotent()
+            if self.spooled_body is not None:
+                self.spooled_body.close()
+        self.observe(self.path if handler else 'other', started)
+
+    # --- IDEMPOTENCY ---
+    def replayed(self, key):
+        """
+        Handles an Idempotency-Key. Returns True if the response was answered
+        from the cache (or by waiting for an identical request in flight), so
+        no work is repeated; False if this request now owns the key and should
+        run, with its response recorded for later duplicates.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters", 400)
+        cache = self.app.idempotency
+        scope = (self.path, key)
+        entry, owner = cache.claim(scope)
+        if owner:
+            self.idempotent = (scope, entry)
+            self.body_digest = hashlib.sha256()
+            self.wfile = ResponseRecorder(self.wfile, cache.max_response_bytes)
+            return False
+
+        c = self.app.config
+        digest = hashlib.sha256()
+        limit = c.max_bulk_body_bytes if self.path in BULK_ROUTES else c.max_body_bytes
+        reader = BodyReader(self.rfile, self.headers, limit, digest)
+        while reader.read(READ_SIZE):
+            pass
+        if not cache.wait(entry, c.idempotency_wait_seconds):
+            raise IdempotencyError("A request with this Idempotency-Key is still in progress; retry later")
+        if entry.fingerprint is not None and entry.fingerprint != digest.hexdigest():
+            raise IdempotencyError("Idempotency-Key was already used with a different request body", 422)
+        if entry.response is None:
+            raise IdempotencyError("A request with this Idempotency-Key already completed; "
+                                   "its response was too large to keep")
+
+        status_line, _, rest = entry.response.partition(b"\r\n")
+        self.wfile.write(status_line + b"\r\nIdempotent-Replayed: true\r\n" + rest)
+        self.status_code = entry.status
+        self.log_request(entry.status)
+        REPLAYS.inc(self.path)
+        return True
+
+    def finish_idempotent(self):
+        scope, entry = self.idempotent
+        recorder = self.wfile
+        self.wfile = recorder.wfile
+        status = getattr(self, 'status_code', 500)
+        # Only a request that did its work is matched by body; replaying a rejection is harmless
+        fingerprint = self.body_digest.hexdigest() if status < 400 else None
+        self.app.idempotency.finish(scope, entry, fingerprint, status, recorder.recorded())
+
+    # --- REQUEST BODIES ---
+    def read_body(self, lists=()):
+        """
+        The JSON object sent with the request (Content-Length or chunked),
+        capped at MAX_BODY_BYTES. When `lists` names members that can be huge
+        (batch recipients, userIds), the cap is MAX_BULK_BODY_BYTES, the body
+        is spooled rather than decoded in one go, and those members come back
+        as StreamedLists that decode one element at a time.
+        """
+        c = self.app.config
+        if lists:
+            reader = BodyReader(self.rfile, self.headers, c.max_bulk_body_bytes, self.body_digest)
+            self.spooled_body = spool(reader, c.body_spool_bytes)
+            return load_streamed(self.spooled_body, lists)
+        data = read_json(BodyReader(self.rfile, self.headers, c.max_body_bytes, self.body_digest))
+        if not isinstance(data, dict):
+            raise RequestBodyError("Request body must be a JSON object")
+        return data
+
+    def wants_ndjson(self, data):
+        return data.get('stream') or 'application/x-ndjson' in (self.headers.get('Accept') or '')
+
+    def handle_send_email(self):
+        data = self.read_body()
+
+        try:
+            recipient_email = data.get('recipientEmail')
+            subject = data.get('subject', "Notification")
+            html_content_payload = data.get('htmlContent')
+            template_type = data.get('templateType', "CUSTOM")
+
+            if not recipient_email:
+                 raise ValueError("Recipient Email and HTML Content are required.")
+            # Without htmlContent, templateType must name a server template (WELCOME, OTP)
+            resolve_template(template_type, subject, html_content_payload)
+            self.app.check_suppressed(recipient_email)
+            self.app.check_recipient(recipient_email)
+            
+            job_id = self.app.job_queue.enqueue('send_email', {
+                'recipientEmail': recipient_email,
+                'subject': subject,
+                'htmlContent': html_content_payload,
+                'templateType': template_type,
+                'variables': data.get('variables')
+            })
+            self.send_json({'status': 'queued', 'message': f'Email to {recipient_email} queued', 'jobId': job_id}, status=202)
+
+        except RateLimited as e:
+            self.send_rate_limited(e)
+        except Suppressed as e:
+            self.send_error_response(str(e), status=422)
+        except Exception as e:
+            self.send_error_response(str(e))
+
+    def handle_send_email_batch(self):
+        data = self.read_body(lists=('items', 'recipients'))
+
+        try:
+            total, entries = parse_batch(data, self.app.config.batch_max_items)
+        except Exception as e:
+            self.send_error_response(str(e))
+            return
+
+        results = self.app.send_batch(entries)
+
+        if self.wants_ndjson(data):
+            self.send_ndjson(results, total, ('sent', 'failed', 'skipped'))
+            return
+
+        ordered = sorted(results, key=lambda r: r['index'])
+        sent = sum(1 for r in ordered if r['status'] == 'sent')
+        skipped = sum(1 for r in ordered if r['status'] == 'skipped')
+        self.send_json({
+            'status': 'success',
+            'total': total,
+            'sent': sent,
+            'failed': len(ordered) - sent - skipped,
+            'skipped': skipped,
+            'results': ordered
+        })
+
+    def handle_generate_link(self):
+        data = self.read_body()
+
+        try:
+            email = data.get('email')
+            password = data.get('password')
+            data_meta = data.get('data', {})
+            # Secure: default to app URL if not provided, or validate it
+            redirect_to = data.get('redirectTo', 'http://localhost:5173') 
+
+            if not email:
+                raise ValueError("Email is required")
+
+            if not self.app.config.supabase_service_role_key or "PLACEHOLDER" in self.app.config.supabase_service_role_key:
+                log.error("❌ ERROR: Supabase Credentials not loaded check .env.local!")
+                raise ValueError("Server Configuration Error: Missing Supabase Credentials")
+
+            body = {
+                "type": "signup",
+                "email": email,
+                "password": password,
+                "data": data_meta,
+                "options": { "redirectTo": redirect_to }
+            }
+
+            try:
+                resp_json = self.app.supabase.auth_admin('POST', 'generate_link', body)
+                # Signup (re)creates the auth user, so any cached id for this email is stale
+                self.app.user_directory.invalidate(email=email)
+                if resp_json.get('id'):
+                    self.app.user_directory.remember(email, resp_json['id'])
+            except SupabaseError as e:
+                log.error("❌ Supabase API Error: %s %s", e.status, e.body)
+                raise e
+
+            # Extract the correct property based on Supabase version
+            action_link = resp_json.get('properties', {}).get('action_link') or resp_json.get('action_link') or resp_json.get('url')
+            
+            self.send_json({'success': True, 'link': action_link})
+
+        except Exception as e:
+            log.warning("Error generating link: %s", e)
+            self.send_error_response(str(e))
+
+    def handle_otp(self):
+        data = self.read_body()
+
+        try:
+            action = data.get('action')
+            email = data.get('email')
+            code_input = data.get('code')
+
+            if not email:
+                raise ValueError("Email is required")
+            
+            # --- ACTIONS ---
+
+            if action == 'send':
+                self.app.check_recipient(email)
+                otp = str(100000 + secrets.randbelow(900000))
+
+                # Replaces any older code for this email
+                self.app.otp_store.issue(email, otp)
+                
+                job_id = self.app.job_queue.enqueue('send_email', {
+                    'recipientEmail': email,
+                    'templateType': "OTP",
+                    'variables': {'code': otp, 'expires_minutes': int(self.app.config.otp_ttl // 60)}
+                })
+                self.send_json({'success': True, 'message': 'OTP Sent', 'jobId': job_id}, status=202)
+
+            elif action == 'verify':
+                if not code_input:
+                    raise ValueError("Code is required")
+                
+                # 1. Verify Code
+                if not self.app.otp_store.check(email, code_input):
+                    raise ValueError("Invalid or expired code")
+                
+                # 2. Fetch User ID from Auth API (Auto-Heal Logic)
+                user = self.app.user_directory.find_by_email(email)
+                if not user:
+                    raise ValueError("User account not found in Auth system")
+                
+                user_id = user['id']
+                meta = user.get('user_metadata') or {}
+                
+                # 3. Check/Create Profile
+                profiles = self.app.supabase.rest('GET', 'profiles', params={'id': f'eq.{user_id}'})
+                
+                if not profiles:
+                    log.info("Auto-healing profile for %s", user_id)
+                    username = meta.get('username') or email.split('@')[0]
+                    display_name = meta.get('display_name') or meta.get('full_name') or username
+                    
+                    try:
+                        self.app.supabase.rest('POST', 'profiles', body={
+                            'id': user_id,
+                            'username': username,
+                            'display_name': display_name,
+                            'email': email
+                        })
+                    except Exception as e:
+                        log.warning("Profile creation warning: %s", e)
+
+                # 4. Handle Referral
+                if meta.get('referral_code'):
+                    try:
+                        ref_code = meta['referral_code']
+                        log.info("Registering referral %s", ref_code)
+                        self.app.supabase.rpc('register_referral', {
+                            'referral_code_input': ref_code,
+                            'new_user_id': user_id
+                        })
+                    except Exception as e:
+                        log.warning("Referral error: %s", e)
+
+                # 5. Confirm Email
+                update_body = { "email_confirm": True }
+                self.app.supabase.auth_admin('PUT', f"users/{urllib.parse.quote(str(user_id), safe='')}", update_body)
+                log.info("User email confirmed via Admin API")
+
+                # 6. Cleanup
+                self.app.otp_store.discard(email)
+
+                self.send_json({'success': True, 'message': 'Verified & Profile Synced'})
+
+        except RateLimited as e:
+            self.send_rate_limited(e)
+        except Exception as e:
+            log.exception("OTP request failed")
+            self.send_error_response(str(e))
+
+    def handle_delete_users(self):
+        data = self.read_body(lists=('userIds',))
+
+        try:
+            user_ids = data.get('userIds')
+
+            if not user_ids or not isinstance(user_ids, (list, StreamedList)):
+                raise ValueError("userIds list is required")
+
+            # Streamed progress: one line per id as it is deleted, however long the list
+            if self.wants_ndjson(data):
+                self.send_ndjson(self.app.iter_delete_users(user_ids), len(user_ids), ('deleted', 'not_found', 'failed'))
+                return
+
+            # Very large purges run in the background; poll /jobs/<id> for per-id results
+            if data.get('async') or len(user_ids) > self.app.config.delete_async_threshold:
+                job_id = self.app.job_queue.enqueue('delete_users', {'userIds': list(user_ids)})
+                self.send_json({'success': True, 'status': 'queued', 'total': len(user_ids), 'jobId': job_id}, status=202)
+                return
+
+            outcome = self.app.run_delete_users(user_ids)
+            deleted_count = outcome['deleted']
+            errors = outcome['errors']
+
+            if deleted_count == 0 and errors:
+                 self.send_error_response(f"Failed to delete users: {', '.join(errors)}")
+            else:
+                 self.send_json({'success': True, 'deleted': deleted_count, 'errors': errors, 'results': outcome['results']})
+
+        except Exception as e:
+            self.send_error_response(str(e))
+
+    def handle_campaigns(self):
+        data = self.read_body()
+
+        try:
+            action = data.get('action', 'create')
+
+            if action == 'cancel':
+                campaign_id = data.get('campaignId')
+                if not campaign_id:
+                    raise ValueError("campaignId is required")
+                if not self.app.campaigns.cancel(campaign_id):
+                    self.send_json({'status': 'error', 'message': 'Campaign not found or already finished'}, status=404)
+                    return
+                self.send_json({'success': True, 'campaignId': campaign_id, 'status': 'cancelled'})
+                return
+
+            audience = data.get('audience')
+            if not isinstance(audience, dict):
+                raise ValueError("audience is required, e.g. {\"role\": \"user\"} or {\"emails\": [...]}")
+            if 'emails' in audience and not isinstance(audience['emails'], list):
+                raise ValueError("audience.emails must be a list")
+            template = {
+                'subject': data.get('subject', "Notification"),
+                'htmlContent': data.get('htmlContent'),
+                'templateType': data.get('templateType', "CUSTOM"),
+            }
+            # Fail now, not at send time, if the template cannot be built
+            resolve_template(template['templateType'], template['subject'], template['htmlContent'])
+            send_at = parse_send_at(data.get('sendAt'))
+
+            campaign_id = self.app.campaigns.schedule(audience, template, send_at=send_at, name=data.get('name'))
+            self.send_json({'success': True, 'status': 'scheduled', 'campaignId': campaign_id}, status=202)
+
+        except Exception as e:
+            self.send_error_response(str(e))
+
+    def send_error_response(self, message, status=500):
+        log.warning("❌ Error: %s", message)
+        if self.streaming:
+            return  # a second status line would corrupt the stream; send_ndjson ends it with an error line
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'status': 'error', 'message': message}).encode('utf-8'))
+
+    def send_rate_limited(self, error):
+        self.send_response(429)
+        self.send_header('Retry-After', str(max(1, math.ceil(error.retry_after))))
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'status': 'error', 'message': str(error)}).encode('utf-8'))
+
+    def send_json(self, data, status=200):
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+    def send_ndjson(self, results, total, statuses):
+        """
+        Streams one JSON line per result as it arrives, then a summary line
+        counting results per status. Nothing is buffered, so memory stays flat
+        whatever the batch size. If `results` raises part way, the stream ends
+        with a {"status": "error"} line in place of the summary.
+        """
+        self.send_response(200)
+        self.send_header('Content-type', 'application/x-ndjson')
+        self.end_headers()
+        self.streaming = True
+        counts = dict.fromkeys(statuses, 0)
+        results = iter(results)
+        while True:
+            # Only errors from producing results end the stream here; a failed write means the client is gone
+            try:
+                result = next(results, None)
+            except Exception as e:
+                log.exception("Stream on POST %s failed after %d result(s)", self.path, sum(counts.values()))
+                # Counted as a 500 (and not kept for Idempotency-Key replays), though the client saw a 200
+                self.status_code = 500
+                error = {'status': 'error', 'message': f"Server Error: {e}", 'done': True, **counts}
+                self.wfile.write((json.dumps(error) + "\n").encode('utf-8'))
+                return
+            if result is None:
+                break
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            self.wfile.write((json.dumps(result) + "\n").encode('utf-8'))
+            self.wfile.flush()
+        summary = {'done': True, 'total': total, **counts}
+        self.wfile.write((json.dumps(summary) + "\n").encode('utf-8'))
+
+
+def bind_routes(app):
+    """ProxyRoutes subclass bound to one EmailProxy, ready to mix into either server's request class."""
+    return type('EmailRoutes', (ProxyRoutes,), {'app': app})
@@ -0,0 +1,127 @@
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    tat REAL NOT NULL,              -- GCRA: epoch time at which this bucket is full again
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rate_limits_tat ON rate_limits (tat);
+CREATE TABLE IF NOT EXISTS idempotency (
+    scope TEXT PRIMARY KEY,         -- "<route> <Idempotency-Key>"
+    owner INTEGER NOT NULL,         -- pid of the worker that claimed the key
+    token TEXT NOT NULL,            -- changes whenever the key is claimed again
+    fingerprint TEXT,
+    status INTEGER,                 -- NULL while the request is in flight
+    response BLOB,
+    expires REAL NOT NULL,
+    used_at REAL NOT NULL,
+    -- The retryable (5xx, 429) response this claim took over from, kept for duplicates still waiting on it
+    prev_token TEXT,
+    prev_fingerprint TEXT,
+    prev_status INTEGER,
+    prev_response BLOB
+);
+CREATE INDEX IF NOT EXISTS idempotency_used ON idempotency (used_at);
+"""
+
+
+def process_alive(pid):
+    """True if `pid` is a running process (on this host)."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SharedState:
+    """
+    Small SQLite database for state the pre-fork workers must agree on: rate
+    limit buckets and Idempotency-Key entries. Each process opens its own
+    connection (build it after fork); writes are short BEGIN IMMEDIATE
+    transactions, so one read-modify-write is atomic across all workers.
+
+    Nothing here needs to survive a crash, so commits are not fsynced, and a
+    janitor thread drops full buckets and expired keys every `prune_interval`.
+    """
+
+    def __init__(self, path, prune_interval=60.0):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # State files from before the prev_* columns
+        columns = {r['name'] for r in self._db.execute("PRAGMA table_info(idempotency)")}
+        for column, kind in (('prev_token', 'TEXT'), ('prev_fingerprint', 'TEXT'), ('prev_status', 'INTEGER'),
+                             ('prev_response', 'BLOB')):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE idempotency ADD COLUMN {column} {kind}")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Write transaction: yields the connection, commits on success, rolls back if the block raises."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    # --- JANITOR ---
+    def prune(self, max_idempotency_keys=None):
+        now = time.time()
+        with self.transaction() as db:
+            # A bucket whose tat has passed is full, exactly as if it had never been used
+            buckets = db.execute("DELETE FROM rate_limits WHERE tat < ?", (now,)).rowcount
+            keys = db.execute("DELETE FROM idempotency WHERE expires < ?", (now,)).rowcount
+            if max_idempotency_keys is not None:
+                # Least recently used finished entries first; in-flight ones stay
+                keys += db.execute(
+                    "DELETE FROM idempotency WHERE scope IN (SELECT scope FROM idempotency WHERE status IS NOT NULL "
+                    "ORDER BY used_at LIMIT max(0, (SELECT COUNT(*) FROM idempotency) - ?))",
+                    (max_idempotency_keys,)).rowcount
+        return buckets, keys
+
+    def _janitor(self, max_idempotency_keys):
+        while not self._stopping.wait(self.prune_interval):
+            try:
+                buckets, keys = self.prune(max_idempotency_keys)
+                log.debug("Shared state: pruned %d rate limit bucket(s), %d idempotency key(s)", buckets, keys)
+            except Exception:
+                log.exception("Could not prune shared state")
+
+    def start(self, max_idempotency_keys=None):
+        self._thread = threading.Thread(target=self._janitor, args=(max_idempotency_keys,),
+                                        name="shared-state-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=5)
@@ -0,0 +1,191 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from .metrics import RETRIES, STAGE_SECONDS
+from .tls import create_context
+
+# Errors that mean the session itself is unusable and must be discarded.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, OSError)
+
+
+def is_connection_error(error):
+    """SMTPException subclasses OSError, so a rejected command would otherwise look like a dead session."""
+    return isinstance(error, CONNECTION_ERRORS) and (
+        isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(error, smtplib.SMTPException))
+
+
+class SMTPPool:
+    """
+    Thread-safe pool of logged-in SMTP sessions.
+
+    At most `size` sessions exist at once; callers block until one is free.
+    Idle sessions older than `idle_timeout` are closed, and sessions idle for
+    more than `noop_after` seconds are health-checked with NOOP before reuse.
+    """
+
+    def __init__(self, host, port, username, password, size=4, idle_timeout=60.0,
+                 noop_after=10.0, max_messages=500, timeout=30.0, starttls=None, context=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self.use_ssl = port == 465
+        self.starttls = (not self.use_ssl) if starttls is None else starttls
+        self.context = context or create_context()
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []  # stack of (server, last_used, messages_sent)
+        self.stats = {'connects': 0, 'reuses': 0, 'noop_failures': 0, 'discarded': 0}
+
+    # --- CONNECTION LIFECYCLE ---
+    def _connect(self):
+        started = time.perf_counter()
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=self.context)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls(context=self.context)
+        STAGE_SECONDS.observe(time.perf_counter() - started, 'smtp_connect', self.host)
+        try:
+            if self.username:
+                started = time.perf_counter()
+                server.login(self.username, self.password)
+                STAGE_SECONDS.observe(time.perf_counter() - started, 'smtp_login', self.host)
+        except Exception:
+            self._close(server)
+            raise
+        with self._lock:
+            self.stats['connects'] += 1
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _healthy(self, server):
+        try:
+            code, _ = server.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def _checkout(self):
+        """Returns (server, messages_sent, reused), preferring a healthy idle session."""
+        now = time.monotonic()
+        expired = []
+        candidate = None
+        with self._lock:
+            # Drop everything that has been idle for too long
+            fresh = []
+            for entry in self._idle:
+                if now - entry[1] > self.idle_timeout:
+                    expired.append(entry[0])
+                else:
+                    fresh.append(entry)
+            self._idle = fresh
+            if self._idle:
+                candidate = self._idle.pop()
+
+        for server in expired:
+            self._close(server)
+
+        if candidate:
+            server, last_used, sent = candidate
+            if now - last_used <= self.noop_after or self._healthy(server):
+                with self._lock:
+                    self.stats['reuses'] += 1
+                return server, sent, True
+            with self._lock:
+                self.stats['noop_failures'] += 1
+            self._close(server)
+
+        return self._connect(), 0, False
+
+    def _checkin(self, server, sent, broken):
+        if broken or (self.max_messages and sent >= self.max_messages):
+            with self._lock:
+                self.stats['discarded'] += 1
+            self._close(server)
+            return
+        with self._lock:
+            self._idle.append((server, time.monotonic(), sent))
+
+    @contextmanager
+    def _session(self):
+        self._slots.acquire()
+        try:
+            server, sent, reused = self._checkout()
+            broken = False
+            try:
+                yield server, reused
+            except CONNECTION_ERRORS as e:
+                if is_connection_error(e):
+                    broken = True
+                    raise
+                # Protocol-level rejection: reset the transaction so the session stays usable
+                try:
+                    server.rset()
+                except Exception:
+                    broken = True
+                raise
+            finally:
+                self._checkin(server, sent + 1, broken)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self):
+        """
+        Yields a logged-in SMTP session. The session goes back to the pool
+        unless the block raised a connection-level error.
+        """
+        with self._session() as (server, _):
+            yield server
+
+    # --- SENDING ---
+    def _send(self, send):
+        """
+        Runs `send(server)` on a pooled session. A session that turns out to
+        be dead (server-side idle close) is replaced once with a fresh connection.
+        """
+        while True:
+            reused = False
+            try:
+                with self._session() as (server, reused):
+                    started = time.perf_counter()
+                    result = send(server)
+                    STAGE_SECONDS.observe(time.perf_counter() - started, 'smtp_send', self.host)
+                    return result
+            except CONNECTION_ERRORS as e:
+                if not reused or not is_connection_error(e):
+                    raise
+                RETRIES.inc('smtp_stale_session')
+
+    def send_message(self, msg, from_addr=None, to_addrs=None):
+        """Sends one EmailMessage over a pooled session."""
+        return self._send(lambda server: server.send_message(msg, from_addr, to_addrs))
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Sends an already serialized message (bytes, CRLF line endings) over a pooled session."""
+        return self._send(lambda server: server.sendmail(from_addr, to_addrs, msg))
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _, _ in idle:
+            self._close(server)
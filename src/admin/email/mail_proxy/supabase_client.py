@@ -0,0 +1,186 @@
+import http.client
+import json
+import re
+import threading
+import time
+import urllib.parse
+
+from .metrics import RETRIES, STAGE_SECONDS
+from .tls import create_context
+
+# Errors a server-side close of an idle keep-alive connection shows up as
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                           http.client.CannotSendRequest)
+
+# Path segments that are ids (uuids, numeric ids) collapse to :id in metric labels
+ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F-]{16,}|\d+)(?=/|$)")
+
+
+class SupabaseError(Exception):
+    """Non-2xx response from Supabase REST/Auth."""
+
+    def __init__(self, status, body, endpoint, retry_after=None):
+        self.status = status
+        self.body = body
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"Supabase {status} on {endpoint}: {body[:300]}")
+
+
+class HostPool:
+    """
+    Keep-alive connections to one scheme://host:port.
+    At most `max_connections` are open at once; extra callers wait for one.
+    """
+
+    def __init__(self, scheme, host, port, max_connections, timeout, context):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.context = context
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _new_connection(self):
+        if self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.context)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self):
+        """Returns (connection, reused)."""
+        self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def release(self, conn, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class SupabaseClient:
+    """
+    Shared client for Supabase REST (/rest/v1) and Auth admin (/auth/v1/admin)
+    calls over pooled keep-alive connections. Thread-safe.
+    """
+
+    def __init__(self, base_url, service_key, max_connections=10, timeout=15.0, context=None):
+        parts = urllib.parse.urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.service_key = service_key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.context = context or (create_context() if self.scheme == 'https' else None)
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'stale_retries': 0}
+
+    def _pool(self, scheme, host, port):
+        key = (scheme, host, port)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = HostPool(scheme, host, port, self.max_connections, self.timeout, self.context)
+                self._pools[key] = pool
+            return pool
+
+    @property
+    def connections_opened(self):
+        with self._lock:
+            return sum(p.opened for p in self._pools.values())
+
+    def _headers(self, extra):
+        headers = {
+            "apikey": self.service_key,
+            "Authorization": f"Bearer {self.service_key}",
+            "Content-Type": "application/json",
+        }
+        if extra:
+            headers.update(extra)
+        return headers
+
+    # --- CORE ---
+    def request(self, method, path, body=None, params=None, headers=None):
+        """
+        Sends one request and returns the decoded JSON body (None for empty/204).
+        Raises SupabaseError for non-2xx responses.
+        """
+        url = self.base_path + path
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        all_headers = self._headers(headers)
+        pool = self._pool(self.scheme, self.host, self.port)
+        stage = 'supabase_auth' if path.startswith('/auth/') else 'supabase_rest'
+        started = time.perf_counter()
+
+        while True:
+            conn, reused = pool.acquire()
+            reusable = False
+            try:
+                conn.request(method, url, body=payload, headers=all_headers)
+                response = conn.getresponse()
+                data = response.read()
+                reusable = not response.will_close
+            except STALE_CONNECTION_ERRORS:
+                pool.release(conn, False)
+                if reused:
+                    # Server dropped an idle keep-alive connection before reading; send again on a new one
+                    with self._lock:
+                        self.stats['stale_retries'] += 1
+                    RETRIES.inc('supabase_stale_connection')
+                    continue
+                raise
+            except BaseException:
+                pool.release(conn, False)
+                raise
+            pool.release(conn, reusable)
+            break
+
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage, f"{method} {ID_SEGMENT.sub('/:id', path)}")
+        with self._lock:
+            self.stats['requests'] += 1
+        if response.status >= 400:
+            retry_after = response.getheader('Retry-After')
+            raise SupabaseError(response.status, data.decode('utf-8', 'replace'), f"{method} {path}",
+                                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status == 204 or not data:
+            return None
+        return json.loads(data.decode('utf-8'))
+
+    # --- HELPERS ---
+    def rest(self, method, endpoint, body=None, params=None, prefer="return=representation"):
+        return self.request(method, f"/rest/v1/{endpoint}", body, params, {"Prefer": prefer})
+
+    def rpc(self, function_name, body=None):
+        return self.rest('POST', f"rpc/{function_name}", body or {})
+
+    def auth_admin(self, method, endpoint, body=None, params=None):
+        return self.request(method, f"/auth/v1/admin/{endpoint}", body, params)
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
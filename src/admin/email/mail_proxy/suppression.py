@@ -0,0 +1,329 @@
+import datetime
+import hashlib
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from .metrics import REGISTRY
+from .supabase_client import SupabaseError
+
+log = logging.getLogger(__name__)
+
+SUPPRESSED = REGISTRY.counter(
+    'email_proxy_suppressed_total', "Sends skipped before SMTP, by reason", ('reason',))
+
+# email_logs.error_message texts that mean the address itself is bad (5xx / "user unknown"), not a transient failure
+HARD_BOUNCE = re.compile(
+    r"\(5\d\d,|\b5\.[1-7]\.\d+\b|recipients? refused|user unknown|no such user|"
+    r"mailbox (?:unavailable|not found|does not exist)|address rejected|does not exist",
+    re.IGNORECASE)
+
+
+class Suppressed(ValueError):
+    """The recipient is on the suppression list (or repeated within a batch); nothing was sent."""
+
+
+def _timestamp(value):
+    # PostgREST drops trailing zeros from fractional seconds, so compare parsed values, not strings
+    return datetime.datetime.fromisoformat(value)
+
+
+def _quoted(value):
+    """A value for a PostgREST in.(...) list; addresses may contain commas or parentheses."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def fingerprint(email):
+    """64-bit hash of the normalised address; the index stores these, never the addresses."""
+    digest = hashlib.blake2b(email.strip().lower().encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class SuppressionIndex:
+    """
+    Membership test for up to millions of addresses in a few MB.
+
+    A Bloom filter (about 1.2 bytes per address at 1% false positives)
+    answers the common "not suppressed" case; a maybe is confirmed against a
+    sorted array of 64-bit fingerprints (8 bytes per address). Recent adds
+    and removals sit in small sets until compact() merges them in, so
+    refreshes never rebuild the whole index. Removals only touch the exact
+    part: a stale Bloom bit just costs one extra lookup.
+    """
+
+    def __init__(self, capacity=1000000, fp_rate=0.01):
+        self.fp_rate = fp_rate
+        self._lock = threading.Lock()
+        self._sorted = array('Q')
+        self._added = set()
+        self._removed = set()
+        self._bloom = self._new_bloom(capacity)
+
+    def _new_bloom(self, capacity):
+        """(bit count, hash count, bits) sized for `capacity` entries; swapped in as one tuple so readers need no lock."""
+        capacity = max(1024, capacity)
+        bits = max(8192, int(-capacity * math.log(self.fp_rate) / (math.log(2) ** 2)))
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        return bits, hashes, bytearray((bits + 7) // 8), capacity
+
+    @staticmethod
+    def _positions(fp, bits, hashes):
+        # Double hashing on the two 32-bit halves of the fingerprint
+        a, b = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        return [(a + i * b) % bits for i in range(hashes)]
+
+    @classmethod
+    def _set_bits(cls, bloom, fp):
+        bits, hashes, table, _ = bloom
+        for pos in cls._positions(fp, bits, hashes):
+            table[pos >> 3] |= 1 << (pos & 7)
+
+    def _exact(self, fp):
+        i = bisect_left(self._sorted, fp)
+        return i < len(self._sorted) and self._sorted[i] == fp
+
+    def __contains__(self, email):
+        fp = fingerprint(email)
+        bits, hashes, table, _ = self._bloom
+        for pos in self._positions(fp, bits, hashes):
+            if not table[pos >> 3] & (1 << (pos & 7)):
+                return False
+        with self._lock:
+            if fp in self._removed:
+                return False
+            return fp in self._added or self._exact(fp)
+
+    def add(self, email):
+        fp = fingerprint(email)
+        with self._lock:
+            self._removed.discard(fp)
+            if not self._exact(fp):
+                self._added.add(fp)
+            self._set_bits(self._bloom, fp)
+
+    def discard(self, email):
+        fp = fingerprint(email)
+        with self._lock:
+            self._added.discard(fp)
+            if self._exact(fp):
+                self._removed.add(fp)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sorted) + len(self._added) - len(self._removed)
+
+    def pending(self):
+        """Adds and removals not yet merged by compact()."""
+        return len(self._added) + len(self._removed)
+
+    def compact(self):
+        """
+        Merges pending adds/removals into the sorted array (one linear merge,
+        done outside the lock) and grows the Bloom filter once it is over capacity.
+        """
+        with self._lock:
+            if not self._added and not self._removed:
+                return
+            current, added, removed = self._sorted, sorted(self._added), set(self._removed)
+        merged = array('Q', (fp for fp in heapq.merge(current, added) if fp not in removed))
+        bloom = self._bloom
+        if len(merged) > bloom[3]:
+            bloom = self._new_bloom(len(merged) * 2)
+            for fp in merged:
+                self._set_bits(bloom, fp)
+        with self._lock:
+            self._sorted = merged
+            self._added.difference_update(added)
+            self._removed.difference_update(removed)
+            if bloom is not self._bloom:
+                # Anything added while rebuilding is not in the new filter yet
+                for fp in self._added:
+                    self._set_bits(bloom, fp)
+                self._bloom = bloom
+
+    def memory_bytes(self):
+        return len(self._bloom[2]) + self._sorted.itemsize * len(self._sorted)
+
+
+class SuppressionList:
+    """
+    Keeps a SuppressionIndex in step with Supabase: hard-bounce failures in
+    email_logs and rows in email_unsubscribes (setup_suppressions.sql).
+    Each refresh only asks for rows newer than the last one seen, so after
+    the first load a refresh is one cheap request per table.
+
+    A successful send after a hard bounce takes the address back off the
+    list: refreshes read new failed and sent rows in order, and a full load
+    reads failed rows only, then looks up later sends for just the addresses
+    that bounced. A deleted email_unsubscribes row (a resubscribe) leaves no
+    newer row to read; those are picked up by a full rebuild every
+    `rebuild_interval`, which loads a fresh index in the background and
+    swaps it in.
+    """
+
+    def __init__(self, supabase, refresh_interval=60.0, page_size=1000, capacity=1000000,
+                 rebuild_interval=21600.0, lookup_size=100):
+        self.supabase = supabase
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.page_size = page_size
+        self.lookup_size = lookup_size
+        self.capacity = capacity
+        self.index = SuppressionIndex(capacity)
+        # table -> [created_at watermark, rows already read at exactly that timestamp]
+        self._watermarks = self._new_watermarks()
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._pending = None  # add() calls made while a rebuild runs, replayed into the new index
+        self._missing = set()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _new_watermarks():
+        return {'email_logs': [None, 0], 'email_unsubscribes': [None, 0]}
+
+    def __contains__(self, email):
+        return email in self.index
+
+    def add(self, email):
+        with self._lock:
+            self.index.add(email)
+            if self._pending is not None:
+                self._pending.append(email)
+
+    def _pull(self, index, mark, table, params, apply):
+        """Reads rows of `table` past `mark` in created_at order, handing each page to `apply(index, rows)`."""
+        while True:
+            page = dict(params, order='created_at.asc,id.asc', limit=str(self.page_size))
+            if mark[0]:
+                # Bulk inserts share one created_at, so resume inside the timestamp by offset
+                page['created_at'] = f"gte.{mark[0]}"
+                page['offset'] = str(mark[1])
+            rows = self.supabase.rest('GET', table, params=page)
+            apply(index, rows)
+            for row in rows:
+                if row['created_at'] == mark[0]:
+                    mark[1] += 1
+                else:
+                    mark[0], mark[1] = row['created_at'], 1
+            # Merging whenever pending passes a quarter of the index keeps a large first load linear and compact
+            if index.pending() > max(10000, len(index) // 4):
+                index.compact()
+            if len(rows) < self.page_size:
+                return
+
+    @staticmethod
+    def _log_rows(index, rows):
+        for row in rows:
+            if row['status'] == 'sent':
+                index.discard(row['recipient_email'])
+            elif HARD_BOUNCE.search(row.get('error_message') or ''):
+                index.add(row['recipient_email'])
+
+    def _bounce_rows(self, index, rows):
+        """Adds the hard bounces in a page of failed rows, then drops the addresses mailed successfully since."""
+        bounced = {}
+        for row in rows:
+            if HARD_BOUNCE.search(row.get('error_message') or ''):
+                index.add(row['recipient_email'])
+                bounced[row['recipient_email']] = _timestamp(row['created_at'])  # pages are in order: latest wins
+        addresses = list(bounced)
+        for i in range(0, len(addresses), self.lookup_size):
+            batch = addresses[i:i + self.lookup_size]
+            sent = self.supabase.rest('GET', 'email_logs', params={
+                'select': 'recipient_email,created_at', 'status': 'eq.sent',
+                'recipient_email': f"in.({','.join(_quoted(email) for email in batch)})",
+                'created_at': f"gt.{min(bounced[email] for email in batch).isoformat()}"})
+            for row in sent:
+                if _timestamp(row['created_at']) > bounced[row['recipient_email']]:
+                    index.discard(row['recipient_email'])
+
+    def _log_head(self):
+        """Watermark at the newest failed/sent email_logs row, for refreshes to carry on after a full load."""
+        params = {'select': 'created_at', 'status': 'in.(failed,sent)'}
+        newest = self.supabase.rest('GET', 'email_logs', params=dict(
+            params, order='created_at.desc,id.desc', limit='1'))
+        if not newest:
+            return [None, 0]
+        at = newest[0]['created_at']
+        return [at, len(self.supabase.rest('GET', 'email_logs', params=dict(params, created_at=f"eq.{at}")))]
+
+    def _update(self, index, marks):
+        if marks['email_logs'][0] is None:
+            # Full load: failed rows only, never the whole sent history
+            head = self._log_head()
+            self._pull(index, [None, 0], 'email_logs',
+                       {'select': 'id,recipient_email,error_message,created_at', 'status': 'eq.failed'},
+                       self._bounce_rows)
+            marks['email_logs'] = head
+        else:
+            self._pull(index, marks['email_logs'], 'email_logs',
+                       {'select': 'id,recipient_email,status,error_message,created_at',
+                        'status': 'in.(failed,sent)'}, self._log_rows)
+        if 'email_unsubscribes' not in self._missing:
+            try:
+                self._pull(index, marks['email_unsubscribes'], 'email_unsubscribes',
+                           {'select': 'id,email,created_at'},
+                           lambda index, rows: [index.add(row['email']) for row in rows])
+            except SupabaseError as e:
+                if e.status != 404:
+                    raise
+                log.warning("email_unsubscribes table not found; run setup_suppressions.sql to enable unsubscribes")
+                self._missing.add('email_unsubscribes')
+        index.compact()
+
+    def rebuild(self):
+        """Loads every row into a new index, then swaps it in; lookups keep using the old one meanwhile."""
+        index, marks = SuppressionIndex(self.capacity), self._new_watermarks()
+        with self._lock:
+            self._pending = []
+        try:
+            self._missing.clear()
+            self._update(index, marks)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for email in self._pending:
+                index.add(email)
+            self._pending = None
+            self.index, self._watermarks = index, marks
+        index.compact()
+        self._built_at = time.monotonic()
+
+    def refresh(self):
+        if self._built_at is None:
+            # The first load fills the live index, so lookups see addresses as soon as they are read
+            self._update(self.index, self._watermarks)
+            self._built_at = time.monotonic()
+        elif time.monotonic() - self._built_at >= self.rebuild_interval:
+            self.rebuild()
+        else:
+            self._update(self.index, self._watermarks)
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            started = time.perf_counter()
+            try:
+                self.refresh()
+                log.debug("Suppression index: %d address(es) in %.1fs", len(self.index),
+                          time.perf_counter() - started)
+            except Exception as e:
+                log.warning("Suppression refresh failed: %s", e)
+            self._stopping.wait(self.refresh_interval)
+
+    def start(self):
+        REGISTRY.gauge('email_proxy_suppressed_addresses', "Addresses in the suppression index",
+                       fn=lambda: len(self.index))
+        self._thread = threading.Thread(target=self._loop, name="suppression-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,258 @@
+import base64
+import hashlib
+import html
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from email.policy import SMTP
+from email.utils import parseaddr
+
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+DEFAULT_SENDER = "Truvgo Communities <varshith@truvgo.me>"
+TEXT_FALLBACK = "Please enable HTML to view this email."
+
+# Budget for compiled CUSTOM templates; a batch's HTML can be megabytes, so the cache is bounded by size, not count
+CUSTOM_CACHE_BYTES = 16 * 1024 * 1024
+
+
+class CompiledTemplate:
+    """
+    A {{placeholder}} template split once into literal chunks and field names,
+    so rendering is a single join. Values are HTML-escaped when `escape` is set;
+    fields without a value are left as written.
+    """
+
+    def __init__(self, source, escape=True):
+        self.source = source
+        self.escape = escape
+        self._literals = []
+        self._fields = []  # (name, raw placeholder text)
+        pos = 0
+        for m in PLACEHOLDER.finditer(source):
+            self._literals.append(source[pos:m.start()])
+            self._fields.append((m.group(1), m.group(0)))
+            pos = m.end()
+        self._literals.append(source[pos:])
+        self.fields = frozenset(name for name, _ in self._fields)
+
+    def render(self, variables=None):
+        if not self._fields:
+            return self.source
+        variables = variables or {}
+        out = [self._literals[0]]
+        for (name, raw), literal in zip(self._fields, self._literals[1:]):
+            if name in variables:
+                value = str(variables[name])
+                out.append(html.escape(value) if self.escape else value)
+            else:
+                out.append(raw)
+            out.append(literal)
+        return "".join(out)
+
+
+def _b64(text):
+    return base64.encodebytes(text.encode('utf-8')).replace(b"\n", b"\r\n")
+
+
+def _header(name, value):
+    # RFC 2047-encodes and folds as needed; CR/LF in values would start a new header
+    value = " ".join(str(value).splitlines())
+    if value.isascii() and len(name) + len(value) < 76:
+        # Nothing to encode or fold: skip the (slow) header parser
+        return f"{name}: {value}\r\n".encode('ascii')
+    return SMTP.header_factory(name, value).fold(policy=SMTP).encode('ascii')
+
+
+class MessageTemplate:
+    """
+    Subject, HTML and plain-text bodies for one kind of email. Everything that
+    does not depend on the recipient (From, the MIME envelope, part headers and
+    any body without placeholders) is encoded once here; build() only renders
+    the per-recipient fields and joins bytes.
+    """
+
+    def __init__(self, subject, html_body, text_body=TEXT_FALLBACK, sender=DEFAULT_SENDER):
+        self.subject = CompiledTemplate(subject, escape=False)
+        self.html = CompiledTemplate(html_body)
+        self.text = CompiledTemplate(text_body, escape=False)
+        self.envelope_from = parseaddr(sender)[1]
+
+        boundary = f"=_{uuid.uuid4().hex}"
+        self._from = _header('From', sender)
+        self._subject = None if self.subject.fields else _header('Subject', self.render_subject())
+        self._text_head = (
+            "MIME-Version: 1.0\r\n"
+            f"Content-Type: multipart/alternative; boundary=\"{boundary}\"\r\n\r\n"
+            f"--{boundary}\r\n"
+            "Content-Type: text/plain; charset=\"utf-8\"\r\n"
+            "Content-Transfer-Encoding: base64\r\n\r\n"
+        ).encode('ascii')
+        self._html_head = (
+            f"--{boundary}\r\n"
+            "Content-Type: text/html; charset=\"utf-8\"\r\n"
+            "Content-Transfer-Encoding: base64\r\n\r\n"
+        ).encode('ascii')
+        self._tail = f"--{boundary}--\r\n".encode('ascii')
+        self._text_part = None if self.text.fields else _b64(self.text.source)
+        self._html_part = None if self.html.fields else _b64(self.html.source)
+
+    def render_subject(self, variables=None):
+        return " ".join(self.subject.render(variables).splitlines())
+
+    def build(self, recipient, variables=None):
+        """Returns (subject, message bytes with CRLF line endings) for smtplib sendmail."""
+        subject = self.render_subject(variables)
+        return subject, b"".join((
+            self._subject or _header('Subject', subject),
+            self._from,
+            _header('To', recipient),
+            self._text_head,
+            self._text_part or _b64(self.text.render(variables)),
+            self._html_head,
+            self._html_part or _b64(self.html.render(variables)),
+            self._tail,
+        ))
+
+    def memory_bytes(self):
+        """Rough footprint: each source is held twice (as written and split into literals), plus pre-encoded parts."""
+        sources = sum(len(t.source) for t in (self.subject, self.html, self.text))
+        return 2 * sources + len(self._text_part or b'') + len(self._html_part or b'')
+
+
+class TemplateCache:
+    """
+    Compiled CUSTOM templates, least recently used dropped first once they
+    take more than `max_bytes`. Entries are keyed by a digest of subject and
+    HTML, so the cache does not hold a second copy of each body as its key;
+    a template larger than the whole budget is compiled but not kept.
+    """
+
+    def __init__(self, max_bytes=CUSTOM_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # digest -> (template, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(subject, html_content):
+        digest = hashlib.blake2b(f"{len(subject)}:{subject}".encode('utf-8', 'surrogatepass'), digest_size=16)
+        digest.update(html_content.encode('utf-8', 'surrogatepass'))
+        return digest.digest()
+
+    def get(self, subject, html_content):
+        key = self._key(subject, html_content)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                return hit[0]
+        template = MessageTemplate(subject, html_content)
+        size = template.memory_bytes()
+        if size > self.max_bytes:
+            return template
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (template, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+        return template
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_bytes(self):
+        return self._bytes
+
+
+# --- REGISTRY (keys match email_logs.template_type) ---
+WELCOME_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        .wrapper { background-color: #f6f9fc; padding: 40px 0; font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; }
+        .container { max-width: 600px; margin: 0 auto; background-color: #ffffff; border-radius: 8px; overflow: hidden; box-shadow: 0 4px 12px rgba(0,0,0,0.1); }
+        .header { background: linear-gradient(135deg, #6366f1 0%, #a855f7 100%); padding: 30px; text-align: center; color: #ffffff; }
+        .content { padding: 40px; line-height: 1.6; color: #334155; }
+        .button-wrapper { text-align: center; margin-top: 30px; }
+        .button { background-color: #6366f1; color: #ffffff !important; padding: 14px 28px; text-decoration: none; border-radius: 5px; font-weight: bold; display: inline-block; }
+        .footer { background-color: #f8fafc; padding: 20px; text-align: center; font-size: 12px; color: #94a3b8; }
+        h1 { margin: 0; font-size: 24px; }
+        .highlight { color: #6366f1; font-weight: bold; }
+    </style>
+</head>
+<body>
+    <div class="wrapper">
+        <div class="container">
+            <div class="header">
+                <h1>Truvgo Code Communities</h1>
+            </div>
+            <div class="content">
+                <p>Hello <span class="highlight">{{member_name}}</span>,</p>
+                <p>Welcome to the family! We're excited to have you join <strong>Truvgo</strong>. You are now part of a global community of developers dedicated to building the future of software.</p>
+                <p>Whether you're here to contribute to open-source projects, network with elite engineers, or sharpen your stack, you've come to the right place.</p>
+
+                <div class="button-wrapper">
+                    <a href="https://truvgo-vtx.web.app" class="button">Access Your Dashboard</a>
+                </div>
+
+                <p style="margin-top:40px;">See you in the code,<br><strong>The Truvgo Core Team</strong></p>
+            </div>
+            <div class="footer">
+                &copy; 2026 Truvgo Code Communities. All rights reserved.<br>
+                You are receiving this because you registered at truvgo.me
+            </div>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+OTP_HTML = """
+<div style="font-family: sans-serif; padding: 20px; max-width: 500px; margin: 0 auto; border: 1px solid #eee; border-radius: 10px;">
+    <h2 style="color: #333;">Verification Code</h2>
+    <p style="color: #555;">Use the code below to verify your account:</p>
+    <div style="background:#f4f4f5; padding: 15px; text-align:center; border-radius: 8px; margin: 20px 0;">
+        <span style="font-size: 32px; font-weight: bold; letter-spacing: 5px; color: #000;">{{code}}</span>
+    </div>
+    <p style="font-size: 12px; color: #888;">Expires in {{expires_minutes}} minutes.</p>
+</div>
+"""
+
+TEMPLATES = {
+    'WELCOME': MessageTemplate(
+        "Welcome to the Future of Coding, {{member_name}}! 🚀",
+        WELCOME_HTML,
+        "Hi {{member_name}}, Welcome to Truvgo Code Communities! Access your dashboard at truvgo.me",
+    ),
+    'OTP': MessageTemplate(
+        "Your Verification Code",
+        OTP_HTML,
+        "Your verification code is {{code}}. It expires in {{expires_minutes}} minutes.",
+    ),
+}
+
+
+CUSTOM_TEMPLATES = TemplateCache()
+
+
+def custom_template(subject, html_content):
+    """CUSTOM emails carry their own HTML; identical bodies (e.g. a whole batch) compile once."""
+    return CUSTOM_TEMPLATES.get(subject, html_content)
+
+
+def resolve_template(template_type, subject=None, html_content=None):
+    """
+    Caller-supplied HTML wins (logged under the caller's template_type);
+    without it, the registry template for template_type is used.
+    """
+    if html_content:
+        return custom_template(subject or "Notification", html_content)
+    template = TEMPLATES.get(template_type)
+    if template is None:
+        raise ValueError(f"HTML Content is required unless templateType is one of {', '.join(TEMPLATES)}.")
+    return template
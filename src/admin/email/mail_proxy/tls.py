@@ -0,0 +1,87 @@
+import ssl
+import threading
+import time
+
+from .metrics import REGISTRY, STAGE_SECONDS
+
+HANDSHAKES = REGISTRY.counter(
+    'email_proxy_tls_handshakes_total', "Client TLS handshakes by peer and outcome (full or resumed)",
+    ('host', 'kind'))
+
+
+class ResumingSSLSocket(ssl.SSLSocket):
+    """Hands its TLS session back to the context before closing, so the next connection can resume it."""
+
+    def close(self):
+        try:
+            self.context.remember(self)
+        except Exception:
+            pass
+        super().close()
+
+
+class ResumingContext(ssl.SSLContext):
+    """
+    Client SSLContext that keeps the most recent TLS session per host:port
+    and offers it on the next handshake there, turning a reconnect into an
+    abbreviated handshake (no certificate exchange or verification).
+
+    Sessions are picked up after the handshake and again when a connection
+    closes, because TLS 1.3 servers only send their session ticket after the
+    handshake. Python's ssl module has no client-side session cache of its
+    own; without this every reconnect is a full handshake.
+    """
+
+    sslsocket_class = ResumingSSLSocket
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    @staticmethod
+    def _key(sock, server_hostname):
+        try:
+            return server_hostname, sock.getpeername()[1]
+        except OSError:
+            return None
+
+    def remember(self, sslsock):
+        key = getattr(sslsock, '_session_key', None)
+        session = sslsock.session
+        if key is not None and session is not None:
+            with self._sessions_lock:
+                self._sessions[key] = session
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True, suppress_ragged_eofs=True,
+                    server_hostname=None, session=None):
+        key = None if server_side else self._key(sock, server_hostname)
+        if session is None and key is not None:
+            with self._sessions_lock:
+                session = self._sessions.get(key)
+        started = time.perf_counter()
+        sslsock = super().wrap_socket(sock, server_side, do_handshake_on_connect, suppress_ragged_eofs,
+                                      server_hostname, session)
+        sslsock._session_key = key
+        if key is not None and do_handshake_on_connect:
+            host = server_hostname or key[0]
+            STAGE_SECONDS.observe(time.perf_counter() - started, 'tls_handshake', host)
+            HANDSHAKES.inc(host, 'resumed' if sslsock.session_reused else 'full')
+            self.remember(sslsock)
+        return sslsock
+
+    def forget(self):
+        """Drops all cached sessions (e.g. after rotating certificates or trust settings)."""
+        with self._sessions_lock:
+            self._sessions.clear()
+
+
+def create_context():
+    """
+    Like ssl.create_default_context() for connecting to servers (system CA
+    bundle, hostname checks), but with session resumption. Build it once and
+    share it: loading the CA bundle is the expensive part.
+    """
+    context = ResumingContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    return context
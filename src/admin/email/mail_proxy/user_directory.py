@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+from .supabase_client import SupabaseError
+
+log = logging.getLogger(__name__)
+
+
+class UserDirectory:
+    """
+    Finds auth users by email without listing /auth/v1/admin/users.
+
+    Lookups go through the get_auth_user_by_email RPC (Database/get_auth_user_by_email.sql).
+    If that function is not deployed, it falls back to walking every page of the
+    admin users list. email -> user_id is kept in a small TTL/LRU cache; cached hits
+    re-read the user by id so metadata is never stale. ttl=0 turns the cache off.
+    """
+
+    def __init__(self, supabase, ttl=300.0, max_entries=10000, page_size=1000, rpc_recheck=600.0):
+        self.supabase = supabase
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.page_size = page_size
+        self.rpc_recheck = rpc_recheck
+        self._cache = OrderedDict()  # email -> (user_id, expires_at)
+        self._by_id = {}             # user_id -> email
+        self._lock = threading.Lock()
+        self._rpc_missing_until = 0.0
+
+    # --- CACHE ---
+    def remember(self, email, user_id):
+        if self.ttl <= 0:
+            return
+        key = email.strip().lower()
+        with self._lock:
+            self._cache[key] = (user_id, time.monotonic() + self.ttl)
+            self._cache.move_to_end(key)
+            self._by_id[user_id] = key
+            while len(self._cache) > self.max_entries:
+                _, (old_id, _) = self._cache.popitem(last=False)
+                self._by_id.pop(old_id, None)
+
+    def invalidate(self, email=None, user_id=None):
+        with self._lock:
+            if user_id is not None and email is None:
+                email = self._by_id.get(user_id)
+            if email is None:
+                return
+            entry = self._cache.pop(email.strip().lower(), None)
+            if entry:
+                self._by_id.pop(entry[0], None)
+
+    def _cached_id(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._cache[key]
+                self._by_id.pop(entry[0], None)
+                return None
+            self._cache.move_to_end(key)
+            return entry[0]
+
+    # --- LOOKUPS ---
+    def _get_by_id(self, user_id):
+        try:
+            return self.supabase.auth_admin('GET', f"users/{urllib.parse.quote(str(user_id), safe='')}")
+        except SupabaseError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def _lookup_rpc(self, email):
+        """Returns (found, user). found is False when the RPC is not deployed."""
+        if time.monotonic() < self._rpc_missing_until:
+            return False, None
+        try:
+            rows = self.supabase.rpc('get_auth_user_by_email', {'email_input': email})
+        except SupabaseError as e:
+            if e.status == 404:
+                log.warning("⚠️ get_auth_user_by_email RPC missing, falling back to paged user scan")
+                self._rpc_missing_until = time.monotonic() + self.rpc_recheck
+                return False, None
+            raise
+        if not rows:
+            return True, None
+        row = rows[0]
+        return True, {'id': row['id'], 'email': row.get('email'), 'user_metadata': row.get('user_metadata') or {}}
+
+    def _scan(self, email):
+        """Walks every page of the admin users list; caches what it sees along the way."""
+        key = email.strip().lower()
+        page = 1
+        while True:
+            data = self.supabase.auth_admin('GET', 'users', params={'page': page, 'per_page': self.page_size})
+            users = data.get('users', []) if isinstance(data, dict) else (data or [])
+            found = None
+            for u in users:
+                u_email = (u.get('email') or '').lower()
+                if u_email:
+                    self.remember(u_email, u['id'])
+                if u_email == key:
+                    found = u
+            if found or len(users) < self.page_size:
+                return found
+            page += 1
+
+    def find_by_email(self, email):
+        key = email.strip().lower()
+        user_id = self._cached_id(key)
+        if user_id:
+            user = self._get_by_id(user_id)
+            if user and (user.get('email') or '').lower() == key:
+                return user
+            self.invalidate(email=key)
+
+        found, user = self._lookup_rpc(key)
+        if not found:
+            user = self._scan(key)
+        if user:
+            self.remember(key, user['id'])
+        return user
@@ -0,0 +1,24 @@
+-- Addresses that asked not to be emailed again; the backend proxy skips them before SMTP
+-- (hard bounces are read from email_logs, so they need no table of their own)
+create table public.email_unsubscribes (
+  id uuid default gen_random_uuid() primary key,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null,
+  email text not null unique,
+  reason text -- 'user_request', 'complaint', 'admin', etc.
+);
+
+-- The proxy reads new rows in created_at order
+create index email_unsubscribes_created_at_idx on public.email_unsubscribes (created_at, id);
+
+-- Enable RLS with no policies: the list is personal data, and an insert would silence someone's mail.
+-- Only the service role (used by the backend proxy, which bypasses RLS) may read or add rows.
+alter table public.email_unsubscribes enable row level security;
+revoke all on table public.email_unsubscribes from anon, authenticated;
+grant select, insert on table public.email_unsubscribes to service_role;
+
+-- Hard bounces are found by walking failed email_logs rows in created_at order
+create index if not exists email_logs_failed_created_at_idx on public.email_logs (created_at, id) where status = 'failed';
+-- Refreshes walk new failed and sent rows together (a send clears an earlier bounce)
+create index if not exists email_logs_failed_sent_created_at_idx on public.email_logs (created_at, id) where status in ('failed', 'sent');
+-- A full load only looks up later sends for the addresses that bounced
+create index if not exists email_logs_sent_recipient_idx on public.email_logs (recipient_email, created_at) where status = 'sent';
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# mail_proxy and bench are imported from the directory above, as backend.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,75 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+
+from mail_proxy.aio_server import AsyncServer
+
+CHUNK = b"x" * 65536
+CHUNKS = 256  # 16 MiB
+
+
+class StreamingRoutes:
+    written = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        for _ in range(CHUNKS):
+            self.wfile.write(CHUNK)
+            StreamingRoutes.written += len(CHUNK)
+
+
+class AsyncRequestWriterTest(unittest.TestCase):
+    def setUp(self):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        server = AsyncServer(StreamingRoutes, concurrency=2)
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(server.serve("127.0.0.1", self.port))
+        thread = threading.Thread(target=self.run_loop, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.loop.call_soon_threadsafe, self.task.cancel)
+        self.addCleanup(server.executor.shutdown)
+
+    def run_loop(self):
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    def connect(self):
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                return socket.create_connection(("127.0.0.1", self.port), timeout=5)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.02)
+
+    def test_slow_reader_blocks_the_handler(self):
+        StreamingRoutes.written = 0
+        with self.connect() as client:
+            client.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            time.sleep(0.5)
+            # Only about the socket buffers plus the transport's high-water mark, not the whole response
+            self.assertLess(StreamingRoutes.written, len(CHUNK) * CHUNKS // 4)
+            received = 0
+            while True:
+                data = client.recv(1 << 20)
+                if not data:
+                    break
+                received += len(data)
+        head_bytes = received - len(CHUNK) * CHUNKS
+        self.assertTrue(0 < head_bytes < 200)
+        self.assertEqual(StreamingRoutes.written, len(CHUNK) * CHUNKS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import hashlib
+import io
+import json
+import unittest
+
+from mail_proxy.body import (BodyReader, RequestBodyError, StreamedList, _JSONCursor, load_streamed, read_json,
+                             spool)
+
+
+def chunked(*parts):
+    return b"".join(f"{len(p):x}\r\n".encode() + p + b"\r\n" for p in parts) + b"0\r\nX-Trailer: 1\r\n\r\n"
+
+
+class OneByteFile(io.BytesIO):
+    """Returns at most `step` bytes per read, like a slow socket."""
+
+    def __init__(self, data, step=1):
+        super().__init__(data)
+        self.step = step
+
+    def read(self, size=-1):
+        return super().read(self.step if size is None or size < 0 else min(size, self.step))
+
+
+class BodyReaderTest(unittest.TestCase):
+    def test_content_length(self):
+        digest = hashlib.sha256()
+        reader = BodyReader(io.BytesIO(b'{"a": 1}trailing'), {'Content-Length': '8'}, 100, digest)
+        self.assertEqual(reader.read(), b'{"a": 1}')
+        self.assertEqual(reader.read(10), b'')
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(b'{"a": 1}').hexdigest())
+
+    def test_chunked_with_trailer(self):
+        rfile = io.BytesIO(chunked(b'{"a": ', b'[1, 2]}') + b"next request")
+        reader = BodyReader(rfile, {'Transfer-Encoding': 'chunked'}, 100)
+        self.assertEqual(read_json(reader), {'a': [1, 2]})
+        self.assertEqual(rfile.read(), b"next request")
+
+    def test_size_cap(self):
+        with self.assertRaises(RequestBodyError) as caught:
+            BodyReader(io.BytesIO(), {'Content-Length': '101'}, 100)
+        self.assertEqual(caught.exception.status, 413)
+        # Without a declared length the cap is enforced while reading
+        reader = BodyReader(io.BytesIO(chunked(b"x" * 60, b"x" * 60)), {'Transfer-Encoding': 'chunked'}, 100)
+        with self.assertRaises(RequestBodyError) as caught:
+            reader.read()
+        self.assertEqual(caught.exception.status, 413)
+
+    def test_malformed_framing(self):
+        for headers, data in (({'Content-Length': 'ten'}, b''), ({'Content-Length': '-1'}, b''),
+                              ({'Content-Length': '10'}, b'short'),
+                              ({'Transfer-Encoding': 'chunked'}, b'zz\r\n')):
+            with self.subTest(headers=headers, data=data), self.assertRaises(RequestBodyError) as caught:
+                BodyReader(io.BytesIO(data), headers, 100).read()
+            self.assertEqual(caught.exception.status, 400)
+
+    def test_empty_and_invalid_json(self):
+        self.assertEqual(read_json(BodyReader(io.BytesIO(b' '), {'Content-Length': '1'}, 100)), {})
+        with self.assertRaises(RequestBodyError):
+            read_json(BodyReader(io.BytesIO(b'{"a"'), {'Content-Length': '4'}, 100))
+
+
+class JSONCursorTest(unittest.TestCase):
+    def test_values_across_read_boundaries(self):
+        cursor = _JSONCursor(OneByteFile(b' [12345, "h\xc3\xa9llo", {"k": null}] '))
+        self.assertEqual(cursor.expect('['), '[')
+        # A number cut at the buffer edge is not returned until it is complete
+        self.assertEqual(cursor.value(), 12345)
+        cursor.expect(',')
+        self.assertEqual(cursor.value(), "héllo")
+        cursor.expect(',')
+        self.assertEqual(cursor.value(), {'k': None})
+        cursor.expect(']')
+        self.assertEqual(cursor.peek(), '')
+
+    def test_errors(self):
+        with self.assertRaises(RequestBodyError):
+            _JSONCursor(io.BytesIO(b'[1')).expect('{')
+        cursor = _JSONCursor(io.BytesIO(b'{"a": tru'))
+        cursor.expect('{')
+        cursor.value()
+        cursor.expect(':')
+        with self.assertRaises(RequestBodyError):
+            cursor.value()
+        with self.assertRaises(RequestBodyError) as caught:
+            _JSONCursor(io.BytesIO(b'"\xff"')).value()
+        self.assertIn("UTF-8", str(caught.exception))
+
+
+class StreamedListTest(unittest.TestCase):
+    def load(self, data, keys=('ids',)):
+        return load_streamed(spool(io.BytesIO(json.dumps(data).encode()), 1024), keys)
+
+    def test_lists_are_streamed_and_reiterable(self):
+        data = self.load({'subject': "Hi", 'ids': [f"u{i}" for i in range(5000)], 'other': [1, 2]})
+        ids = data['ids']
+        self.assertIsInstance(ids, StreamedList)
+        self.assertEqual(len(ids), 5000)
+        self.assertEqual(list(ids)[:2], ["u0", "u1"])
+        self.assertEqual(sum(1 for _ in ids), 5000)
+        # Members not named, and named members that are not arrays, are decoded as usual
+        self.assertEqual((data['subject'], data['other']), ("Hi", [1, 2]))
+        self.assertEqual(self.load({'ids': "none"})['ids'], "none")
+        self.assertEqual(len(self.load({'ids': []})['ids']), 0)
+
+    def test_invalid_body_fails_before_iteration(self):
+        for raw in (b'{"ids": [1, 2,]}', b'{"ids": [1, 2]', b'{"ids": [1]} extra', b'[1, 2]', b'{1: 2}'):
+            with self.subTest(raw=raw), self.assertRaises(RequestBodyError):
+                load_streamed(io.BytesIO(raw), ('ids',))
+
+
+if __name__ == '__main__':
+    unittest.main()
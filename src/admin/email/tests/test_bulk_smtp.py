@@ -0,0 +1,72 @@
+import smtplib
+import socket
+import unittest
+
+from bench.fakes import FakeSMTPServer
+from mail_proxy.bulk_smtp import BULK_MESSAGES, BulkSender, Delivery
+from mail_proxy.smtp_pool import SMTPPool
+from mail_proxy.templates import MessageTemplate
+
+TEMPLATE = MessageTemplate("Hello {{name}}", "<p>Hi {{name}}</p>\n.leading dot")
+
+
+def counted(status, mode):
+    return BULK_MESSAGES._values.get((status, mode), 0)
+
+
+class BulkSenderTest(unittest.TestCase):
+    def send(self, smtp, count=10, refuse=(), port=None, **kwargs):
+        smtp.refuse.update(refuse)
+        pool = SMTPPool("127.0.0.1", port or smtp.port, "user", "secret", size=2, starttls=False, timeout=5)
+        self.addCleanup(pool.close)
+        sender = BulkSender(pool, sessions=2, chunk_size=4, backoff=lambda attempt: 0, **kwargs)
+        self.addCleanup(sender.close)
+        deliveries = []
+        for i in range(count):
+            recipient = f"user{i}@example.com"
+            deliveries.append(Delivery(recipient, TEMPLATE.envelope_from, TEMPLATE.build(recipient, {'name': i})[1]))
+        return {d.recipient: (d, error) for d, error in sender.deliver(deliveries)}
+
+    def check_mixed_refusals(self, pipelining, mode):
+        before = counted('sent', mode), counted('failed', mode)
+        refused = {"user2@example.com", "user3@example.com", "user7@example.com"}
+        with FakeSMTPServer(pipelining=pipelining) as smtp:
+            results = self.send(smtp, refuse=refused)
+            self.assertEqual(smtp.counters['messages'], 7)
+        self.assertEqual(len(results), 10)
+        for recipient, (delivery, error) in results.items():
+            if recipient in refused:
+                self.assertIsInstance(error, smtplib.SMTPRecipientsRefused)
+                self.assertEqual(delivery.attempts, 1)  # 550 is not retried
+            else:
+                self.assertIsNone(error)
+        self.assertEqual((counted('sent', mode), counted('failed', mode)), (before[0] + 7, before[1] + 3))
+
+    def test_pipelined_mixed_refusals(self):
+        self.check_mixed_refusals(pipelining=True, mode='pipelined')
+
+    def test_server_without_pipelining(self):
+        self.check_mixed_refusals(pipelining=False, mode='sequential')
+
+    def test_disconnect_mid_pipeline_is_retried(self):
+        with FakeSMTPServer(pipelining=True) as smtp:
+            smtp.drop_after = 3
+            results = self.send(smtp)
+            self.assertEqual(smtp.counters['messages'], 10)
+        self.assertTrue(all(error is None for _, error in results.values()))
+        # The message whose reply was lost and the ones behind it in the chunk went again
+        self.assertTrue(any(delivery.attempts == 2 for delivery, _ in results.values()))
+
+    def test_failure_before_ehlo_is_not_labelled_pipelined(self):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            closed_port = probe.getsockname()[1]
+        before = counted('failed', 'unknown'), counted('failed', 'pipelined')
+        with FakeSMTPServer(pipelining=True) as smtp:
+            results = self.send(smtp, count=3, port=closed_port, max_attempts=1)
+        self.assertTrue(all(isinstance(error, OSError) for _, error in results.values()))
+        self.assertEqual((counted('failed', 'unknown'), counted('failed', 'pipelined')), (before[0] + 3, before[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
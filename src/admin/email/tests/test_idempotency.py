@@ -0,0 +1,74 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from mail_proxy.idempotency import IdempotencyCache, SharedIdempotencyCache
+from mail_proxy.shared_state import SharedState
+
+SCOPE = ('/send-email', 'key-1')
+OK = b"HTTP/1.1 202 Accepted\r\n\r\n{}"
+BUSY = b"HTTP/1.1 429 Too Many Requests\r\n\r\n{}"
+
+
+class MemoryBackend(unittest.TestCase):
+    def make_cache(self, **kwargs):
+        return IdempotencyCache(**kwargs)
+
+    def setUp(self):
+        self.cache = self.make_cache()
+
+    def test_owner_then_duplicate_gets_the_recorded_response(self):
+        entry, owner = self.cache.claim(SCOPE)
+        self.assertTrue(owner)
+        self.cache.finish(SCOPE, entry, "digest-a", 202, OK)
+        duplicate, owner = self.cache.claim(SCOPE)
+        self.assertFalse(owner)
+        self.assertTrue(self.cache.wait(duplicate, 1))
+        self.assertEqual((duplicate.status, duplicate.response), (202, OK))
+        # The route compares this with the duplicate's body digest; a different body gets 422
+        self.assertEqual(duplicate.fingerprint, "digest-a")
+        self.assertNotEqual(duplicate.fingerprint, "digest-b")
+        self.assertEqual(len(self.cache), 1)
+
+    def test_duplicate_in_flight_waits_for_the_owner(self):
+        entry, _ = self.cache.claim(SCOPE)
+        duplicate, owner = self.cache.claim(SCOPE)
+        self.assertFalse(owner)
+        self.assertFalse(self.cache.wait(duplicate, 0.1))
+        threading.Timer(0.1, self.cache.finish, (SCOPE, entry, "digest-a", 202, OK)).start()
+        self.assertTrue(self.cache.wait(duplicate, 5))
+        self.assertEqual(duplicate.status, 202)
+
+    def test_retryable_status_goes_to_waiters_but_is_not_kept(self):
+        entry, _ = self.cache.claim(SCOPE)
+        waiting, _ = self.cache.claim(SCOPE)
+        self.cache.finish(SCOPE, entry, None, 429, BUSY)
+        # A retry right away runs again, even before the waiter has looked
+        retry, owner = self.cache.claim(SCOPE)
+        self.assertTrue(owner)
+        self.assertTrue(self.cache.wait(waiting, 1))
+        self.assertEqual((waiting.status, waiting.response), (429, BUSY))
+        self.cache.finish(SCOPE, retry, "digest-a", 202, OK)
+        self.assertEqual(self.cache.claim(SCOPE)[0].status, 202)
+
+    def test_oversized_response_is_not_kept(self):
+        cache = self.make_cache(max_response_bytes=4)
+        entry, _ = cache.claim(SCOPE)
+        cache.finish(SCOPE, entry, "digest-a", 202, OK)
+        duplicate, owner = cache.claim(SCOPE)
+        self.assertTrue(cache.wait(duplicate, 1))
+        self.assertFalse(owner)
+        self.assertIsNone(duplicate.response)
+
+
+class SharedBackend(MemoryBackend):
+    def make_cache(self, **kwargs):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        return SharedIdempotencyCache(SharedState(os.path.join(workdir.name, "state.sqlite3")),
+                                      poll_interval=0.01, **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import tempfile
+import unittest
+
+from mail_proxy.log_writer import LogWriter
+
+
+class SupabaseDown(Exception):
+    pass
+
+
+class LogWriterSpillTest(unittest.TestCase):
+    def setUp(self):
+        workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(workdir.cleanup)
+        self.spill_path = os.path.join(workdir.name, "spill.jsonl")
+        self.posted = []
+        self.fail_after = None
+        self.writer = LogWriter(self.post_rows, batch_size=3, spill_path=self.spill_path, replay_interval=0)
+
+    def post_rows(self, rows):
+        if self.fail_after is not None and len(self.posted) >= self.fail_after:
+            raise SupabaseDown("unreachable")
+        self.posted.extend(rows)
+
+    def write_lines(self, path, first, count):
+        with open(path, 'a', encoding='utf-8') as f:
+            for i in range(first, first + count):
+                f.write(json.dumps({'n': i}) + "\n")
+
+    def test_replay_posts_in_batches(self):
+        self.write_lines(self.spill_path, 0, 7)
+        self.assertTrue(self.writer.flush())
+        self.assertEqual([r['n'] for r in self.posted], list(range(7)))
+        self.assertFalse(os.path.exists(self.spill_path))
+        self.assertFalse(os.path.exists(self.spill_path + ".replay"))
+
+    def test_leftover_replay_file_is_not_overwritten(self):
+        # A crash mid-replay leaves .replay behind while new rows spill to the main file
+        self.write_lines(self.spill_path + ".replay", 0, 4)
+        self.write_lines(self.spill_path, 4, 2)
+        self.writer.flush()
+        self.writer.flush()
+        self.assertEqual(sorted(r['n'] for r in self.posted), list(range(6)))
+        self.assertFalse(os.path.exists(self.spill_path + ".replay"))
+
+    def test_failed_replay_keeps_the_rest_on_disk(self):
+        self.write_lines(self.spill_path, 0, 8)
+        self.fail_after = 3
+        self.writer.flush()
+        self.assertEqual([r['n'] for r in self.posted], [0, 1, 2])
+        with open(self.spill_path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['n'] for line in f], list(range(3, 8)))
+        self.fail_after = None
+        self.writer.flush()
+        self.assertEqual([r['n'] for r in self.posted], list(range(8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
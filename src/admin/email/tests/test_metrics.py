@@ -0,0 +1,27 @@
+import unittest
+
+from mail_proxy.metrics import Registry
+
+
+class RegistryTest(unittest.TestCase):
+    def test_label_all_tags_every_series(self):
+        registry = Registry()
+        registry.counter('sent_total', "Sent", ('route',)).inc('/otp')
+        registry.gauge('queued', "Queued").set(3)
+        registry.histogram('seconds', "Time", buckets=(1.0,)).observe(0.5)
+        self.assertIn('sent_total{route="/otp"} 1\n', registry.render())
+
+        registry.label_all(worker=123)
+        lines = [line for line in registry.render().splitlines() if not line.startswith('#')]
+        self.assertEqual(lines, [
+            'sent_total{route="/otp",worker="123"} 1',
+            'queued{worker="123"} 3',
+            'seconds_bucket{worker="123",le="1.0"} 1',
+            'seconds_bucket{worker="123",le="+Inf"} 1',
+            'seconds_sum{worker="123"} 0.5',
+            'seconds_count{worker="123"} 1',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
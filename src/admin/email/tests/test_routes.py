@@ -0,0 +1,60 @@
+import io
+import json
+import unittest
+
+from mail_proxy.routes import ProxyRoutes
+
+
+class RecordingHandler:
+    """The request handler basics ProxyRoutes builds on, writing the response to a buffer."""
+
+    def __init__(self, path):
+        self.path = path
+        self.wfile = io.BytesIO()
+
+    def send_response(self, code, message=None):
+        self.wfile.write(f"HTTP/1.1 {code}\r\n".encode())
+
+    def send_header(self, name, value):
+        self.wfile.write(f"{name}: {value}\r\n".encode())
+
+    def end_headers(self):
+        self.wfile.write(b"\r\n")
+
+
+class Handler(ProxyRoutes, RecordingHandler):
+    pass
+
+
+def results(fail_after=None):
+    for i in range(3):
+        if i == fail_after:
+            raise RuntimeError("Supabase went away")
+        yield {'userId': f"u{i}", 'status': 'deleted'}
+
+
+class SendNDJSONTest(unittest.TestCase):
+    def stream(self, fail_after=None):
+        handler = Handler('/delete-users')
+        handler.send_ndjson(results(fail_after), 3, ('deleted', 'failed'))
+        head, _, body = handler.wfile.getvalue().partition(b"\r\n\r\n")
+        return handler, head, [json.loads(line) for line in body.splitlines()]
+
+    def test_summary_line(self):
+        _, head, lines = self.stream()
+        self.assertTrue(head.startswith(b"HTTP/1.1 200"))
+        self.assertEqual(lines[-1], {'done': True, 'total': 3, 'deleted': 3, 'failed': 0})
+
+    def test_error_mid_stream_ends_the_stream(self):
+        handler, head, lines = self.stream(fail_after=2)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[-1]['status'], 'error')
+        self.assertEqual(lines[-1]['deleted'], 2)
+        self.assertEqual(handler.status_code, 500)
+        # A later error response must not put a second status line into the body
+        handler.send_error_response("Server Error")
+        self.assertEqual(handler.wfile.getvalue().count(b"HTTP/1.1"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
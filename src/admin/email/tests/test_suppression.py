@@ -0,0 +1,119 @@
+import unittest
+
+from bench.fakes import FakeSupabase
+from mail_proxy.supabase_client import SupabaseClient
+from mail_proxy.suppression import SuppressionIndex, SuppressionList
+
+
+class SuppressionIndexTest(unittest.TestCase):
+    def test_add_contains_discard(self):
+        index = SuppressionIndex(capacity=1000)
+        index.add("Bounce@Example.com ")
+        self.assertIn("bounce@example.com", index)
+        self.assertNotIn("other@example.com", index)
+        index.discard("bounce@example.com")
+        self.assertNotIn("bounce@example.com", index)
+        self.assertEqual(len(index), 0)
+
+    def test_compact_keeps_membership_and_grows_the_filter(self):
+        index = SuppressionIndex(capacity=1024)
+        emails = [f"user{i}@example.com" for i in range(5000)]
+        for email in emails:
+            index.add(email)
+        index.compact()
+        self.assertEqual(index.pending(), 0)
+        self.assertEqual(len(index), len(emails))
+        self.assertTrue(all(email in index for email in emails))
+
+        # Removals after compact() sit in the pending set, then leave the sorted array
+        index.discard(emails[0])
+        index.add("late@example.com")
+        self.assertEqual(index.pending(), 2)
+        index.compact()
+        self.assertNotIn(emails[0], index)
+        self.assertIn("late@example.com", index)
+        self.assertIn(emails[1], index)
+        self.assertEqual(len(index), len(emails))
+
+
+class SuppressionListTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = FakeSupabase().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.supabase = SupabaseClient(self.stub.url, "test")
+        self.addCleanup(self.supabase.close)
+        self.suppression = SuppressionList(self.supabase, page_size=2)
+
+    def insert(self, table, *rows):
+        self.supabase.rest('POST', table, body=list(rows), prefer="return=minimal")
+
+    def bounce(self, email):
+        self.insert('email_logs', {'recipient_email': email, 'status': 'failed',
+                                   'error_message': "(550, b'5.1.1 user unknown')"})
+
+    def test_refresh_reads_bounces_and_unsubscribes_incrementally(self):
+        self.bounce("a@example.com")
+        self.insert('email_logs', {'recipient_email': "b@example.com", 'status': 'failed',
+                                   'error_message': "(421, b'try again later')"})
+        self.insert('email_unsubscribes', {'email': "c@example.com"}, {'email': "d@example.com"},
+                    {'email': "e@example.com"})
+        self.suppression.refresh()
+        self.assertIn("a@example.com", self.suppression)
+        self.assertNotIn("b@example.com", self.suppression)
+        self.assertTrue(all(f"{c}@example.com" in self.suppression for c in "cde"))
+
+        self.bounce("f@example.com")
+        self.stub.reset()
+        self.suppression.refresh()
+        self.assertIn("f@example.com", self.suppression)
+        self.assertEqual(len(self.suppression.index), 5)
+        # One page per table: only rows past the watermarks were read
+        self.assertEqual(self.stub.counters['requests'], 2)
+
+    def test_successful_send_after_a_bounce_clears_the_address(self):
+        self.bounce("a@example.com")
+        self.suppression.refresh()
+        self.assertIn("a@example.com", self.suppression)
+        self.insert('email_logs', {'recipient_email': "a@example.com", 'status': 'sent'})
+        self.suppression.refresh()
+        self.assertNotIn("a@example.com", self.suppression)
+
+    def test_full_load_looks_up_sends_only_for_bounced_addresses(self):
+        self.bounce("a@example.com")
+        self.bounce("b@example.com")
+        self.insert('email_logs', {'recipient_email': "a@example.com", 'status': 'sent'})
+        self.bounce("b@example.com")
+        self.insert('email_logs', *({'recipient_email': f"other{i}@example.com", 'status': 'sent'}
+                                    for i in range(20)))
+        self.stub.reset()
+        self.suppression.refresh()
+        self.assertNotIn("a@example.com", self.suppression)
+        self.assertIn("b@example.com", self.suppression)
+        # Newest-row watermark (2), failed pages (2), one lookup per bounced page (2), unsubscribes (1)
+        self.assertEqual(self.stub.counters['requests'], 7)
+
+        # Refreshes carry on from the newest row, sent ones included
+        self.insert('email_logs', {'recipient_email': "b@example.com", 'status': 'sent'})
+        self.stub.reset()
+        self.suppression.refresh()
+        self.assertNotIn("b@example.com", self.suppression)
+        self.assertEqual(self.stub.counters['requests'], 2)
+
+    def test_rebuild_drops_resubscribed_addresses(self):
+        self.insert('email_unsubscribes', {'email': "a@example.com"}, {'email': "b@example.com"})
+        self.suppression.refresh()
+        self.supabase.rest('DELETE', 'email_unsubscribes', params={'email': 'eq.a@example.com'})
+        self.suppression.refresh()
+        self.assertIn("a@example.com", self.suppression)
+
+        self.suppression.rebuild_interval = 0
+        self.suppression.refresh()
+        self.assertNotIn("a@example.com", self.suppression)
+        self.assertIn("b@example.com", self.suppression)
+        # add() goes to the index that was swapped in
+        self.suppression.add("refused@example.com")
+        self.assertIn("refused@example.com", self.suppression)
+
+
+if __name__ == '__main__':
+    unittest.main()
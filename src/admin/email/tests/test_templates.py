@@ -0,0 +1,35 @@
+import unittest
+
+from mail_proxy.templates import MessageTemplate, TemplateCache
+
+
+class TemplateCacheTest(unittest.TestCase):
+    def test_identical_content_compiles_once(self):
+        cache = TemplateCache()
+        first = cache.get("Hi {{name}}", "<p>Hello {{name}}</p>")
+        self.assertIs(cache.get("Hi {{name}}", "<p>Hello {{name}}</p>"), first)
+        self.assertIsNot(cache.get("Hi", "<p>Hello {{name}}</p>"), first)
+        subject, message = first.build("a@example.com", {'name': "<Ann>"})
+        self.assertEqual(subject, "Hi <Ann>")
+        self.assertIn(b"To: a@example.com\r\n", message)
+
+    def test_bounded_by_bytes(self):
+        body = "<p>" + "x" * 10000 + "</p>"
+        size = MessageTemplate("s", body).memory_bytes()
+        cache = TemplateCache(max_bytes=size * 3)
+        templates = [cache.get(f"s{i}", body) for i in range(10)]
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.memory_bytes(), cache.max_bytes)
+        # Least recently used go first
+        self.assertIs(cache.get("s9", body), templates[9])
+        self.assertIsNot(cache.get("s0", body), templates[0])
+
+    def test_template_over_budget_is_not_kept(self):
+        cache = TemplateCache(max_bytes=1000)
+        template = cache.get("s", "x" * 5000)
+        self.assertEqual(len(cache), 0)
+        self.assertIsNot(cache.get("s", "x" * 5000), template)
+
+
+if __name__ == '__main__':
+    unittest.main()